@@ -7,10 +7,21 @@ import gzip
 import os
 import glob
 import sys
+import time
 import logging
+import resource
+import multiprocessing
+import multiprocessing.connection
+import sqlite3
+import shutil
+import hashlib
+from contextlib import closing
 from pandas.io.json import json_normalize
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from BotometerLite.BotometerLite.core import BotometerLiteDetector
+import tweetio
 
 blt = BotometerLiteDetector()
 
@@ -71,13 +82,15 @@ def addExtraEntities(entities, extra_obj_key="retweeted_status", extended_key=No
 
     
 def parseTweet(tw):
+    # reference dictionary implementation; the converter uses parseTweetRow
+    # kept so parse_benchmark.py can check the two still agree
     entities = {
         '.'.join(k): safeget(tw,k) for k in (
             ('id_str',), 
             ('user','id_str'),
             ('user','screen_name'),
             ('user','followers_count'),
-            #('timestamp_ms',),
+            ('timestamp_ms',),
             ('entities','hashtags'),
             ('entities','urls'),
             ('entities','user_mentions'),
@@ -150,6 +163,8 @@ def parseTweet(tw):
     #handling special cases of RT and quotes
     addExtraEntities(entities, extra_obj_key="retweeted_status", extended_key=extended_key)
     addExtraEntities(entities, extra_obj_key="quoted_status", extended_key=extended_key)
+    # the quote's own id is kept as a column, but only now, so its entities still aren't merged in
+    entities['quoted_status.id_str'] = safeget(tw, ('quoted_status','id_str'))
     
 #    if entities.get('retweeted_status.id_str'): # has a retweet
 #        extra = parseListOfDict(entities.get('retweeted_status.entities.urls',[]), 'expanded_url')
@@ -201,42 +216,498 @@ def parseTweet(tw):
     return entities
 
 
+# only the key paths parseTweetRow actually reads, compiled once into a single extractor
+# parseTweet only adds quoted_status.id_str after the extras, so its quoted_status extras are never
+# applied; the quoted_status entity paths are left out here for the same output
+TWEET_PATHS = (
+    ('id_str',),
+    ('user','id_str'),
+    ('user','screen_name'),
+    ('user','followers_count'),
+    ('timestamp_ms',),
+    ('entities','hashtags'),
+    ('entities','urls'),
+    ('entities','user_mentions'),
+    ('in_reply_to_status_id_str',),
+    ('in_reply_to_user_id_str',),
+    ('retweeted_status','id_str'),
+    ('retweeted_status','user','id_str'),
+    ('retweeted_status','entities','hashtags'),
+    ('retweeted_status','entities','urls'),
+    ('retweeted_status','entities','user_mentions'),
+    ('quoted_status','id_str'),
+    ('quoted_status','user','id_str'),
+    ('coordinates',),
+    ('place',),
+    ('truncated',),
+    ('extended_tweet','entities','hashtags'),
+    ('extended_tweet','entities','urls'),
+    ('extended_tweet','entities','user_mentions'),
+    ('retweeted_status','extended_tweet','entities','hashtags'),
+    ('retweeted_status','extended_tweet','entities','urls'),
+    ('retweeted_status','extended_tweet','entities','user_mentions'),
+)
+extractTweetPaths = tweetio.compile_extractor(TWEET_PATHS)
+
+# output columns of parseTweetRow, in the order parseTweet's dictionaries produce them
+TWEET_COLUMNS = (
+    'id_str',
+    'user.id_str',
+    'user.screen_name',
+    'user.followers_count',
+    'timestamp_ms',
+    'in_reply_to_status_id_str',
+    'in_reply_to_user_id_str',
+    'retweeted_status.id_str',
+    'retweeted_status.user.id_str',
+    'quoted_status.id_str',
+    'quoted_status.user.id_str',
+    'coordinates',
+    'urls',
+    'hashtags',
+    'user_mentions_id_str',
+    'place_full_name',
+    'place_type',
+    'place_id',
+    'place_country',
+)
+
+def parseTweetRow(tw):
+    # same output as parseTweet, but as one flat tuple in TWEET_COLUMNS order
+    # empty values become None, matching parseTweet dropping falsy keys
+    (id_str, user_id_str, screen_name, followers_count, timestamp_ms,
+     hashtags, urls, user_mentions,
+     reply_status_id_str, reply_user_id_str,
+     rt_id_str, rt_user_id_str, rt_hashtags, rt_urls, rt_user_mentions,
+     qt_id_str, qt_user_id_str, coordinates, place, truncated,
+     ext_hashtags, ext_urls, ext_user_mentions,
+     rt_ext_hashtags, rt_ext_urls, rt_ext_user_mentions) = extractTweetPaths(tw)
+
+    screen_name = screen_name.lower()
+
+    if truncated:
+        urls = parseListOfDict(ext_urls, 'expanded_url')
+        hashtags = parseListOfDict(ext_hashtags, 'text', toLower=True)
+        user_mentions = parseListOfDict(ext_user_mentions, 'id_str')
+        # parseTweet looks the RT extras up under the *outer* tweet's extended key
+        rt_hashtags, rt_urls, rt_user_mentions = rt_ext_hashtags, rt_ext_urls, rt_ext_user_mentions
+    else:
+        urls = parseListOfDict(urls, 'expanded_url')
+        hashtags = parseListOfDict(hashtags, 'text', toLower=True)
+        user_mentions = parseListOfDict(user_mentions, 'id_str')
+
+    if rt_id_str:
+        urls = urls + parseListOfDict(rt_urls, 'expanded_url')
+        hashtags = hashtags + parseListOfDict(rt_hashtags, 'text', toLower=True)
+        user_mentions = user_mentions + parseListOfDict(rt_user_mentions, 'id_str')
+
+    if coordinates:
+        coordinates = coordinates.get('coordinates')
+    if place:
+        place_values = (
+            place.get('full_name') or None,
+            place.get('place_type') or None,
+            place.get('id_str') or None,
+            place.get('country_code') or None,
+        )
+    else:
+        place_values = (None, None, None, None)
+
+    return (
+        id_str or None,
+        user_id_str or None,
+        screen_name or None,
+        followers_count or None,
+        timestamp_ms or None,
+        reply_status_id_str or None,
+        reply_user_id_str or None,
+        rt_id_str or None,
+        rt_user_id_str or None,
+        qt_id_str or None,
+        qt_user_id_str or None,
+        coordinates or None,
+        list(set(urls)) or None,
+        list(set(hashtags)) or None,
+        list(set(user_mentions)) or None,
+    ) + place_values
+
+def tweetsFrame(rows):
+    # build the dataframe straight from the row tuples
+    # columns that are empty for every tweet are dropped, as json_normalize never saw them
+    tweets = pd.DataFrame.from_records(rows, columns=TWEET_COLUMNS)
+    return tweets.dropna(axis=1, how='all')
+
+
+# botscores are cached per user per day, so heavy posters are only scored once a day
+# set BOTSCORE_CACHE to None to score every tweet's user like before
+BOTSCORE_CACHE = 'data/botscore_cache.sqlite'
+# a cached score up to this many days older than the tweet is reused; 0 means same day only
+BOTSCORE_STALENESS_DAYS = 0
+
+def openBotScoreCache(path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=300)
+    # WAL so parallel conversion workers can read while another writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS botscores ('
+        'user_id TEXT NOT NULL, probe_day INTEGER NOT NULL, bot_score_lite REAL, '
+        'PRIMARY KEY (user_id, probe_day))'
+    )
+    return conn
+
+def probeDays(probe_timestamp):
+    # created_at looks like "Wed Oct 10 20:19:24 +0000 2018"; only the date part matters,
+    # and there are only a handful of distinct dates per file, so parse each once
+    day_keys = probe_timestamp.str[4:10] + probe_timestamp.str[-5:]
+    ordinals = {key: dt.datetime.strptime(key, '%b %d %Y').toordinal() for key in day_keys.unique()}
+    return day_keys.map(ordinals)
+
+def lookupBotScores(conn, snapshots, staleness_days):
+    # newest cached score for each (user_id, probe_day) no older than staleness_days, else NaN
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS wanted (user_id TEXT, probe_day INTEGER)')
+    conn.execute('DELETE FROM wanted')
+    conn.executemany('INSERT INTO wanted VALUES (?, ?)',
+                     zip(snapshots['user_id'], snapshots['probe_day'].astype(int).tolist()))
+    cached = pd.read_sql_query(
+        'SELECT w.user_id, w.probe_day, ('
+        '  SELECT b.bot_score_lite FROM botscores b'
+        '  WHERE b.user_id = w.user_id AND b.probe_day BETWEEN w.probe_day - ? AND w.probe_day'
+        '  ORDER BY b.probe_day DESC LIMIT 1'
+        ') AS bot_score_lite FROM wanted w',
+        conn, params=(staleness_days,)
+    )
+    # end the read transaction, otherwise storing later can't upgrade it once another worker has written
+    conn.commit()
+    return snapshots.merge(cached, on=['user_id', 'probe_day'], how='left')['bot_score_lite'].values
+
+def storeBotScores(conn, snapshots, scores):
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO botscores VALUES (?, ?, ?)',
+                         zip(snapshots['user_id'], snapshots['probe_day'].astype(int).tolist(), scores.tolist()))
+
+def cachedBotScoreLite(blt_input):
+    # same scores as blt.detect_on_user_objects over every row of blt_input,
+    # but each user's snapshot is only sent to BotometerLite once per probe day,
+    # and not at all if the cache already has a fresh enough score for them
+    if BOTSCORE_CACHE is None:
+        blt_scores = blt.detect_on_user_objects(blt_input.loc[:,["probe_timestamp", "user"]].values)
+        return blt_scores["bot_score_lite"].values
+
+    blt_input = blt_input.copy()
+    blt_input["user_id"] = [u["id_str"] for u in blt_input["user"]]
+    blt_input["probe_day"] = probeDays(blt_input["probe_timestamp"])
+    # first snapshot of each user on each day stands in for all their tweets that day
+    snapshots = blt_input.drop_duplicates(subset=["user_id", "probe_day"]).reset_index(drop=True)
+
+    with closing(openBotScoreCache(BOTSCORE_CACHE)) as conn:
+        snapshots["bot_score_lite"] = lookupBotScores(conn, snapshots, BOTSCORE_STALENESS_DAYS)
+        misses = snapshots["bot_score_lite"].isna()
+        print("botscores: {} snapshots, {} cached, {} to score".format(
+            len(snapshots), len(snapshots)-misses.sum(), misses.sum()))
+        if misses.any():
+            to_score = snapshots.loc[misses]
+            blt_scores = blt.detect_on_user_objects(to_score.loc[:,["probe_timestamp", "user"]].values)
+            scores = blt_scores["bot_score_lite"].values
+            snapshots.loc[misses, "bot_score_lite"] = scores
+            storeBotScores(conn, to_score, scores)
+
+    scored = blt_input.merge(snapshots[["user_id", "probe_day", "bot_score_lite"]],
+                             on=["user_id", "probe_day"], how="left")
+    return scored["bot_score_lite"].values
+
+
 # In[41]:
 
 
 def loadTweetsJson(filename):
+    with gzip.GzipFile(filename) as tw_file:
+        return loadTweetsLines(tw_file, filename)
+
+def loadTweetsLines(lines, filename):
     init = dt.datetime.now()
     print(init, filename,)
     # with gzip.GzipFile("./data/test_elections2018_tweets-20180830.json.gz") as tw_file:
-    with gzip.GzipFile(filename) as tw_file:
-        data=[]
-        probe_timestamp = []
-        user = []
-        for line in tw_file:
-            try:
-                tw = json.loads(line.decode('utf-8'))
-                probe_timestamp.append(tw["created_at"])
-                user.append(tw["user"])
-                data.append(parseTweet(tw))
-            except Exception as e:
-                print(filename,e)
-        tweets = json_normalize(data)
-        
-        blt_input = pd.DataFrame(probe_timestamp, columns=["probe_timestamp"])
-        blt_input["user"] = user
-        blt_scores = blt.detect_on_user_objects(blt_input.loc[:,["probe_timestamp", "user"]].values)
-        tweets["botscore"] = blt_scores["bot_score_lite"]
+    rows=[]
+    probe_timestamp = []
+    user = []
+    for line in lines:
+        try:
+            tw = json.loads(line.decode('utf-8'))
+            rows.append(parseTweetRow(tw))
+            # only recorded once the tweet has parsed, so the botscores line up with the rows
+            probe_timestamp.append(tw["created_at"])
+            user.append(tw["user"])
+        except Exception as e:
+            print(filename,e)
+    tweets = tweetsFrame(rows)
+    
+    blt_input = pd.DataFrame(probe_timestamp, columns=["probe_timestamp"])
+    blt_input["user"] = user
+    tweets["botscore"] = cachedBotScoreLite(blt_input)
     
     
     tweets.drop_duplicates(subset='id_str',inplace=True)
     print(dt.datetime.now()-init, filename)
     return tweets
 
+# day files bigger than this (compressed) are converted a slice of lines at a time,
+# each slice becoming its own part file in the day partition, instead of going in TOOBIG/
+SPLIT_THRESHOLD_BYTES = 2*1024**3
+SPLIT_LINES = 500000
+
+def loadTweetsParts(filename):
+    # whole file as one part if it's small enough, otherwise streamed in SPLIT_LINES slices
+    if os.path.getsize(filename) <= SPLIT_THRESHOLD_BYTES:
+        yield loadTweetsJson(filename)
+        return
+    print("#splitting {} into parts of {} lines".format(filename, SPLIT_LINES))
+    seen_ids = set()
+    with gzip.GzipFile(filename) as tw_file:
+        for part_number, part in enumerate(tweetio.line_parts(tw_file, max_lines=SPLIT_LINES)):
+            tweets = loadTweetsLines(part, "{} (part {})".format(filename, part_number))
+            # duplicates can straddle parts, drop them the same way the whole-file load would
+            tweets = tweets[~tweets['id_str'].isin(seen_ids)]
+            seen_ids.update(tweets['id_str'])
+            yield tweets
+
 
 # In[42]:
 
+# rough peak memory growth per compressed input byte while converting a file
+# only a starting guess: it's raised to the worst ratio the workers actually report
+RSS_PER_INPUT_BYTE = 12
+
+# fixed schema for the parquet dataset, so every day partition reads back the same way
+# even on days where a column happens to be empty for every tweet
+TWEET_SCHEMA = pa.schema([
+    ('id_str', pa.string()),
+    ('user.id_str', pa.string()),
+    ('user.screen_name', pa.string()),
+    ('user.followers_count', pa.float64()),
+    ('timestamp_ms', pa.int64()),
+    ('in_reply_to_status_id_str', pa.string()),
+    ('in_reply_to_user_id_str', pa.string()),
+    ('retweeted_status.id_str', pa.string()),
+    ('retweeted_status.user.id_str', pa.string()),
+    ('quoted_status.id_str', pa.string()),
+    ('quoted_status.user.id_str', pa.string()),
+    ('coordinates', pa.list_(pa.float64())),
+    ('urls', pa.list_(pa.string())),
+    ('hashtags', pa.list_(pa.string())),
+    ('user_mentions_id_str', pa.list_(pa.string())),
+    ('place_full_name', pa.string()),
+    ('place_type', pa.string()),
+    ('place_id', pa.string()),
+    ('place_country', pa.string()),
+    ('botscore', pa.float64()),
+])
+
+def outputPartition(filename):
+    # day files write into the parquet dataset next to them, e.g. data/elections2022/parquet/day=20221029/
+    return tweetio.tweet_dataset_path(os.path.dirname(filename)), tweetio.file_date(filename)
+
+# the manifest records every conversion, so reruns skip days that are already up to date
+# it lives inside the dataset, the leading underscore keeps parquet readers away from it
+MANIFEST_NAME = '_manifest.sqlite'
+# also hash inputs; only matters when a file's mtime changes but its contents don't
+MANIFEST_HASH = False
+
+def openManifest(dataset_path):
+    os.makedirs(dataset_path, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(dataset_path, MANIFEST_NAME), timeout=300)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS conversions ('
+        'input_path TEXT PRIMARY KEY, input_size INTEGER, input_mtime REAL, input_hash TEXT, '
+        'output_path TEXT, rows INTEGER, seconds REAL, status TEXT, converted_at TEXT)'
+    )
+    # manifests from before duplicates were counted
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(conversions)')]
+    if 'duplicates' not in columns:
+        conn.execute('ALTER TABLE conversions ADD COLUMN duplicates INTEGER')
+    return conn
+
+def manifestFor(filename, manifests):
+    # one manifest per dataset, opened the first time a file needs it
+    dataset_path, _ = outputPartition(filename)
+    if dataset_path not in manifests:
+        manifests[dataset_path] = openManifest(dataset_path)
+    return manifests[dataset_path]
+
+def fileHash(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def isUpToDate(conn, filename):
+    row = conn.execute(
+        'SELECT input_size, input_mtime, input_hash, output_path, status FROM conversions WHERE input_path = ?',
+        (os.path.abspath(filename),)
+    ).fetchone()
+    if row is None:
+        return False
+    input_size, input_mtime, input_hash, output_path, status = row
+    if status != 'done' or not os.path.exists(output_path):
+        return False
+    # days written before a column was added to the schema are converted again
+    part_files = glob.glob(os.path.join(output_path, 'part-*.parquet'))
+    if part_files and not set(TWEET_SCHEMA.names) <= set(pq.read_schema(part_files[0]).names):
+        return False
+    stat = os.stat(filename)
+    if stat.st_size == input_size and stat.st_mtime == input_mtime:
+        return True
+    # touched but maybe not changed: trust the hash if we have one
+    if MANIFEST_HASH and input_hash is not None and stat.st_size == input_size and fileHash(filename) == input_hash:
+        with conn:
+            conn.execute('UPDATE conversions SET input_mtime = ? WHERE input_path = ?',
+                         (stat.st_mtime, os.path.abspath(filename)))
+        return True
+    return False
+
+def recordConversion(conn, result):
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO conversions (input_path, input_size, input_mtime, input_hash, '
+            'output_path, rows, seconds, status, converted_at, duplicates) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (os.path.abspath(result['filename']), result['input_bytes'], result['input_mtime'],
+             fileHash(result['filename']) if MANIFEST_HASH else None,
+             os.path.abspath(result['output']), result['rows'], result['seconds'], 'done',
+             dt.datetime.now().isoformat(), result['duplicates'])
+        )
+
+def recordFailure(conn, filename):
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO conversions (input_path, status, converted_at) VALUES (?, ?, ?)',
+            (os.path.abspath(filename), 'failed', dt.datetime.now().isoformat())
+        )
+
+def reportThroughput(converted, failed, skipped, seconds):
+    total_bytes = sum(result['input_bytes'] for result in converted)
+    total_rows = sum(result['rows'] for result in converted)
+    total_duplicates = sum(result['duplicates'] for result in converted)
+    print("#{} files converted, {} failed, {} skipped as up to date".format(len(converted), len(failed), skipped))
+    print("#{} duplicates of tweets from other files dropped".format(total_duplicates))
+    if seconds > 0:
+        print("#{:.1f}MB in, {} tweets out in {} ({:.2f}MB/s, {:.0f} tweets/s)".format(
+            total_bytes/1024**2, total_rows, tweetio.nicetime(0, seconds).strip(),
+            total_bytes/1024**2/seconds, total_rows/seconds))
+    for filename in failed:
+        print("#failed: {}".format(filename))
+
+def currentRss():
+    # resident memory of this process in bytes, from /proc where we have it
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+def peakRss():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def convertFile(filename):
+    start = time.time()
+    start_rss = currentRss()
+    # input state as of the start, so a file changing mid-conversion shows up as stale next run
+    stat = os.stat(filename)
+    dataset_path, filedate = outputPartition(filename)
+    # drop tweets already ingested from any other file, e.g. captured twice across a day boundary
+    seen_path = tweetio.seen_ids_path(dataset_path)
+    run_name = tweetio.seen_id_run_name(filename)
+    dedupe_stats = {'duplicates': 0, 'ids': []}
+    parts = globallyDeduped(loadTweetsParts(filename), tweetio.load_seen_id_runs(seen_path, exclude=run_name), dedupe_stats)
+    output, rows = tweetio.write_tweets_partition(
+        (withTimestamps(tweets) for tweets in parts), dataset_path, filedate, TWEET_SCHEMA)
+    # only recorded once the partition is in place
+    tweetio.record_seen_ids(np.concatenate(dedupe_stats['ids']) if dedupe_stats['ids'] else [], seen_path, run_name)
+    print("#{}: {} duplicates of already ingested tweets dropped".format(filename, dedupe_stats['duplicates']))
+    return {
+        'filename': filename,
+        'output': output,
+        'rows': rows,
+        'duplicates': dedupe_stats['duplicates'],
+        'seconds': time.time()-start,
+        'input_bytes': stat.st_size,
+        'input_mtime': stat.st_mtime,
+        'peak_rss': max(peakRss()-start_rss, 0),
+    }
+
+def globallyDeduped(parts, seen_runs, stats):
+    # note that with parallel conversion, files being converted at the same time can't see each other's ids
+    for tweets in parts:
+        tweets = tweets.dropna(subset=['id_str'])
+        ids = tweetio.tweet_ids_array(tweets['id_str'])
+        seen = tweetio.seen_id_mask(ids, seen_runs)
+        stats['duplicates'] += int(seen.sum())
+        stats['ids'].append(ids[~seen])
+        yield tweets[~seen]
+
+def withTimestamps(tweets):
+    tweets['timestamp_ms'] = pd.to_numeric(tweets['timestamp_ms'])
+    return tweets
+
+def convertWorker(filename, results):
+    # runs in a forked child, one file per child so its memory goes back to the OS afterwards
+    results.put(convertFile(filename))
+
+def convertParallel(files, workers, memory_budget, manifests):
+    # spread files over up to `workers` forked children
+    # a new file is only started if its projected RSS fits in what's left of memory_budget
+    # (the first file always starts, otherwise a file bigger than the budget would never run)
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.SimpleQueue()
+    pending = list(files)
+    running = {}
+    converted = []
+    failed = []
+    rss_ratio = RSS_PER_INPUT_BYTE
+    while pending or running:
+        while pending and len(running) < workers:
+            # split files only ever hold one slice, so project from at most the split threshold
+            projected = min(os.path.getsize(pending[0]), SPLIT_THRESHOLD_BYTES) * rss_ratio
+            in_use = sum(p for _, p in running.values())
+            if running and memory_budget is not None and in_use+projected > memory_budget:
+                break
+            filename = pending.pop(0)
+            process = ctx.Process(target=convertWorker, args=(filename, results))
+            process.start()
+            running[filename] = (process, projected)
+            print("#started {} ({} running, ~{:.1f}GB projected in use)".format(
+                filename, len(running), (in_use+projected)/1024**3))
+
+        # block until at least one child exits, however it exits
+        multiprocessing.connection.wait([process.sentinel for process, _ in running.values()])
+        while not results.empty():
+            result = results.get()
+            converted.append(result)
+            recordConversion(manifestFor(result['filename'], manifests), result)
+            if result['input_bytes'] > 0:
+                rss_ratio = max(rss_ratio, result['peak_rss']/min(result['input_bytes'], SPLIT_THRESHOLD_BYTES))
+        for filename, (process, _) in list(running.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del running[filename]
+            if process.exitcode != 0:
+                # worker crashed or was killed, never leave its partial output behind
+                failed.append(filename)
+                recordFailure(manifestFor(filename, manifests), filename)
+                dataset_path, filedate = outputPartition(filename)
+                tmp_output = os.path.join(dataset_path, '.day='+filedate+'.tmp')
+                if os.path.exists(tmp_output):
+                    shutil.rmtree(tmp_output)
+                print("#FAILED {} (exit code {})".format(filename, process.exitcode))
+    return converted, failed
+
 def main(args):
     path_to_files = args[0]
+    # optional worker count and memory budget in GB for parallel conversion
+    workers = int(args[1]) if len(args) > 1 else 1
+    memory_budget = float(args[2])*1024**3 if len(args) > 2 else None
 #    if path_to_files.endswith('.json.gz'):
 #        # convert a single file
 #        tweets = loadTweetsJson(path_to_files)
@@ -244,20 +715,45 @@ def main(args):
 #    else:
     # convert files in a directory
     if path_to_files.endswith('/'):
-        files = glob.glob(os.path.join(path_to_files, '*.json.gz'))
+        # sorted, so the earliest file to capture a tweet is the one that keeps it
+        files = sorted(glob.glob(os.path.join(path_to_files, '*.json.gz')))
     #     logging.warning('\n'.join(files))
     # query string
     else:
         files = sorted(glob.glob(path_to_files))
+    manifests = {}
+    to_convert = [filename for filename in files if not isUpToDate(manifestFor(filename, manifests), filename)]
+    skipped = len(files)-len(to_convert)
+    print("#{} files found, {} already up to date".format(len(files), skipped))
+    files = to_convert
     print("#{} files to be processed!".format(len(files)))
     
-    for filename in files:
-        # filename="./data/elections2018_tweets-20181003.json.gz"
-        tweets = loadTweetsJson(filename)
-        tweets.to_pickle(filename.split('.')[0]+'.pkl.gz')
-#        tweets.to_parquet(filename.split('.')[0]+'.parquet', 
-#                          #compression='gzip'
-#                         )
+    start = time.time()
+    if workers > 1:
+        print("#converting with {} workers".format(workers))
+        converted, failed = convertParallel(files, workers, memory_budget, manifests)
+    else:
+        converted = []
+        failed = []
+        for filename in files:
+            # filename="./data/elections2018_tweets-20181003.json.gz"
+            try:
+                result = convertFile(filename)
+            except Exception as e:
+                # record it and carry on, the next run will retry it
+                print(filename, e)
+                failed.append(filename)
+                recordFailure(manifestFor(filename, manifests), filename)
+                continue
+            converted.append(result)
+            recordConversion(manifestFor(filename, manifests), result)
+
+    reportThroughput(converted, failed, skipped, time.time()-start)
+    # refresh the tweet id index of every dataset we wrote to, only the changed days get re-read
+    for dataset_path in sorted({outputPartition(result['filename'])[0] for result in converted}):
+        tweetio.build_tweet_index(dataset_path)
+    for conn in manifests.values():
+        conn.close()
 
 if __name__ == '__main__':
-    main(sys.argv[1:])
\ No newline at end of file
+    main(sys.argv[1:])
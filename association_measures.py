@@ -0,0 +1,55 @@
+"""
+Script to score every edge of the collocation graph by how strongly its hashtags are associated,
+rather than by raw co-occurrence count, which favours hashtags that are simply popular.
+Computes PMI, NPMI, log-likelihood ratio and Dice for all edges at once, see disslib.edge_associations.
+Works on pruned graphs too, as the counts all come from the edges the graph actually has.
+
+Usage:
+    python association_measures.py [binary graph, default data/collocations/2_hashtag_graph.npz]
+
+Returns:
+    [graph]_associations.csv
+        The edges CSV with PMI, NPMI, LLR and Dice columns added.
+    [graph]_associations.npz
+        The binary graph with pmi, npmi, llr and dice arrays added; loads with disslib.load_graph.
+"""
+import sys
+import time
+import numpy as np
+import disslib
+
+def main(args):
+    """
+    Driver function to load the graph, score the edges and write them out.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    graph_filename = args[0] if len(args) > 0 else "data/collocations/2_hashtag_graph.npz"
+    stem = graph_filename[:-len(".npz")] if graph_filename.endswith(".npz") else graph_filename
+
+    start = time.time()
+    graph = disslib.load_graph(graph_filename)
+    if graph["combos"].shape[1] != 2:
+        print("Association measures are only defined for 2-collocations.")
+        sys.exit(1)
+    print(f"{disslib.nicetime(start, time.time())} | Loaded {len(graph['labels'])} nodes and {len(graph['weights'])} edges")
+
+    scores = disslib.edge_associations(graph)
+    print(f"{disslib.nicetime(start, time.time())} | Scored edges")
+
+    # binary first, it's the quick one to write
+    with np.load(graph_filename) as graph_file:
+        arrays = {name: graph_file[name] for name in graph_file.files}
+    np.savez(stem + "_associations.npz", **arrays, **scores)
+
+    _, edges = disslib.graph_frames(graph)
+    edges["PMI"] = scores["pmi"]
+    edges["NPMI"] = scores["npmi"]
+    edges["LLR"] = scores["llr"]
+    edges["Dice"] = scores["dice"]
+    edges.to_csv(stem + "_associations.csv", sep=" ", quotechar="|", index=False, float_format="%.6g", encoding="utf-8")
+    print(f"{disslib.nicetime(start, time.time())} | Written to {stem}_associations.csv and {stem}_associations.npz")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
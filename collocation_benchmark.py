@@ -0,0 +1,70 @@
+"""
+Benchmark for collocation counting, comparing the per-tweet loop to the vectorised counter on a day partition.
+Checks the two write identical edge and appearance files, and identical hashtag data, before reporting any timings.
+
+Usage:
+    python collocation_benchmark.py data/elections2022/parquet/day=20220806
+
+Returns:
+    Terminal output of tweets/second for both counters.
+"""
+import os
+import sys
+import time
+import filecmp
+import tempfile
+import disslib
+import collocations
+
+def main(args):
+    """
+    Driver function to load the day, check the counters agree, and time them.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    partition = args[0]
+
+    # load and filter the day once, so we only time the counting
+    print(f"Loading partition {partition}...")
+    base_data = disslib.load_tweets_parquet(partition, columns=collocations.COLLOCATION_COLUMNS)
+    no_nan = base_data[base_data["hashtags"].notna()]
+    no_retweets = no_nan[no_nan["retweeted_status.id_str"].isnull()]
+    print(f"{len(no_retweets)} tweets to count.")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = {}
+        for method, update_function in (("loop", collocations.update_collocations),
+                                        ("vectorised", collocations.update_collocations_vectorised)):
+            vocabulary = {}
+            hashtag_data = {}
+            start = time.perf_counter()
+            day_combos = update_function(vocabulary, hashtag_data, no_retweets, 2)
+            combos, weights = disslib.merge_collocations(*disslib.empty_collocations(2), day_combos)
+            seconds = time.perf_counter() - start
+            disslib.write_collocations(
+                os.path.join(output_dir, method + "_collocations.csv"),
+                os.path.join(output_dir, method + "_appearances.csv"),
+                combos,
+                weights,
+                list(vocabulary)
+            )
+            results[method] = (hashtag_data, seconds, len(combos))
+
+        # both counters must write the same files and collect the same tweet IDs
+        for output in ("collocations", "appearances"):
+            if not filecmp.cmp(os.path.join(output_dir, "loop_" + output + ".csv"),
+                               os.path.join(output_dir, "vectorised_" + output + ".csv"), shallow=False):
+                print(f"{output} files differ")
+                sys.exit(1)
+        if results["loop"][0] != results["vectorised"][0]:
+            print("hashtag data differs")
+            sys.exit(1)
+        print(f"Outputs match: {results['loop'][2]} unique collocations.")
+
+    loop_time = results["loop"][1]
+    vectorised_time = results["vectorised"][1]
+    print(f"loop: {len(no_retweets) / loop_time:,.0f} tweets/s, vectorised: {len(no_retweets) / vectorised_time:,.0f} tweets/s ({loop_time / vectorised_time:.2f}x)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,59 @@
+"""
+Script to write out the collocation graph of a date window, e.g. a week, or before/after the first round.
+Sums the per-day counts kept in the collocation checkpoint, so collocations.py has to have been run first,
+but no tweet data is read again.
+
+Usage:
+    python collocation_window.py <first day YYYYMMDD> <last day YYYYMMDD> [combination size]
+
+Returns:
+    data/collocations/x_hashtag_collocations_[first]-[last].csv
+        Edges of the window, as in x_hashtag_collocations.csv.
+    data/collocations/x_hashtag_appearances_[first]-[last].csv
+        Nodes of the window, as in x_hashtag_appearances.csv.
+    data/collocations/x_hashtag_graph_[first]-[last].npz
+        Both in one binary file, as in x_hashtag_graph.npz.
+"""
+import sys
+import time
+import disslib
+
+def main(args):
+    """
+    Driver function to read the arguments and write the window out.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+    start_date = args[0]
+    end_date = args[1]
+    combination_size = int(args[2]) if len(args) > 2 else 2
+
+    start = time.time()
+    window, days = disslib.collocation_window(
+        "data/collocations/" + str(combination_size) + "_hashtag_checkpoint",
+        combination_size,
+        start_date,
+        end_date
+    )
+    if len(days) == 0:
+        print(f"No days between {start_date} and {end_date} in the checkpoint.")
+        sys.exit(1)
+    print(f"{disslib.nicetime(start, time.time())} | Summed {len(days)} days, {days[0]} to {days[-1]}: {len(window['combos'])} unique collocations")
+
+    suffix = "_" + start_date + "-" + end_date + ".csv"
+    disslib.write_collocations(
+        "data/collocations/" + str(combination_size) + "_hashtag_collocations" + suffix,
+        "data/collocations/" + str(combination_size) + "_hashtag_appearances" + suffix,
+        window["combos"],
+        window["weights"],
+        window["labels"],
+        graph_filename="data/collocations/" + str(combination_size) + "_hashtag_graph_" + start_date + "-" + end_date + ".npz"
+    )
+    print(f"{disslib.nicetime(start, time.time())} | Done.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
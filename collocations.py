@@ -3,6 +3,9 @@ Python script to iterate through the data given for the project and collate it a
 The collocation matrix is a record of every hashtag and the other hashtags it appears next to. Effectively, we can consider 
 it an edge matrix complement to the node matrix of the hashtags themselves; these collocations represent connections we can analyse.
 
+Usage:
+    python collocations.py <data directory/> [combination size] [vectorised|loop|approximate] [workers]
+
 Returns:
     logs/collocations.log
         Logfile for the script. Doesn't contain much, most information is printed to terminal.
@@ -11,19 +14,27 @@ Returns:
     data/collocations/x_hashtag_collocations.csv
         CSV file for dataframe of collocated tweets for later processing.
         Effectively an edge matrix.
-    data/collocations/x_hashtag_tweetIDs.pkl
-        PKL files of every tweet ID we want to process later to get the toxicity/sentiment/whatever
-        Basically just a list of everything that contains 2 or more tweets.
+    data/collocations/x_hashtag_graph.npz
+        The nodes and edges in one binary file, see disslib.load_graph. Loads far faster than the CSVs.
+    data/collocations/x_hashtag_collocations_topN.csv
+        Approximate mode only, instead of the files above: the N heaviest collocations, heaviest first.
+    data/collocations/x_hashtag_postings/
+        The IDs of every tweet each hashtag appears in, the ones we want to process later to get the toxicity/sentiment/whatever,
+        as sorted, memory-mappable arrays, see disslib.load_postings. Replaces the old x_hashtag_tweetIDs.pkl dictionary.
+    data/collocations/x_hashtag_checkpoint/
+        Versioned checkpoint of the counts of every day so far. Reruns only count new or changed days and fold them in.
 """
 
 import sys
+import math
 import logging
 import itertools
 import time
-import pickle
-import csv
-import datetime as dt
+from array import array
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
+import datetime as dt
 import disslib
 
 # set up logging
@@ -32,6 +43,22 @@ logging.basicConfig(filename="logs/collocations.log",  \
                 encoding="utf-8",         \
                 level=logging.DEBUG)
 
+# the only columns of the converted data we need to build the collocations
+COLLOCATION_COLUMNS = ["id_str", "hashtags", "retweeted_status.id_str"]
+
+# ways of counting the collocations of a day, chosen by the optional third argument
+# the first two give identical outputs; the vectorised one only covers 2-collocations and falls back to the loop otherwise
+# approximate keeps only the heaviest combinations, in fixed memory, for combination sizes where the exact counts won't fit
+COUNTING_METHODS = ("vectorised", "loop", "approximate")
+
+# approximate counting: heaviest combinations kept, memory for the count-min sketch, and combinations per batch.
+# A batch never holds more than APPROXIMATE_BATCH_COMBINATIONS combinations, as a tweet with 50 hashtags
+# makes C(50,4) = 230,300 4-combinations on its own; one making more than that is counted in chunks of it.
+# Past the sketch, the batch and the top N, the only memory that grows is the vocabulary, one entry per distinct hashtag.
+APPROXIMATE_TOP_N = 10000
+APPROXIMATE_SKETCH_BYTES = 512 * 1024**2
+APPROXIMATE_BATCH_COMBINATIONS = 2 * 1024**2
+
 def main(args):
     """
     Driver function to call other functions and set up variables used in them.
@@ -40,122 +67,280 @@ def main(args):
     Args:
         args (list): List of given arguments from the command line.
     """
-    # get all the pkl files
-    # we use the pkl files to get the tweet IDs because the PKLs are much lighter to load than the JSON files
+    # get all the day partitions of the converted parquet dataset
+    # we use the converted data to get the tweet IDs because it's much lighter to load than the JSON files,
+    # and we only read the three columns we need from it
     # later we can load the JSON files and just request the IDs we already collected
-    pkl_files, _ = disslib.get_tweet_files(args[0], pairs_only=True)
+    partitions = disslib.get_tweet_partitions(args[0])
 
     # get the combination size from the command line
     # final analysis only requires 2-size collocations
     # higher numbers imply "stronger" connections
-    if len(args) == 2:
+    if len(args) >= 2:
         combination_size = int(args[1])
         print(f"Running hashtag collocations with a combination size of {combination_size}.")
     else:
         combination_size = 2
         print(f"Please provide a combination size as a second argument. Defaulting to {combination_size}.")
 
+    # get the counting method from the command line
+    method = args[2] if len(args) >= 3 else COUNTING_METHODS[0]
+    if method not in COUNTING_METHODS:
+        print(f"Unknown counting method {method}, choose from: {', '.join(COUNTING_METHODS)}")
+        sys.exit(1)
+    if method == "vectorised" and combination_size != 2:
+        method = "loop"
+        print(f"The vectorised counter only handles 2-collocations. Using the loop for size {combination_size}.")
+    update_function = update_collocations_vectorised if method == "vectorised" else update_collocations
+    print(f"Counting collocations with the {method} method.")
+    approximate = method == "approximate"
+
+    # get the worker count from the command line
+    # with a worker count the days are counted in a process pool, otherwise one by one
+    workers = int(args[3]) if len(args) >= 4 else None
+    if approximate and workers is not None:
+        workers = None
+        print("Approximate counting runs in a single process, ignoring the worker count.")
+
     # prepare terminal and time logging
     print("")
     print(dt.datetime.now())
     start = time.time()
 
     # set up some printing variables
-    files_to_process = len(pkl_files)-1
+    files_to_process = len(partitions)-1
     file_digits = len(str(files_to_process))
     print(f"{files_to_process} file pairs to be processed.")
 
-    # initialise recording dicts
-    collocation_dict = {}
-    hashtag_data = {}
+    # initialise recording structures
+    # hashtags are interned to integer ids in order of first appearance, so the counts are small integer arrays
+    # rather than a dictionary keyed on joined strings
+    vocabulary = {}
+    if approximate:
+        sketch = disslib.new_sketch(APPROXIMATE_SKETCH_BYTES)
+        hitters, estimates = disslib.empty_collocations(combination_size)
+    else:
+        # exact counts are kept in a checkpoint, a slice per day, so only new or changed days need counting
+        checkpoint = disslib.load_collocation_checkpoint(
+            "data/collocations/" + str(combination_size) + "_hashtag_checkpoint",
+            combination_size
+        )
+        states = {disslib.partition_date(partition): disslib.partition_state(partition) for partition in partitions}
+        removed = [date for date in checkpoint["days"] if date not in states]
+        changed = [partition for partition in partitions
+                   if checkpoint["days"].get(disslib.partition_date(partition), {}).get("state") != states[disslib.partition_date(partition)]]
+        replaced = len(removed) > 0 or any(disslib.partition_date(partition) in checkpoint["days"] for partition in changed)
+        print(f"Checkpoint version {checkpoint['version']} holds {len(checkpoint['days'])} days: "
+              f"{len(partitions)-len(changed)} up to date, {len(changed)} new or changed, {len(removed)} removed.")
+        for date in removed:
+            disslib.remove_checkpoint_day(checkpoint, date)
+        partitions = changed
+        files_to_process = len(partitions)-1
+        file_digits = len(str(files_to_process))
 
     # single variable to prevent any "possible undefined" later on
     final_i = 0
 
+    if workers is not None:
+        # map-reduce path
+        # every day is counted on its own in the pool, then the days are folded together in the checkpoint, in day order,
+        # so the output is the same for any number of workers
+        final_i = files_to_process
+        print(f"{str(0).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Counting {len(partitions)} partitions with {workers} workers")
+        with Pool(workers) as pool:
+            partials = pool.map(count_partition, [(partition, combination_size, update_function) for partition in partitions])
+        for partition, partial in zip(partitions, partials):
+            date = disslib.partition_date(partition)
+            disslib.add_checkpoint_day(checkpoint, date, states[date], partial)
+        partitions = []
+
     # main loop
     # iterates over each file
-    for i, pkl_file in enumerate(pkl_files):
+    for i, partition in enumerate(partitions):
         final_i = i
 
         # record loop start time
         proc_start = time.time()
-        print(f"{str(i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, proc_start)} | Now loading file: {pkl_file}")
+        print(f"{str(i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, proc_start)} | Now loading partition: {partition}")
 
-        # read pkl file
-        base_data = pd.read_pickle(pkl_file)
-        pkl_read = time.time()
-        print(f"{str(i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, pkl_read)} | Read file containing {len(base_data)} entries")
+        # read the partition, only the columns we use
+        base_data = disslib.load_tweets_parquet(partition, columns=COLLOCATION_COLUMNS)
+        data_read = time.time()
+        print(f"{str(i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, data_read)} | Read partition containing {len(base_data)} entries")
 
         # process data:
         # - drop posts with no hashtags
         # - drop posts which are retweets
-        no_nan = base_data[base_data["hashtags"].notna()]
-        no_retweets = no_nan[no_nan["retweeted_status.id_str"].isnull()]
-        #no_quotes = no_retweets[no_retweets["quoted_status.id_str"].isnull()]
+        no_nan, no_retweets = filter_collocation_data(base_data)
         nans_dropped = time.time()
         print(f"{str(i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, nans_dropped)} | Dropped {len(base_data)-len(no_retweets)} bad rows, leaving {len(no_retweets)} rows to process.")
         print(f"{str(i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, nans_dropped)} |→ Base data: {len(base_data)}, no NaN: {len(no_nan)}, no retweets: {len(no_retweets)}")
 
-        # update the collocation & hashtag dictionaries
-        update_collocations(collocation_dict, hashtag_data, no_retweets, combination_size)
+        # update the collocation counts & hashtag dictionary
+        if approximate:
+            # a batch of tweets at a time, so only one batch of combinations is ever held
+            # the tweet ID pkl isn't written in this mode, so the hashtag data is thrown away
+            for batch_combos in approximate_batches(vocabulary, no_retweets, combination_size, update_function):
+                hitters, estimates = disslib.update_heavy_hitters(sketch, hitters, batch_combos, APPROXIMATE_TOP_N)
+        else:
+            date = disslib.partition_date(partition)
+            disslib.add_checkpoint_day(checkpoint, date, states[date], count_data(no_retweets, combination_size, update_function))
         collocs_updated = time.time()
         print(f"{str(i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, collocs_updated)} | Collocations updated")
 
+    if not approximate:
+        # fold the new days into the checkpoint and save it as the next version
+        disslib.refresh_checkpoint_aggregate(checkpoint, replaced)
+        disslib.save_collocation_checkpoint(checkpoint)
+        print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Checkpoint version {checkpoint['version']} saved with {len(checkpoint['days'])} days")
+        postings = checkpoint["aggregate"]
+        combos = postings["combos"]
+        weights = postings["weights"]
+
     # print collocations
     # should really be using disslib.niceprint() but I'm not changing that now, the work is finished
     print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Work finished.")
     print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Combination size: {combination_size}")
-    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Total unique collocations: {len(collocation_dict)}")
-
-    # write the collocations CSV out
-    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Writing edges csv...")
-    filename = "data/collocations/" + str(combination_size) + "_hashtag_collocations.csv"
-    sorted_collocations = list(sorted(collocation_dict.items(), key=lambda x: x[1], reverse=False))
-    with open(filename, "w+", encoding="utf-8") as csv_handle:
-        appearances_dict = {}
-        edges_writer = csv.writer(csv_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-        # header row
-        edges_writer.writerow(["Source", "Target", "Weight"])
-        # writer loop for each row
-        for (key, weight) in sorted_collocations:
-            #if weight > 1000:
-            u, v = tuple(key.split(", "))
-            edges_writer.writerow([u, v, weight])
-            disslib.increment_occurrence(appearances_dict, u, weight)
-            disslib.increment_occurrence(appearances_dict, v, weight)
-    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Done.")
+    if approximate:
+        # approximate path: write the heaviest combinations and say how far out their weights can be
+        epsilon, delta, bound = disslib.sketch_error(sketch)
+        print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Total collocations counted: {sketch['total']}")
+        print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Weights are never under the true count, and with probability {1-delta:.4f} over by at most {bound:.1f} (epsilon {epsilon:.2e})")
+        filename = "data/collocations/" + str(combination_size) + "_hashtag_collocations_top" + str(APPROXIMATE_TOP_N) + ".csv"
+        print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Writing top {len(hitters)} collocations to {filename}...")
+        disslib.write_heavy_hitters(filename, hitters, estimates, list(vocabulary))
+        print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Done.")
+        return
 
-    # write the nodes CSV out
-    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Writing nodes csv...")
-    filename = "data/collocations/" + str(combination_size) + "_hashtag_appearances.csv"
-    with open(filename, "w+", encoding="utf-8") as csv_appearances_handle:
-        appearances_writer = csv.writer(csv_appearances_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-        appearances_writer.writerow(["Label", "Appearances"])
-        for node, appearances in appearances_dict.items():
-            appearances_writer.writerow([node, appearances])
+    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Total unique collocations: {len(combos)}")
+
+    # write the collocations (edges) and appearances (nodes) CSVs out
+    # the checkpoint's labels are the hashtag of each global id
+    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Writing edges and nodes csvs and binary graph...")
+    disslib.write_collocations(
+        "data/collocations/" + str(combination_size) + "_hashtag_collocations.csv",
+        "data/collocations/" + str(combination_size) + "_hashtag_appearances.csv",
+        combos,
+        weights,
+        checkpoint["labels"],
+        graph_filename="data/collocations/" + str(combination_size) + "_hashtag_graph.npz"
+    )
     print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Done.")
 
-    # write the tweet ID pkl out
-    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Dumping hashtag:IDs dictionary to pkl...")
-    filename = "data/collocations/" + str(combination_size) + "_hashtag_tweetIDs.pkl"
-    with open(filename, "wb") as pkl_ids_handle:
-        pickle.dump(hashtag_data, pkl_ids_handle)
+    # write the hashtag:IDs postings straight from the checkpoint's arrays
+    print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Writing hashtag:IDs postings store...")
+    disslib.write_postings(
+        "data/collocations/" + str(combination_size) + "_hashtag_postings",
+        postings["labels"],
+        postings["offsets"],
+        postings["ids"]
+    )
     print(f"{str(final_i).rjust(file_digits)}/{files_to_process} | {disslib.nicetime(start, time.time())} | Done.")
 
-def update_collocations(collocation_dict, hashtag_data, data, combination_size):
+def filter_collocation_data(base_data):
+    """
+    Subroutine to drop the posts with no hashtags, then the retweets.
+
+    Args:
+        base_data (pd.df): Dataframe of a day of converted data
+
+    Returns:
+        pd.df: Posts with hashtags
+        pd.df: Posts with hashtags which aren't retweets
+    """
+    no_nan = base_data[base_data["hashtags"].notna()]
+    no_retweets = no_nan[no_nan["retweeted_status.id_str"].isnull()]
+    #no_quotes = no_retweets[no_retweets["quoted_status.id_str"].isnull()]
+    return no_nan, no_retweets
+
+def approximate_batches(vocabulary, data, combination_size, update_function):
+    """
+    Generator to count some data's collocations in batches for approximate counting, so memory is bounded by combinations rather than tweets.
+    Tweets are added to a batch until the next one would take it past APPROXIMATE_BATCH_COMBINATIONS;
+    a tweet making more than that on its own has its combinations generated and yielded in chunks of that size,
+    so every combination is still counted.
+
+    Args:
+        vocabulary (dict): Dictionary of {hashtag:id}, new hashtags are added with the next id
+        data (pd.df): Dataframe of the data we want to extract the hashtags from
+        combination_size (int): Size of combinations requested
+        update_function (function): update_collocations or update_collocations_vectorised
+
+    Yields:
+        np.array: (n, combination_size) array of hashtag ids, n at most APPROXIMATE_BATCH_COMBINATIONS
+    """
+    combinations = data["hashtags"].map(
+        lambda hashtags_list: math.comb(len(hashtags_list), combination_size) if isinstance(hashtags_list, list) else 0
+    ).to_numpy()
+    batch_start = 0
+    batch_combinations = 0
+    for row, row_combinations in enumerate(combinations.tolist()):
+        if batch_combinations + row_combinations > APPROXIMATE_BATCH_COMBINATIONS and row > batch_start:
+            yield update_function(vocabulary, {}, data[batch_start:row], combination_size)
+            batch_start = row
+            batch_combinations = 0
+        if row_combinations > APPROXIMATE_BATCH_COMBINATIONS:
+            # sorted and interned as update_collocations does, then sliced off a chunk at a time
+            hashtag_ids = [vocabulary.setdefault(hashtag, len(vocabulary)) for hashtag in sorted(data["hashtags"].iloc[row])]
+            tweet_combinations = itertools.combinations(hashtag_ids, combination_size)
+            chunk = np.fromiter(itertools.chain.from_iterable(itertools.islice(tweet_combinations, APPROXIMATE_BATCH_COMBINATIONS)), dtype=np.int32)
+            while len(chunk) > 0:
+                yield chunk.reshape(-1, combination_size)
+                chunk = np.fromiter(itertools.chain.from_iterable(itertools.islice(tweet_combinations, APPROXIMATE_BATCH_COMBINATIONS)), dtype=np.int32)
+            batch_start = row + 1
+            continue
+        batch_combinations += row_combinations
+    if batch_start < len(data):
+        yield update_function(vocabulary, {}, data[batch_start:], combination_size)
+
+def count_partition(arg_tuple):
     """
-    Subroutine to update the collocations and hashtag data
+    Pool worker to count the collocations of one day partition on its own.
 
     Args:
-        collocation_dict (dict): Dictionary of {collocation:appearances}
+        arg_tuple (tuple): (partition, combination size, update function)
+
+    Returns:
+        dict: Partial collocation counts and tweet ID postings, see disslib.collocation_partial
+    """
+    (partition, combination_size, update_function) = arg_tuple
+    base_data = disslib.load_tweets_parquet(partition, columns=COLLOCATION_COLUMNS)
+    _, no_retweets = filter_collocation_data(base_data)
+    return count_data(no_retweets, combination_size, update_function)
+
+def count_data(data, combination_size, update_function):
+    """
+    Subroutine to count the collocations of some data on its own, with its own vocabulary.
+
+    Args:
+        data (pd.df): Dataframe of the data we want to extract the hashtags from
+        combination_size (int): Size of combinations requested
+        update_function (function): update_collocations or update_collocations_vectorised
+
+    Returns:
+        dict: Partial collocation counts and tweet ID postings, see disslib.collocation_partial
+    """
+    vocabulary = {}
+    hashtag_data = {}
+    day_combos = update_function(vocabulary, hashtag_data, data, combination_size)
+    combos, weights = disslib.merge_collocations(*disslib.empty_collocations(combination_size), day_combos)
+    return disslib.collocation_partial(vocabulary, combos, weights, hashtag_data)
+
+def update_collocations(vocabulary, hashtag_data, data, combination_size):
+    """
+    Subroutine to collect the collocations of some data, and update the hashtag data
+
+    Args:
+        vocabulary (dict): Dictionary of {hashtag:id}, new hashtags are added with the next id
         hashtag_data (dict): Dictionary of {hashtag:set([tweet IDs])}
         data (pd.df): Dataframe of the data we want to extract the hashtags from
         combination_size (int): Size of combinations requested
 
     Returns:
-        dict: Updated collocation dictionary
-        dict: Updated appearance dictionary
+        np.array: (n, combination_size) array of hashtag ids, one row per collocation found
     """
+    # flat buffer of 4 byte ids rather than a list of python ints
+    collocation_ids = array("i")
     for _, row in data.iterrows():
         # main loop
         hashtags_list = row["hashtags"]
@@ -171,11 +356,12 @@ def update_collocations(collocation_dict, hashtag_data, data, combination_size):
             else:
                 # sort hashtags to prevent "backwards" combinations
                 hashtags_list = sorted(hashtags_list)
-                # generate the collocations
-                combinations = itertools.combinations(hashtags_list, combination_size)
+                # generate the collocations, on ids so nothing is built from strings
+                hashtag_ids = [vocabulary.setdefault(hashtag, len(vocabulary)) for hashtag in hashtags_list]
+                combinations = itertools.combinations(hashtag_ids, combination_size)
                 for combination in combinations:
-                    # add all collocations to the collocation dictionary
-                    collocation_dict = disslib.increment_occurrence(collocation_dict, ", ".join(combination))
+                    # add all collocations to the buffer
+                    collocation_ids.extend(combination)
                 for hashtag in hashtags_list:
                     if hashtag in hashtag_data:
                         # add the tweet ID to the hashtag's dictionary
@@ -185,7 +371,55 @@ def update_collocations(collocation_dict, hashtag_data, data, combination_size):
                     else:
                         hashtag_data[hashtag] = set([int(id_str)])
 
-    return collocation_dict, hashtag_data
+    return np.frombuffer(collocation_ids, dtype=np.int32).reshape(-1, combination_size)
+
+def update_collocations_vectorised(vocabulary, hashtag_data, data, combination_size=2):
+    """
+    Subroutine to collect the 2-collocations of some data, and update the hashtag data, over the whole day at once.
+    Gives exactly what update_collocations does: the same ids, the same collocations in the same order,
+    and the same hashtag data, so the outputs written from either are identical.
+
+    Args:
+        vocabulary (dict): Dictionary of {hashtag:id}, new hashtags are added with the next id
+        hashtag_data (dict): Dictionary of {hashtag:set([tweet IDs])}
+        data (pd.df): Dataframe of the data we want to extract the hashtags from
+        combination_size (int, optional): Size of combinations requested, only 2 is supported. Defaults to 2.
+
+    Returns:
+        np.array: (n, 2) array of hashtag ids, one row per collocation found
+    """
+    # skip tweets with less hashtags than the combination size, and anything that isn't a list, as the loop does
+    counts = data["hashtags"].map(lambda hashtags_list: len(hashtags_list) if isinstance(hashtags_list, list) else 0)
+    data = data[counts >= combination_size]
+    if len(data) == 0:
+        return np.empty((0, combination_size), dtype=np.int32)
+
+    # one row per (tweet, hashtag), hashtags sorted within each tweet to prevent "backwards" combinations
+    exploded = data["hashtags"].reset_index(drop=True).explode()
+    exploded = pd.DataFrame({"tweet": exploded.index.to_numpy(), "hashtag": exploded.to_numpy()})
+    exploded = exploded.sort_values(["tweet", "hashtag"], kind="stable")
+    tweets = exploded["tweet"].to_numpy()
+
+    # intern the hashtags: factorize numbers them in order of first appearance, just as the loop meets them
+    codes, uniques = pd.factorize(exploded["hashtag"])
+    unique_ids = np.asarray([vocabulary.setdefault(hashtag, len(vocabulary)) for hashtag in uniques], dtype=np.int32)
+    hashtag_ids = unique_ids[codes]
+
+    # add the tweet IDs to each hashtag's set, hashtags in first appearance order and IDs in row order
+    tweet_ids = pd.to_numeric(data["id_str"]).to_numpy()[tweets]
+    by_code = np.argsort(codes, kind="stable")
+    boundaries = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+    for hashtag, ids in zip(uniques, np.split(tweet_ids[by_code], boundaries)):
+        hashtag_data.setdefault(hashtag, set()).update(ids.tolist())
+
+    # generate every pair within each tweet, in itertools.combinations order:
+    # each hashtag is paired with every hashtag after it in the same tweet
+    tweet_ends = np.searchsorted(tweets, tweets, side="right")
+    pairs_per_hashtag = tweet_ends - np.arange(len(tweets)) - 1
+    firsts = np.repeat(np.arange(len(tweets)), pairs_per_hashtag)
+    pair_starts = np.repeat(np.cumsum(pairs_per_hashtag) - pairs_per_hashtag, pairs_per_hashtag)
+    seconds = firsts + 1 + np.arange(len(firsts)) - pair_starts
+    return np.stack([hashtag_ids[firsts], hashtag_ids[seconds]], axis=1)
 
 if __name__ == "__main__":
     main(sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Script to find the modularity communities of the collocation graph, replacing the modularity step in gephi.
+Runs headless on the binary graph written by collocations.py or edges_filter.py, so it can take the whole graph
+rather than only what gephi can open without crashing. The same seed always gives the same communities.
+
+Usage:
+    python communities.py [binary graph] [leiden|louvain] [seed] [resolution]
+    e.g. python communities.py data/collocations/2_hashtag_graph_1000plus.npz leiden 42
+
+Returns:
+    data/collocations/2_hashtag_modularities_nodes_[graph suffix].csv
+        Nodes with their appearances and community, in the format gephi exported and modularities_analysis.py reads.
+        [graph suffix] is whatever followed "graph_" in the graph's name, e.g. 1000plus, or "all" for the whole graph.
+"""
+import os
+import sys
+import csv
+import time
+import numpy as np
+import disslib
+
+def main(args):
+    """
+    Driver function to read the arguments, find the communities and write them out.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    graph_filename = args[0] if len(args) > 0 else "data/collocations/2_hashtag_graph.npz"
+    method = args[1] if len(args) > 1 else "leiden"
+    seed = int(args[2]) if len(args) > 2 else 0
+    resolution = float(args[3]) if len(args) > 3 else 1.0
+    if method not in ("leiden", "louvain"):
+        print(__doc__)
+        sys.exit(1)
+
+    start = time.time()
+    graph = disslib.load_graph(graph_filename)
+    indptr, indices, data = disslib.graph_adjacency(graph)
+    print(f"{disslib.nicetime(start, time.time())} | Loaded {len(graph['labels'])} nodes and {len(graph['weights'])} edges from {graph_filename}")
+
+    print(f"{disslib.nicetime(start, time.time())} | Running {method}, seed {seed}, resolution {resolution}")
+    communities, modularity, levels = disslib.detect_communities(
+        indptr, indices, data.astype(np.float64), method=method, resolution=resolution, seed=seed
+    )
+    print(f"{disslib.nicetime(start, time.time())} | {len(np.unique(communities))} communities, modularity {modularity:.6f}, {len(levels)} levels in {sum(level[4] for level in levels):.2f}s")
+
+    filename = os.path.join(os.path.dirname(graph_filename), "2_hashtag_modularities_nodes_" + graph_suffix(graph_filename) + ".csv")
+    with open(filename, "w+", encoding="utf-8") as csv_handle:
+        nodes_writer = csv.writer(csv_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        nodes_writer.writerow(["ID", "Appearances", "modularity_class"])
+        for label, appearances, community in zip(graph["labels"], graph["appearances"].tolist(), communities.tolist()):
+            nodes_writer.writerow([label, appearances, community])
+    print(f"{disslib.nicetime(start, time.time())} | Written to {filename}")
+
+def graph_suffix(graph_filename):
+    """
+    Helper function to get the part of a graph's filename which says how it was pruned.
+
+    Args:
+        graph_filename (string): Path of the binary graph
+
+    Returns:
+        string: e.g. "1000plus" for 2_hashtag_graph_1000plus.npz, "all" for 2_hashtag_graph.npz
+    """
+    stem = os.path.basename(graph_filename).split(".")[0]
+    return stem.split("graph_", 1)[1] if "graph_" in stem else "all"
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -9,7 +9,8 @@ import disslib
 
 def main():
     # call the files
-    pkl_counter()
+    parquet_counter()
+    #pkl_counter()
     #csv_counter()
 
 def csv_counter():
@@ -41,5 +42,22 @@ def pkl_counter():
     print(f"Total with no hashtags filtered: {no_hashtags_rows}")
     print(f"Total with no retweets: {no_retweet_rows}")
 
+def parquet_counter():
+    partitions = disslib.get_tweet_partitions("data/elections2022/")
+    total_rows = 0
+    no_hashtags_rows = 0
+    no_retweet_rows = 0
+    for partition in partitions:
+        # same counts as pkl_counter, but only the two columns we filter on are read
+        tweets = disslib.load_tweets_parquet(partition, columns=["hashtags", "retweeted_status.id_str"])
+        total_rows += len(tweets.index)
+        no_nan = tweets[tweets["hashtags"].notna()]
+        no_hashtags_rows += len(no_nan.index)
+        no_retweets = no_nan[no_nan["retweeted_status.id_str"].isnull()]
+        no_retweet_rows += len(no_retweets.index)
+    print(f"Total datapoints: {total_rows}")
+    print(f"Total with no hashtags filtered: {no_hashtags_rows}")
+    print(f"Total with no retweets: {no_retweet_rows}")
+
 if __name__ == '__main__':
     main()
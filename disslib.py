@@ -9,16 +9,74 @@ import glob
 import logging
 import string
 import re
+import shutil
+import time
+import zlib
+from collections import deque
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from statistics import fmean
 import torch
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
 import nltk
 import spacy
 from simpletransformers.classification import ClassificationModel
+# tweet reading and writing lives in tweetio so the converter can use it without the NLP stack
+from tweetio import (
+    TWEET_BATCH_SIZE,
+    TWEET_FIELDS,
+    TWEET_COLUMNS,
+    TWEET_EXTRACTOR,
+    TWEET_DATASET,
+    SEEN_IDS,
+    TWEET_INDEX,
+    TWEET_ROW_GROUP_SIZE,
+    nicetime,
+    safeget,
+    compile_extractor,
+    load_tweets_json,
+    stream_tweets_json,
+    tweets_batch,
+    file_date,
+    tweet_dataset_path,
+    tweet_partition_path,
+    partition_date,
+    write_tweets_partition,
+    pa_table,
+    tweets_from_table,
+    line_parts,
+    line_part,
+    count_lines,
+    split_tweets_json,
+    seen_ids_path,
+    seen_id_run_name,
+    tweet_ids_array,
+    load_seen_id_runs,
+    seen_id_mask,
+    record_seen_ids,
+    load_seen_id_run,
+    tweet_index_path,
+    dataset_part_files,
+    part_file_state,
+    build_tweet_index,
+)
 
 # global regex, I know it's bad practice, sue me
 URL_PATTERN = r"(http|ftp|https)://([\w_-]+(?:(?:\.[\w_-]+)+))([\w.,@?^=%&:/~+#-]*[\w@?^=%&/~+#-])?"
 
+# uncompressed bytes between seek points when a raw JSON day file is reblocked for random access
+GZIP_CHECKPOINT_BYTES = 16 * 1024**2
+# sidecar holding a reblocked file's seek points, line offsets and tweet ids
+GZIP_INDEX_SUFFIX = ".idx.npz"
+# reblocked copy of a raw JSON day file, named so the *.json.gz globs of the other scripts don't pick it up
+GZIP_SEEKABLE_SUFFIX = ".seekable.gz"
+# rows of the count-min sketch used for approximate collocation counts, the chance of a bad estimate is e^-depth
+SKETCH_DEPTH = 5
+
 def average_botscores(botscores_list):
     """
     Function to get the mean of a list of botscores.
@@ -219,46 +277,6 @@ def load_sentilex(filename="data/sentilex.txt"):
     logging.info("Loaded SentiLex from txt file.")
     return sentilex
 
-def nicetime(start_time, end_time):
-    """
-    Function to return a nicely justified time from 2 timestamps, converted to HH:MM:SS.
-
-    Args:
-        start_time (timestamp): Start time
-        end_time (timestamp): End time
-        (you can work these out, I believe in you)
-
-    Returns:
-        string: nicely written time
-    """
-    time_diff = int(end_time-start_time)
-    if time_diff > 3600:
-        # hours
-        hours   = str(time_diff // 3600)
-        minutes = str((time_diff - (int(hours) * 3600)) // 60)
-        seconds = str(time_diff % 60)
-    elif time_diff > 60:
-        # minutes
-        hours   = "00"
-        minutes = str(time_diff // 60)
-        seconds = str(time_diff % 60)
-    else:
-        # seconds
-        hours   = "00"
-        minutes = "00"
-        seconds = str(time_diff)
-
-    # handle edge cases
-    if int(hours) < 10 and hours != "00":
-        hours = "0"+hours
-    if int(minutes) < 10 and minutes != "00":
-        minutes = "0"+minutes
-    if int(seconds) < 10:
-        seconds = "0"+seconds
-
-    return (hours+":"+minutes+":"+seconds).rjust(9)
-
-
 def increment_occurrence(dict_to_update, occurrence, weight=1):
     """
     Function to increment the occurrence of a key in a dictionary.
@@ -292,25 +310,6 @@ def intersection(lst1, lst2):
     lst3 = [value for value in lst1 if value in lst2]
     return lst3
 
-def safeget(dct, keys):
-    """
-    Function to safely get a value from a dictionary, guarding against misses
-
-    Args:
-        dct (dict): Dictionary to lookup
-        keys (any): Key to find in dictionary
-
-    Returns:
-        any: the value you were trying to find, if it exists
-    """
-    # AUTHOR: Diogo Pacheco
-    for key in keys:
-        try:
-            dct = dct[key]
-        except KeyError:
-            return None
-    return dct
-
 def load_csv(filename):
     """
     Wrapper function to safely load a CSV without thinking about it
@@ -325,32 +324,6 @@ def load_csv(filename):
         reader = csv.reader(csvfile, delimiter=' ', quotechar='|')
         return reader
 
-def load_tweets_json(filename):
-    """
-    Function to load a JSON file of tweets.
-
-    Args:
-        filename (string): File to open
-
-    Returns:
-        pd.df: Dataframe of tweet data.
-    """
-    # AUTHOR: Diogo Pacheco
-    with gzip.GzipFile(filename) as tw_file:
-        data = []
-        user = []
-        for line in tw_file:
-            try:
-                tw = json.loads(line.decode('utf-8'))
-                user.append(tw["user"])
-                data.append(parse_tweet(tw))
-            except Exception as e:
-                print(filename,e)
-        tweets = pd.json_normalize(data)
-
-    tweets.drop_duplicates(subset='id_str',inplace=True)
-    return tweets
-
 def load_tweets_pkl(filename):
     """
     Function to load a PKL file of tweets.
@@ -381,48 +354,7 @@ def parse_tweet(tw):
     # has been *heavily* modified from the original version and vastly cut down
     # was 200+ lines originally
 
-    entities = {
-        '.'.join(k): safeget(tw,k) for k in (
-            ('id_str',), 
-            ('user','id_str'),
-            ('user','screen_name'),
-            ('user','followers_count'),
-            #('timestamp_ms',),
-            ('entities','hashtags'),
-            ('entities','urls'),
-            ('entities','user_mentions'),
-            ('in_reply_to_status_id_str',),
-            ('in_reply_to_user_id_str',),
-            ('retweeted_status','id_str'),
-            ('retweeted_status','user','id_str'),
-            #('retweeted_status','entities','hashtags'),
-            #('retweeted_status','entities','urls'),
-            #('retweeted_status','entities','user_mentions'),
-            ('quoted_status','id_str'),
-            ('quoted_status','user','id_str'),
-            #('quoted_status','entities','hashtags'),
-            #('quoted_status','entities','urls'),
-            #('quoted_status','entities','user_mentions'),
-            #('coordinates',),
-            #('place',),
-            ## extended fields
-            #('truncated',),
-            #('extended_tweet','entities','hashtags'),
-            #('extended_tweet','entities','urls'),
-            #('extended_tweet','entities','user_mentions'),
-
-            #('retweeted_status','truncated'),
-            #('retweeted_status','extended_tweet','entities','hashtags'),
-            #('retweeted_status','extended_tweet','entities','urls'),
-            #('retweeted_status','extended_tweet','entities','user_mentions'),
-            
-            #('quoted_status','truncated'),
-            #('quoted_status','extended_tweet','entities','hashtags'),
-            #('quoted_status','extended_tweet','entities','urls'),
-            #('quoted_status','extended_tweet','entities','user_mentions'),
-        )
-    }
-    return entities
+    return dict(zip(TWEET_COLUMNS, TWEET_EXTRACTOR(tw)))
 
 def load_br_stopwords():
     """
@@ -545,3 +477,1851 @@ def pkl_json_pairs(pkl_files, json_files):
 
     print(f"Returning {len(pkl_files)} matched pkl and json files.")
     return sorted(pkl_files), sorted(json_files)
+
+def get_tweet_partitions(dir_path):
+    """
+    Function to get the day partitions of the parquet dataset in a folder filled with data.
+    The parquet equivalent of get_tweet_files.
+
+    Args:
+        dir_path (string): Path to directory containing data.
+
+    Returns:
+        list: List of partition directories, sorted by date
+    """
+    if not dir_path.endswith('/'):
+        print("Please provide a directory containing a parquet dataset.")
+        exit()
+    partitions = sorted(glob.glob(os.path.join(tweet_dataset_path(dir_path), "day=*")))
+    print(f"Returning {len(partitions)} day partitions.")
+    return partitions
+
+def load_tweets_parquet(path, columns=None, filters=None):
+    """
+    Function to load tweets from the parquet dataset, a partition of it, or a single part file.
+    Only the requested columns are read, and filters are pushed down to the row group statistics,
+    so e.g. filters=[("id_str", "in", ids)] only decodes row groups that could hold those ids.
+
+    Args:
+        path (string): Dataset, partition or file to read
+        columns (list, optional): Columns to read. Columns missing from the data come back empty. Defaults to None (all).
+        filters (list, optional): Filters in pyarrow's DNF list-of-tuples form. Defaults to None.
+
+    Returns:
+        pd.df: Dataframe of tweet data.
+    """
+    available = ds.dataset(path, format="parquet", partitioning="hive").schema.names
+    wanted = None if columns is None else [column for column in columns if column in available]
+    table = pq.read_table(path, columns=wanted, filters=filters)
+    return tweets_from_table(table, columns)
+
+def load_tweet_index(dataset_path):
+    """
+    Function to memory-map the tweet id index of a parquet dataset, rebuilding it first if any part file changed.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+
+    Returns:
+        dict: {"ids", "part_numbers", "rows": memory-mapped arrays, "part_files": list of part files}
+    """
+    index_path = tweet_index_path(dataset_path)
+    files_json = os.path.join(index_path, "files.json")
+    stale = not os.path.exists(files_json)
+    if not stale:
+        with open(files_json, encoding="utf-8") as files_handle:
+            index_files = json.load(files_handle)
+        part_files = dataset_part_files(dataset_path)
+        stale = part_files != index_files["part_files"] or \
+            [part_file_state(dataset_path, part_file) for part_file in part_files] != index_files["states"]
+    if stale:
+        print("Tweet index missing or out of date, rebuilding...")
+        build_tweet_index(dataset_path)
+        with open(files_json, encoding="utf-8") as files_handle:
+            index_files = json.load(files_handle)
+
+    return {
+        "ids": np.load(os.path.join(index_path, "ids.npy"), mmap_mode="r"),
+        "part_numbers": np.load(os.path.join(index_path, "part_numbers.npy"), mmap_mode="r"),
+        "rows": np.load(os.path.join(index_path, "rows.npy"), mmap_mode="r"),
+        "part_files": index_files["part_files"],
+    }
+
+def fetch_tweets(dataset_path, ids, columns=None, index=None):
+    """
+    Function to fetch specific tweets from the parquet dataset by id.
+    The index says which part file and row each tweet lives in, so only the row groups
+    holding a hit are read: the cost scales with the hits, not with the size of the dataset.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+        ids (iterable): Tweet ids to fetch, as ints or strings
+        columns (list, optional): Columns to read. Columns missing from the data come back empty. Defaults to None (all).
+        index (dict, optional): Index from load_tweet_index, to save reloading it over many calls. Defaults to None.
+
+    Returns:
+        pd.df: Dataframe of the tweets found, in id order
+    """
+    if index is None:
+        index = load_tweet_index(dataset_path)
+    ids = np.unique(np.asarray(pd.to_numeric(pd.Series(list(ids), dtype=object)), dtype=np.uint64))
+    positions = np.searchsorted(index["ids"], ids)
+    found = positions < len(index["ids"])
+    found[found] = np.asarray(index["ids"][positions[found]]) == ids[found]
+    positions = positions[found]
+    hit_parts = np.asarray(index["part_numbers"][positions])
+    hit_rows = np.asarray(index["rows"][positions])
+
+    tables = []
+    for part_number in np.unique(hit_parts):
+        part_rows = np.sort(hit_rows[hit_parts == part_number]).astype(np.int64)
+        part_file = pq.ParquetFile(os.path.join(dataset_path, index["part_files"][part_number]))
+        # work out which row groups the hits fall in, and read only those
+        group_sizes = [part_file.metadata.row_group(i).num_rows for i in range(part_file.num_row_groups)]
+        group_starts = np.concatenate([[0], np.cumsum(group_sizes)])
+        groups = np.unique(np.searchsorted(group_starts, part_rows, side="right") - 1)
+        wanted = None if columns is None else [column for column in columns if column in part_file.schema_arrow.names]
+        table = part_file.read_row_groups(groups.tolist(), columns=wanted)
+        # rows of the groups we read, laid end to end
+        read_starts = np.cumsum(np.concatenate([[0], np.asarray(group_sizes)[groups]]))[:-1]
+        group_of_row = np.searchsorted(group_starts, part_rows, side="right") - 1
+        local_rows = read_starts[np.searchsorted(groups, group_of_row)] + (part_rows - group_starts[group_of_row])
+        tables.append(table.take(pa.array(local_rows)))
+
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    tweets = tweets_from_table(pa.concat_tables(tables, promote_options="default"), columns)
+    return tweets.sort_values("id_str", key=pd.to_numeric).reset_index(drop=True) if "id_str" in tweets.columns else tweets
+
+def gzip_index_path(filename):
+    """
+    Function to get the path of the seek index sidecar for a gzipped JSON file.
+
+    Args:
+        filename (string): Path to the gzipped JSON file
+
+    Returns:
+        string: Path to the sidecar
+    """
+    return filename + GZIP_INDEX_SUFFIX
+
+def seekable_gzip_path(filename):
+    """
+    Function to get the path of the reblocked copy of a gzipped JSON file.
+
+    Args:
+        filename (string): Path to the gzipped JSON file, e.g. elections2022_tweets-20221001.json.gz
+
+    Returns:
+        string: Path to the copy, e.g. elections2022_tweets-20221001.json.seekable.gz
+    """
+    return (filename[:-len(".gz")] if filename.endswith(".gz") else filename) + GZIP_SEEKABLE_SUFFIX
+
+def build_gzip_index(filename, output=None, span=GZIP_CHECKPOINT_BYTES):
+    """
+    Function to make a gzipped JSON file seekable, and index it.
+    A plain gzip stream can only be decoded from byte 0, and python's zlib can't resume one mid-block
+    the way zran does, so the file is recompressed with a full flush every span bytes instead.
+    Each flush is a byte-aligned point with no back references across it, so decoding can start there with no window,
+    and the output is still one ordinary gzip stream for everything else that reads it.
+    The sidecar records those points, where every line starts, and the tweet id on every line.
+    The raw file is never modified, as it's the only copy of the full tweets and the converter's manifest tracks it.
+
+    Args:
+        filename (string): Gzipped JSON file to reblock
+        output (string, optional): Where to write the reblocked copy. Defaults to None (seekable_gzip_path of the file).
+        span (int, optional): Uncompressed bytes between seek points. Defaults to GZIP_CHECKPOINT_BYTES.
+
+    Returns:
+        string: Path to the sidecar
+    """
+    output = seekable_gzip_path(filename) if output is None else output
+    if os.path.abspath(output) == os.path.abspath(filename):
+        print(f"Not reblocking {filename} in place, give a different output.")
+        exit()
+    tmp_output = os.path.join(os.path.dirname(output), "." + os.path.basename(output) + ".tmp")
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    compressed = 0
+    uncompressed = 0
+    checkpoint_compressed = []
+    checkpoint_uncompressed = []
+    checkpoint_lines = []
+    line_offsets = [0]
+    line_ids = []
+    with gzip.GzipFile(filename) as tw_file, open(tmp_output, "wb") as out_file:
+        for line in tw_file:
+            # seek points go in front of a line, so every span starts on a whole tweet
+            if not checkpoint_uncompressed or uncompressed - checkpoint_uncompressed[-1] >= span:
+                block = compressor.compress(b"") + compressor.flush(zlib.Z_FULL_FLUSH)
+                out_file.write(block)
+                compressed += len(block)
+                checkpoint_compressed.append(compressed)
+                checkpoint_uncompressed.append(uncompressed)
+                checkpoint_lines.append(len(line_ids))
+            block = compressor.compress(line)
+            out_file.write(block)
+            compressed += len(block)
+            uncompressed += len(line)
+            line_offsets.append(uncompressed)
+            try:
+                line_ids.append(int(json.loads(line.decode("utf-8"))["id_str"]))
+            except Exception as e:
+                print(filename, e)
+                line_ids.append(0)
+        out_file.write(compressor.flush())
+    os.replace(tmp_output, output)
+
+    line_ids = np.asarray(line_ids, dtype=np.uint64)
+    stat = os.stat(output)
+    source_stat = os.stat(filename)
+    index_path = gzip_index_path(output)
+    tmp_index = os.path.join(os.path.dirname(index_path), "." + os.path.basename(index_path) + ".tmp.npz")
+    np.savez(
+        tmp_index,
+        checkpoint_compressed=np.asarray(checkpoint_compressed, dtype=np.uint64),
+        checkpoint_uncompressed=np.asarray(checkpoint_uncompressed, dtype=np.uint64),
+        checkpoint_lines=np.asarray(checkpoint_lines, dtype=np.uint64),
+        line_offsets=np.asarray(line_offsets, dtype=np.uint64),
+        line_ids=line_ids,
+        id_order=np.argsort(line_ids, kind="stable").astype(np.uint64),
+        # the copy and the raw file it was made from, so either changing marks the index out of date
+        source=np.asarray([stat.st_size, stat.st_mtime_ns, source_stat.st_size, source_stat.st_mtime_ns], dtype=np.int64),
+    )
+    os.replace(tmp_index, index_path)
+    print(f"Indexed {len(line_ids)} lines of {output} at {len(checkpoint_compressed)} seek points.")
+    return index_path
+
+def load_gzip_index(filename):
+    """
+    Function to load the seek index of a gzipped JSON file's reblocked copy.
+
+    Args:
+        filename (string): Path to the raw gzipped JSON file
+
+    Returns:
+        dict: Arrays of the index, see build_gzip_index
+    """
+    index_path = gzip_index_path(seekable_gzip_path(filename))
+    if not os.path.exists(index_path):
+        print(f"No seek index for {filename}, run gzip_indexer.py on it first.")
+        exit()
+    with np.load(index_path) as index_file:
+        index = {name: index_file[name] for name in index_file.files}
+    stat = os.stat(seekable_gzip_path(filename))
+    source_stat = os.stat(filename)
+    if index["source"].tolist() != [stat.st_size, stat.st_mtime_ns, source_stat.st_size, source_stat.st_mtime_ns]:
+        print(f"Seek index for {filename} is out of date, run gzip_indexer.py on it again.")
+        exit()
+    return index
+
+def read_gzip_span(filename, compressed_offset, length):
+    """
+    Function to decode part of a reblocked gzipped file, starting from one of its seek points.
+
+    Args:
+        filename (string): Path to the gzipped file
+        compressed_offset (int): Compressed offset of the seek point
+        length (int): Uncompressed bytes to decode
+
+    Returns:
+        bytes: Up to length decoded bytes
+    """
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    blocks = []
+    decoded = 0
+    with open(filename, "rb") as gz_file:
+        gz_file.seek(int(compressed_offset))
+        pending = b""
+        while decoded < length and not decompressor.eof:
+            if not pending:
+                pending = gz_file.read(1 << 20)
+                if not pending:
+                    break
+            block = decompressor.decompress(pending, length - decoded)
+            pending = decompressor.unconsumed_tail
+            blocks.append(block)
+            decoded += len(block)
+    return b"".join(blocks)
+
+def gzip_spans(index):
+    """
+    Helper function to list the independently decodable spans of a reblocked file.
+
+    Args:
+        index (dict): Index from load_gzip_index
+
+    Returns:
+        list: (compressed offset, uncompressed length) of each span
+    """
+    ends = np.append(index["checkpoint_uncompressed"][1:], index["line_offsets"][-1])
+    return list(zip(index["checkpoint_compressed"].tolist(), (ends - index["checkpoint_uncompressed"]).tolist()))
+
+def fetch_tweet_lines(filename, ids, index=None):
+    """
+    Function to pull the raw JSON of specific tweets out of a gzipped JSON file, through its reblocked copy.
+    Only the spans holding a hit are decoded, and each only as far as its last hit.
+
+    Args:
+        filename (string): Path to the raw gzipped JSON file
+        ids (iterable): Tweet ids to fetch, as ints or strings
+        index (dict, optional): Index from load_gzip_index, to save reloading it over many calls. Defaults to None.
+
+    Returns:
+        dict: Tweet dictionaries keyed on their integer id
+    """
+    if index is None:
+        index = load_gzip_index(filename)
+    ids = np.unique(np.asarray([int(tweet_id) for tweet_id in ids], dtype=np.uint64))
+    sorted_ids = index["line_ids"][index["id_order"]]
+    positions = np.searchsorted(sorted_ids, ids)
+    found = positions < len(sorted_ids)
+    found[found] = sorted_ids[positions[found]] == ids[found]
+    lines = np.sort(index["id_order"][positions[found]])
+    line_offsets = index["line_offsets"]
+
+    tweets = {}
+    spans = np.searchsorted(index["checkpoint_lines"], lines, side="right") - 1
+    for span in np.unique(spans):
+        span_lines = lines[spans == span]
+        start = int(index["checkpoint_uncompressed"][span])
+        data = read_gzip_span(seekable_gzip_path(filename), index["checkpoint_compressed"][span], int(line_offsets[span_lines[-1] + 1]) - start)
+        for line in span_lines:
+            tw = json.loads(data[int(line_offsets[line]) - start:int(line_offsets[line + 1]) - start].decode("utf-8"))
+            tweets[int(tw["id_str"])] = tw
+    return tweets
+
+def decode_tweet_span(arg_tuple):
+    """
+    Pool worker to decode and parse one span of a reblocked gzipped JSON file.
+
+    Args:
+        arg_tuple (tuple): (filename, compressed offset, uncompressed length)
+
+    Returns:
+        pd.df: Dataframe of the span's tweets
+    """
+    (filename, compressed_offset, length) = arg_tuple
+    rows = []
+    for line in read_gzip_span(filename, compressed_offset, length).splitlines():
+        try:
+            tw = json.loads(line.decode('utf-8'))
+            rows.append(TWEET_EXTRACTOR(tw))
+        except Exception as e:
+            print(filename,e)
+    return pd.DataFrame.from_records(rows, columns=TWEET_COLUMNS)
+
+def load_tweets_json_parallel(filename, workers, index=None):
+    """
+    Function to load a gzipped JSON file of tweets, decoding the spans of its reblocked copy across several processes.
+    Gives the same dataframe as load_tweets_json.
+
+    Args:
+        filename (string): Raw file to load
+        workers (int): Number of processes to decode with
+        index (dict, optional): Index from load_gzip_index. Defaults to None.
+
+    Returns:
+        pd.df: Dataframe of tweet data, duplicates removed.
+    """
+    if index is None:
+        index = load_gzip_index(filename)
+    with Pool(workers) as pool:
+        frames = pool.map(decode_tweet_span, [(seekable_gzip_path(filename),) + span for span in gzip_spans(index)])
+    if not frames:
+        return pd.DataFrame(columns=TWEET_COLUMNS)
+    tweets = pd.concat(frames, ignore_index=True)
+    # spans come back in file order, so the first copy of a tweet is kept as in the streaming reader
+    tweets.drop_duplicates(subset='id_str', inplace=True)
+    return tweets.reset_index(drop=True)
+
+def empty_collocations(combination_size):
+    """
+    Function to start an empty set of collocation counts.
+    Collocations are rows of hashtag ids, in the same sorted-hashtag order the tweet gave them, with a weight per row.
+
+    Args:
+        combination_size (int): Size of combinations counted
+
+    Returns:
+        np.array: (0, combination_size) array of hashtag ids
+        np.array: Empty array of weights
+    """
+    return np.empty((0, combination_size), dtype=np.int32), np.empty(0, dtype=np.int64)
+
+def merge_collocations(combos, weights, new_combos, new_weights=None):
+    """
+    Function to fold new collocations into a set of counts.
+    Rows stay in order of first appearance, so writing them out in weight order
+    ties the same way the old dictionary of joined strings did.
+
+    Args:
+        combos (np.array): (n, k) array of hashtag ids counted so far
+        weights (np.array): Weight of each row of combos
+        new_combos (np.array): (m, k) array of hashtag ids to add
+        new_weights (np.array, optional): Weight of each new row. Defaults to None (1 each).
+
+    Returns:
+        np.array: Merged (n', k) array of hashtag ids
+        np.array: Merged weights
+    """
+    if new_weights is None:
+        new_weights = np.ones(len(new_combos), dtype=np.int64)
+    all_combos = np.concatenate([combos, new_combos.astype(np.int32, copy=False)])
+    all_weights = np.concatenate([weights, new_weights.astype(np.int64, copy=False)])
+    if len(all_combos) == 0:
+        return all_combos, all_weights
+    unique_combos, first_rows, inverse = np.unique(all_combos, axis=0, return_index=True, return_inverse=True)
+    unique_weights = np.bincount(inverse.reshape(-1), weights=all_weights, minlength=len(unique_combos)).astype(np.int64)
+    order = np.argsort(first_rows, kind="stable")
+    return unique_combos[order], unique_weights[order]
+
+def write_collocations(edges_filename, nodes_filename, combos, weights, labels, graph_filename=None):
+    """
+    Function to write collocation counts out as the edges and nodes CSVs, and optionally the binary graph.
+    Edges are written in ascending weight order; each hashtag's appearances are the summed weights of its edges.
+
+    Args:
+        edges_filename (string): Path of the collocations (edges) CSV
+        nodes_filename (string): Path of the appearances (nodes) CSV
+        combos (np.array): (n, k) array of hashtag ids
+        weights (np.array): Weight of each row of combos
+        labels (list): Hashtag of each id
+        graph_filename (string, optional): Path of the binary graph, see write_graph. Defaults to None (not written).
+
+    Returns:
+        int: Number of edges written
+    """
+    combos, weights, nodes, appearances = graph_order(combos, weights, len(labels))
+    write_edges_csv(edges_filename, combos, weights, labels)
+    write_nodes_csv(nodes_filename, nodes, appearances, labels)
+    if graph_filename is not None:
+        write_graph(graph_filename, combos, weights, nodes, appearances, labels)
+    return len(combos)
+
+def graph_order(combos, weights, num_labels):
+    """
+    Function to put collocation counts in the order the CSVs are written in.
+    Edges go in ascending weight order, ties in order of first appearance;
+    nodes go in the order they first turn up in those edges, as the old writer loop added them.
+
+    Args:
+        combos (np.array): (n, k) array of hashtag ids
+        weights (np.array): Weight of each row of combos
+        num_labels (int): Number of hashtag ids
+
+    Returns:
+        np.array: combos, in edge order
+        np.array: weights, in edge order
+        np.array: Hashtag ids of the nodes, in node order
+        np.array: Appearances of every hashtag id, the summed weights of its edges
+    """
+    order = np.argsort(weights, kind="stable")
+    combos = combos[order]
+    weights = weights[order]
+    hashtags = combos.reshape(-1)
+    appearances = np.bincount(hashtags, weights=np.repeat(weights, combos.shape[1]), minlength=num_labels).astype(np.int64)
+    _, first_positions = np.unique(hashtags, return_index=True)
+    return combos, weights, hashtags[np.sort(first_positions)], appearances
+
+def write_edges_csv(filename, combos, weights, labels):
+    """
+    Function to write an edges CSV: Source Target Weight, or a column per hashtag for larger combinations.
+
+    Args:
+        filename (string): Path of the CSV
+        combos (np.array): (n, k) array of hashtag ids, in the order to write
+        weights (np.array): Weight of each row of combos
+        labels (list): Hashtag of each id
+    """
+    combination_size = combos.shape[1]
+    names = ["Source", "Target"] if combination_size == 2 else [f"Hashtag{n+1}" for n in range(combination_size)]
+    # the labels are looked up a column at a time and pandas writes the rows, same format as csv.writer
+    labels = np.asarray(labels, dtype=object)
+    edges = pd.DataFrame({name: labels[combos[:, n]] for n, name in enumerate(names)})
+    edges["Weight"] = weights
+    edges.to_csv(filename, sep=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL, index=False, encoding="utf-8", lineterminator="\r\n")
+
+def write_nodes_csv(filename, nodes, appearances, labels, header=("Label", "Appearances")):
+    """
+    Function to write a nodes CSV of hashtags and their appearances.
+
+    Args:
+        filename (string): Path of the CSV
+        nodes (np.array): Hashtag ids, in the order to write
+        appearances (np.array): Appearances of every hashtag id
+        labels (list): Hashtag of each id
+        header (tuple, optional): Header row. Defaults to ("Label", "Appearances").
+    """
+    nodes_frame = pd.DataFrame({header[0]: np.asarray(labels, dtype=object)[nodes], header[1]: np.asarray(appearances)[nodes]})
+    nodes_frame.to_csv(filename, sep=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL, index=False, encoding="utf-8", lineterminator="\r\n")
+
+def collocation_partial(vocabulary, combos, weights, hashtag_data):
+    """
+    Function to package collocation counts and hashtag data into a partial which can be merged with others.
+    The tweet IDs of each hashtag are kept as sorted runs in one flat array, hashtag i owning ids[offsets[i]:offsets[i+1]].
+
+    Args:
+        vocabulary (dict): Dictionary of {hashtag:id}
+        combos (np.array): (n, k) array of hashtag ids
+        weights (np.array): Weight of each row of combos
+        hashtag_data (dict): Dictionary of {hashtag:set([tweet IDs])}
+
+    Returns:
+        dict: {"labels", "combos", "weights", "offsets", "ids"}
+    """
+    labels = list(vocabulary)
+    postings = [np.sort(np.fromiter(hashtag_data.get(label, ()), dtype=np.uint64)) for label in labels]
+    return {
+        "labels": labels,
+        "combos": combos,
+        "weights": weights,
+        "offsets": np.concatenate([[0], np.cumsum([len(posting) for posting in postings])]).astype(np.int64),
+        "ids": np.concatenate(postings) if postings else np.empty(0, dtype=np.uint64),
+    }
+
+def new_sketch(memory_bytes, depth=SKETCH_DEPTH, seed=0):
+    """
+    Function to set up a count-min sketch for counting combinations of hashtag ids in a fixed amount of memory.
+    The width is the largest power of two that fits the budget, so a column is a multiply-shift of the combination's hash.
+
+    Args:
+        memory_bytes (int): Memory to give the sketch table
+        depth (int, optional): Number of rows. Defaults to SKETCH_DEPTH.
+        seed (int, optional): Seed for the row hashes, fixed so runs are repeatable. Defaults to 0.
+
+    Returns:
+        dict: {"table", "seeds", "bits", "total"}
+    """
+    bits = max(1, int(np.log2(max(2, memory_bytes // (depth * 8)))))
+    seeds = np.random.default_rng(seed).integers(0, 2**63, size=depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    return {"table": np.zeros((depth, 2**bits), dtype=np.int64), "seeds": seeds, "bits": bits, "total": 0}
+
+def combination_hashes(combos):
+    """
+    Function to hash each row of hashtag ids to a well-mixed 64 bit value.
+
+    Args:
+        combos (np.array): (n, k) array of hashtag ids
+
+    Returns:
+        np.array: uint64 hash of each row
+    """
+    hashes = np.full(len(combos), 0x9E3779B97F4A7C15, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in combos.T.astype(np.uint64):
+            hashes = (hashes ^ column) * np.uint64(0xBF58476D1CE4E5B9)
+            hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+def sketch_columns(sketch, combos):
+    """
+    Helper function to find the column of each combination in each row of the sketch.
+
+    Args:
+        sketch (dict): Sketch from new_sketch
+        combos (np.array): (n, k) array of hashtag ids
+
+    Returns:
+        np.array: (depth, n) array of columns
+    """
+    with np.errstate(over="ignore"):
+        products = combination_hashes(combos)[None, :] * sketch["seeds"][:, None]
+    return (products >> np.uint64(64 - sketch["bits"])).astype(np.int64)
+
+def sketch_estimate(sketch, combos):
+    """
+    Function to estimate the counts of some combinations. Estimates never fall below the true count.
+
+    Args:
+        sketch (dict): Sketch from new_sketch
+        combos (np.array): (n, k) array of hashtag ids
+
+    Returns:
+        np.array: Estimated count of each row
+    """
+    if len(combos) == 0:
+        return np.empty(0, dtype=np.int64)
+    columns = sketch_columns(sketch, combos)
+    return sketch["table"][np.arange(len(columns))[:, None], columns].min(axis=0)
+
+def sketch_add(sketch, combos, counts):
+    """
+    Function to add counts of distinct combinations to the sketch.
+    Uses the conservative update: each cell is only raised as far as the combination's new estimate needs,
+    which keeps the overestimates from colliding combinations down.
+
+    Args:
+        sketch (dict): Sketch from new_sketch
+        combos (np.array): (n, k) array of distinct hashtag ids
+        counts (np.array): Count to add for each row
+    """
+    if len(combos) == 0:
+        return
+    columns = sketch_columns(sketch, combos)
+    rows = np.arange(len(columns))[:, None]
+    targets = sketch["table"][rows, columns].min(axis=0) + counts
+    np.maximum.at(sketch["table"], (np.broadcast_to(rows, columns.shape), columns), np.broadcast_to(targets, columns.shape))
+    sketch["total"] += int(counts.sum())
+
+def sketch_error(sketch):
+    """
+    Function to get the error bounds of the sketch's estimates so far.
+    With probability at least 1 - delta, every estimate is within epsilon * total of the true count.
+
+    Args:
+        sketch (dict): Sketch from new_sketch
+
+    Returns:
+        float: epsilon, the relative error
+        float: delta, the chance of any single estimate being out of bounds
+        float: the bound in counts, epsilon * total
+    """
+    epsilon = np.e / sketch["table"].shape[1]
+    delta = np.exp(-sketch["table"].shape[0])
+    return epsilon, delta, epsilon * sketch["total"]
+
+def update_heavy_hitters(sketch, hitters, combos, top_n):
+    """
+    Function to count a batch of combinations into the sketch and refresh the top_n heaviest combinations.
+    Only the current candidates and the batch are ever held, so memory stays fixed however many combinations there are.
+
+    Args:
+        sketch (dict): Sketch from new_sketch
+        hitters (np.array): (m, k) array of the current heaviest combinations, m <= top_n
+        combos (np.array): (n, k) array of hashtag ids in the batch, repeats allowed
+        top_n (int): Number of heavy hitters to keep
+
+    Returns:
+        np.array: (m', k) array of the heaviest combinations, heaviest first
+        np.array: Estimated count of each
+    """
+    if len(combos) > 0:
+        batch, counts = np.unique(combos, axis=0, return_counts=True)
+        sketch_add(sketch, batch, counts)
+        hitters = np.unique(np.concatenate([hitters, batch.astype(hitters.dtype)]), axis=0)
+    estimates = sketch_estimate(sketch, hitters)
+    # heaviest first; lexsort ties on the ids so the result doesn't depend on batch boundaries
+    order = np.lexsort(tuple(hitters.T[::-1]) + (-estimates,))[:top_n]
+    return hitters[order], estimates[order]
+
+def write_heavy_hitters(filename, hitters, estimates, labels):
+    """
+    Function to write approximate heaviest combinations out as a CSV, heaviest first.
+
+    Args:
+        filename (string): Path of the CSV
+        hitters (np.array): (m, k) array of hashtag ids
+        estimates (np.array): Estimated count of each
+        labels (list): Hashtag of each id
+    """
+    with open(filename, "w+", encoding="utf-8") as csv_handle:
+        hitters_writer = csv.writer(csv_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        hitters_writer.writerow([f"Hashtag{n+1}" for n in range(hitters.shape[1])] + ["Weight"])
+        for combo, estimate in zip(hitters.tolist(), estimates.tolist()):
+            hitters_writer.writerow([labels[hashtag] for hashtag in combo] + [estimate])
+
+def write_postings(path, labels, offsets, ids):
+    """
+    Function to write a hashtag -> tweet ID postings store.
+    The store is a directory of flat arrays: hashtag i owns the sorted, distinct ids[offsets[i]:offsets[i+1]].
+    Written to a hidden directory and swapped in, so readers never see half a store.
+
+    Args:
+        path (string): Directory to write the store to
+        labels (list): Hashtag of each run
+        offsets (np.array): Start of each hashtag's run in ids, plus the end of the last
+        ids (np.array): Sorted runs of tweet IDs
+    """
+    tmp_path = os.path.join(os.path.dirname(os.path.normpath(path)), "." + os.path.basename(os.path.normpath(path)) + ".tmp")
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(tmp_path, "ids.npy"), np.asarray(ids, dtype=np.uint64))
+    with open(os.path.join(tmp_path, "labels.json"), "w", encoding="utf-8") as labels_handle:
+        json.dump(list(labels), labels_handle, ensure_ascii=False)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+def load_postings(path):
+    """
+    Function to open a hashtag -> tweet ID postings store. The arrays are memory-mapped, so opening is instant
+    and a query only touches the runs of the hashtags it asks about.
+
+    Args:
+        path (string): Directory of the store
+
+    Returns:
+        dict: {"labels": list of hashtags, "positions": {hashtag:run}, "offsets", "ids": memory-mapped arrays}
+    """
+    with open(os.path.join(path, "labels.json"), encoding="utf-8") as labels_handle:
+        labels = json.load(labels_handle)
+    return {
+        "labels": labels,
+        "positions": {label: i for i, label in enumerate(labels)},
+        "offsets": np.load(os.path.join(path, "offsets.npy"), mmap_mode="r"),
+        "ids": np.load(os.path.join(path, "ids.npy"), mmap_mode="r"),
+    }
+
+def postings_for(postings, hashtag):
+    """
+    Function to get the tweet IDs containing a hashtag.
+
+    Args:
+        postings (dict): Store from load_postings
+        hashtag (string): Hashtag to look up
+
+    Returns:
+        np.array: Sorted tweet IDs, empty if the hashtag isn't in the store
+    """
+    position = postings["positions"].get(hashtag)
+    if position is None:
+        return np.empty(0, dtype=np.uint64)
+    return postings["ids"][postings["offsets"][position]:postings["offsets"][position+1]]
+
+def postings_union(postings, hashtags):
+    """
+    Function to get every tweet ID containing any of some hashtags.
+
+    Args:
+        postings (dict): Store from load_postings
+        hashtags (iterable): Hashtags to look up
+
+    Returns:
+        np.array: Sorted, distinct tweet IDs
+    """
+    runs = [postings_for(postings, hashtag) for hashtag in hashtags]
+    if not runs:
+        return np.empty(0, dtype=np.uint64)
+    return np.unique(np.concatenate(runs))
+
+def postings_intersection(postings, hashtags):
+    """
+    Function to get the tweet IDs containing all of some hashtags.
+    Starts from the shortest run, so the work is bounded by the rarest hashtag.
+
+    Args:
+        postings (dict): Store from load_postings
+        hashtags (iterable): Hashtags to look up
+
+    Returns:
+        np.array: Sorted, distinct tweet IDs
+    """
+    runs = sorted((postings_for(postings, hashtag) for hashtag in hashtags), key=len)
+    if not runs:
+        return np.empty(0, dtype=np.uint64)
+    result = np.asarray(runs[0])
+    for run in runs[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, run, assume_unique=True)
+    return result
+
+def partition_state(partition):
+    """
+    Function to get what we check to see if a day partition has changed since it was last read.
+
+    Args:
+        partition (string): Path to the day partition
+
+    Returns:
+        list: [name, size, mtime] of each part file in the partition
+    """
+    part_files = sorted(glob.glob(os.path.join(partition, "*.parquet")))
+    return [[os.path.basename(part_file)] + part_file_state(partition, os.path.basename(part_file)) for part_file in part_files]
+
+def load_collocation_checkpoint(path, combination_size):
+    """
+    Function to load a collocation checkpoint: the counts of every day folded in so far, and which days those were.
+    A missing checkpoint, or one for a different combination size, loads as empty so everything is counted afresh.
+
+    The checkpoint is a directory holding checkpoint.json, which names the current version's files:
+        labels.vN.json      the hashtag of every global id; append-only, so ids never change between versions
+        days/DATE.vN.npz    one day's collocations and postings, in global ids
+        aggregate.vN.npz    every day folded together, in day order
+
+    Args:
+        path (string): Directory of the checkpoint
+        combination_size (int): Size of combinations counted
+
+    Returns:
+        dict: {"path", "version", "combination_size", "labels", "days", "aggregate", "new_days"}
+    """
+    checkpoint = {
+        "path": path,
+        "version": 0,
+        "combination_size": combination_size,
+        "labels": [],
+        "days": {},
+        "aggregate": None,
+        "new_days": {},
+    }
+    checkpoint_json = os.path.join(path, "checkpoint.json")
+    if not os.path.exists(checkpoint_json):
+        return checkpoint
+    with open(checkpoint_json, encoding="utf-8") as checkpoint_handle:
+        saved = json.load(checkpoint_handle)
+    if saved["combination_size"] != combination_size:
+        print(f"Checkpoint in {path} is for a combination size of {saved['combination_size']}, starting afresh.")
+        return checkpoint
+    with open(os.path.join(path, saved["labels"]), encoding="utf-8") as labels_handle:
+        checkpoint["labels"] = json.load(labels_handle)
+    with np.load(os.path.join(path, saved["aggregate"])) as aggregate_file:
+        checkpoint["aggregate"] = {name: aggregate_file[name] for name in aggregate_file.files}
+    checkpoint["version"] = saved["version"]
+    checkpoint["days"] = saved["days"]
+    return checkpoint
+
+def load_checkpoint_day(checkpoint, date, names=None):
+    """
+    Function to get one day's slice of a collocation checkpoint, whether it's just been counted or is saved.
+
+    Args:
+        checkpoint (dict): Checkpoint from load_collocation_checkpoint
+        date (string): Day, as YYYYMMDD
+        names (list, optional): Arrays to read, e.g. ["combos", "weights"] to skip the postings. Defaults to None (all).
+
+    Returns:
+        dict: {"combos", "weights", "posting_labels", "posting_ids"}, all in global ids
+    """
+    if date in checkpoint["new_days"]:
+        day_slice = checkpoint["new_days"][date]
+        return day_slice if names is None else {name: day_slice[name] for name in names}
+    with np.load(os.path.join(checkpoint["path"], checkpoint["days"][date]["file"])) as day_file:
+        return {name: day_file[name] for name in (day_file.files if names is None else names)}
+
+def add_checkpoint_day(checkpoint, date, state, partial):
+    """
+    Function to put a freshly counted day into a checkpoint, replacing any older count of the same day.
+    The day's hashtags are given global ids, new ones appended to the checkpoint's labels.
+
+    Args:
+        checkpoint (dict): Checkpoint from load_collocation_checkpoint
+        date (string): Day, as YYYYMMDD
+        state (list): State of the day's partition, from partition_state
+        partial (dict): The day's counts, from collocation_partial
+    """
+    # the label lookup is built once per run rather than once per day
+    if "positions" not in checkpoint:
+        checkpoint["positions"] = {label: i for i, label in enumerate(checkpoint["labels"])}
+    positions = checkpoint["positions"]
+    remap = np.empty(len(partial["labels"]), dtype=np.int32)
+    for i, label in enumerate(partial["labels"]):
+        if label not in positions:
+            positions[label] = len(checkpoint["labels"])
+            checkpoint["labels"].append(label)
+        remap[i] = positions[label]
+    checkpoint["new_days"][date] = {
+        "combos": remap[partial["combos"]],
+        "weights": partial["weights"],
+        "posting_labels": np.repeat(remap, np.diff(partial["offsets"])),
+        "posting_ids": partial["ids"],
+    }
+    checkpoint["days"][date] = {"state": state, "file": None}
+
+def remove_checkpoint_day(checkpoint, date):
+    """
+    Function to drop a day from a checkpoint, for when its partition is gone.
+
+    Args:
+        checkpoint (dict): Checkpoint from load_collocation_checkpoint
+        date (string): Day, as YYYYMMDD
+    """
+    checkpoint["days"].pop(date, None)
+    checkpoint["new_days"].pop(date, None)
+
+def fold_collocation_slices(num_labels, combination_size, slices):
+    """
+    Function to fold day slices (or an aggregate followed by day slices) together, in the order given.
+    Keeps first appearance order, so folding days in day order gives what counting them one by one would.
+
+    Args:
+        num_labels (int): Number of global ids
+        combination_size (int): Size of combinations counted
+        slices (list): Dicts with "combos", "weights" and either "offsets" and "ids" or "posting_labels" and "posting_ids"
+
+    Returns:
+        dict: {"combos", "weights", "offsets", "ids"}
+    """
+    combos, weights = empty_collocations(combination_size)
+    # one merge over everything laid end to end, rather than a merge per slice
+    combos, weights = merge_collocations(
+        combos,
+        weights,
+        np.concatenate([combos] + [day_slice["combos"] for day_slice in slices]),
+        np.concatenate([weights] + [day_slice["weights"] for day_slice in slices])
+    )
+    owners = []
+    ids = []
+    for day_slice in slices:
+        if "offsets" in day_slice:
+            owners.append(np.repeat(np.arange(len(day_slice["offsets"]) - 1, dtype=np.int32), np.diff(day_slice["offsets"])))
+            ids.append(day_slice["ids"])
+        else:
+            owners.append(day_slice["posting_labels"].astype(np.int32, copy=False))
+            ids.append(day_slice["posting_ids"])
+    owners = np.concatenate(owners) if owners else np.empty(0, dtype=np.int32)
+    ids = np.concatenate(ids).astype(np.uint64, copy=False) if ids else np.empty(0, dtype=np.uint64)
+    order = np.lexsort((ids, owners))
+    owners = owners[order]
+    ids = ids[order]
+    keep = np.ones(len(ids), dtype=bool)
+    keep[1:] = (owners[1:] != owners[:-1]) | (ids[1:] != ids[:-1])
+    return {
+        "combos": combos,
+        "weights": weights,
+        "offsets": np.concatenate([[0], np.cumsum(np.bincount(owners[keep], minlength=num_labels))]).astype(np.int64),
+        "ids": ids[keep],
+    }
+
+def refresh_checkpoint_aggregate(checkpoint, replaced):
+    """
+    Function to bring a checkpoint's aggregate up to date with its days.
+    When every new day comes after all the days already folded in, they're merged straight onto the aggregate;
+    if any day was replaced or removed, or a new day lands earlier, the aggregate is refolded from every day's slice.
+
+    Args:
+        checkpoint (dict): Checkpoint from load_collocation_checkpoint
+        replaced (bool): Whether any day already in the aggregate was recounted or removed
+    """
+    kept_days = [date for date in checkpoint["days"] if date not in checkpoint["new_days"]]
+    new_days = sorted(checkpoint["new_days"])
+    appending = checkpoint["aggregate"] is not None and not replaced and \
+        (not kept_days or not new_days or min(new_days) > max(kept_days))
+    if appending:
+        slices = [checkpoint["aggregate"]] + [checkpoint["new_days"][date] for date in new_days]
+    else:
+        slices = [load_checkpoint_day(checkpoint, date) for date in sorted(checkpoint["days"])]
+    aggregate = fold_collocation_slices(len(checkpoint["labels"]), checkpoint["combination_size"], slices)
+    aggregate["labels"] = checkpoint["labels"]
+    checkpoint["aggregate"] = aggregate
+
+def save_collocation_checkpoint(checkpoint):
+    """
+    Function to write a checkpoint out as its next version.
+    New files are written first and checkpoint.json swapped in last, so a crash leaves the previous version whole;
+    files no longer named by it are removed afterwards.
+
+    Args:
+        checkpoint (dict): Checkpoint from load_collocation_checkpoint, with its aggregate refreshed
+    """
+    path = checkpoint["path"]
+    version = checkpoint["version"] + 1
+    os.makedirs(os.path.join(path, "days"), exist_ok=True)
+    for date, day_slice in checkpoint["new_days"].items():
+        day_file = os.path.join("days", f"{date}.v{version}.npz")
+        np.savez(os.path.join(path, day_file), **day_slice)
+        checkpoint["days"][date]["file"] = day_file
+    labels_file = f"labels.v{version}.json"
+    with open(os.path.join(path, labels_file), "w", encoding="utf-8") as labels_handle:
+        json.dump(checkpoint["labels"], labels_handle, ensure_ascii=False)
+    aggregate_file = f"aggregate.v{version}.npz"
+    np.savez(os.path.join(path, aggregate_file), **{name: array for name, array in checkpoint["aggregate"].items() if name != "labels"})
+
+    saved = {
+        "version": version,
+        "combination_size": checkpoint["combination_size"],
+        "labels": labels_file,
+        "aggregate": aggregate_file,
+        "days": dict(sorted(checkpoint["days"].items())),
+    }
+    with open(os.path.join(path, ".checkpoint.json.tmp"), "w", encoding="utf-8") as checkpoint_handle:
+        json.dump(saved, checkpoint_handle)
+    os.replace(os.path.join(path, ".checkpoint.json.tmp"), os.path.join(path, "checkpoint.json"))
+    checkpoint["version"] = version
+    checkpoint["new_days"] = {}
+
+    # clear out the previous versions' files
+    current = {labels_file, aggregate_file} | {day["file"] for day in saved["days"].values()}
+    for old_file in glob.glob(os.path.join(path, "*.v*.*")) + glob.glob(os.path.join(path, "days", "*.npz")):
+        if os.path.relpath(old_file, path) not in current:
+            os.remove(old_file)
+
+def collocation_window(path, combination_size, start_date=None, end_date=None):
+    """
+    Function to get the collocation graph of a date window from a collocation checkpoint.
+    The checkpoint keeps every day's counts as a slice in global ids, so a window is just its days' slices
+    added together; no data is reread.
+
+    Args:
+        path (string): Directory of the checkpoint
+        combination_size (int): Size of combinations counted
+        start_date (string, optional): First day of the window, as YYYYMMDD. Defaults to None (from the first day).
+        end_date (string, optional): Last day of the window, as YYYYMMDD. Defaults to None (to the last day).
+
+    Returns:
+        dict: {"labels", "combos", "weights", "offsets", "ids"}, as for the checkpoint's aggregate
+        list: Days in the window
+    """
+    checkpoint = load_collocation_checkpoint(path, combination_size)
+    days = [date for date in sorted(checkpoint["days"])
+            if (start_date is None or date >= start_date) and (end_date is None or date <= end_date)]
+    window = fold_collocation_slices(
+        len(checkpoint["labels"]),
+        combination_size,
+        [load_checkpoint_day(checkpoint, date) for date in days]
+    )
+    window["labels"] = checkpoint["labels"]
+    return window, days
+
+def write_graph(filename, combos, weights, nodes, appearances, labels):
+    """
+    Function to write a collocation graph as one binary file holding the same rows as its edges and nodes CSVs.
+    Nodes are renumbered 0..n-1 in node order, so the file only carries the hashtags it uses;
+    those are stored as a single newline-joined utf-8 string, which decodes in one go.
+
+    Args:
+        filename (string): Path of the .npz file
+        combos (np.array): (n, k) array of hashtag ids, in edge order
+        weights (np.array): Weight of each row of combos
+        nodes (np.array): Hashtag ids of the nodes, in node order; must include every id in combos
+        appearances (np.array): Appearances of every hashtag id
+        labels (list): Hashtag of each id
+    """
+    positions = np.full(len(labels), -1, dtype=np.int32)
+    positions[nodes] = np.arange(len(nodes), dtype=np.int32)
+    tmp_filename = os.path.join(os.path.dirname(filename), "." + os.path.basename(filename) + ".tmp.npz")
+    np.savez(
+        tmp_filename,
+        labels=np.frombuffer("\n".join(np.asarray(labels, dtype=object)[nodes].tolist()).encode("utf-8"), dtype=np.uint8),
+        appearances=appearances[nodes],
+        combos=positions[combos],
+        weights=weights,
+    )
+    os.replace(tmp_filename, filename)
+
+def load_graph(filename):
+    """
+    Function to load a binary collocation graph written by write_graph.
+
+    Args:
+        filename (string): Path of the .npz file
+
+    Returns:
+        dict: {"labels": list of hashtags, "appearances": per node, "combos": (n, k) node ids, "weights": per edge}
+    """
+    with np.load(filename) as graph_file:
+        graph = {name: graph_file[name] for name in graph_file.files}
+    labels = graph["labels"].tobytes().decode("utf-8")
+    graph["labels"] = labels.split("\n") if labels else []
+    return graph
+
+def graph_frames(graph):
+    """
+    Function to turn a binary collocation graph into the nodes and edges dataframes the CSVs would give,
+    with the hashtags as categoricals over the graph's labels.
+
+    Args:
+        graph (dict): Graph from load_graph
+
+    Returns:
+        pd.df: Nodes, with ID and Appearances columns
+        pd.df: Edges, with Source, Target and Weight columns (a HashtagN column per hashtag above size 2)
+    """
+    nodes = pd.DataFrame({"ID": graph["labels"], "Appearances": graph["appearances"]})
+    combination_size = graph["combos"].shape[1]
+    names = ["Source", "Target"] if combination_size == 2 else [f"Hashtag{n+1}" for n in range(combination_size)]
+    edges = pd.DataFrame({
+        name: pd.Categorical.from_codes(graph["combos"][:, column], categories=graph["labels"])
+        for column, name in enumerate(names)
+    })
+    edges["Weight"] = graph["weights"]
+    return nodes, edges
+
+def graph_adjacency(graph):
+    """
+    Function to get the undirected weighted adjacency of a binary 2-collocation graph in CSR form:
+    node i's neighbours are indices[indptr[i]:indptr[i+1]], with the edge weights at the same places in data.
+
+    Args:
+        graph (dict): Graph from load_graph, of 2-collocations
+
+    Returns:
+        np.array: indptr, length nodes + 1
+        np.array: indices, neighbour of each entry
+        np.array: data, weight of each entry
+    """
+    sources = np.concatenate([graph["combos"][:, 0], graph["combos"][:, 1]])
+    targets = np.concatenate([graph["combos"][:, 1], graph["combos"][:, 0]])
+    data = np.concatenate([graph["weights"], graph["weights"]])
+    order = np.lexsort((targets, sources))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(graph["labels"])))]).astype(np.int64)
+    return indptr, targets[order], data[order]
+
+def edge_associations(graph):
+    """
+    Function to score every edge of a binary 2-collocation graph by association strength rather than raw count.
+    Each collocation is treated as one trial: N is the total weight, an edge x-y was seen c times,
+    and x was in a_x of the trials, its weighted degree. From the 2x2 table of those:
+        PMI  = log2(c N / (a_x a_y))
+        NPMI = PMI / -log2(c / N), from -1 to 1
+        LLR  = Dunning's log-likelihood ratio, G^2 = 2 sum(k ln(k / E))
+        Dice = 2c / (a_x + a_y)
+    N and the marginals both come from the graph's own edges, so a graph pruned by edges_filter.py or
+    graph_reduction.py is scored as the graph it is; its stored appearances count the full graph and would make
+    the table inconsistent, down to negative cells.
+
+    Args:
+        graph (dict): Graph from load_graph, of 2-collocations
+
+    Returns:
+        dict: {"pmi", "npmi", "llr", "dice"}, an array of one score per edge each
+    """
+    counts = graph["weights"].astype(np.float64)
+    total = counts.sum()
+    degrees = np.bincount(graph["combos"].reshape(-1), weights=np.repeat(counts, 2), minlength=len(graph["labels"]))
+    source_degrees = degrees[graph["combos"][:, 0]]
+    target_degrees = degrees[graph["combos"][:, 1]]
+
+    pmi = np.log2(counts * total / (source_degrees * target_degrees))
+    joint = -np.log2(counts / total)
+    # an edge in every trial is perfectly associated; its joint term is zero
+    npmi = np.divide(pmi, joint, out=np.ones_like(pmi), where=joint > 0)
+
+    # the 2x2 table of x/not x against y/not y, and the counts expected if they were independent
+    table = [
+        (counts, source_degrees, target_degrees),
+        (source_degrees - counts, source_degrees, total - target_degrees),
+        (target_degrees - counts, total - source_degrees, target_degrees),
+        (total - source_degrees - target_degrees + counts, total - source_degrees, total - target_degrees),
+    ]
+    llr = np.zeros_like(counts)
+    for observed, row_total, column_total in table:
+        expected = row_total * column_total / total
+        llr += np.where(observed > 0, observed * np.log(np.where(observed > 0, observed, 1) / np.where(expected > 0, expected, 1)), 0)
+    llr *= 2
+
+    dice = 2 * counts / (source_degrees + target_degrees)
+    return {"pmi": pmi, "npmi": npmi, "llr": llr, "dice": dice}
+
+def graph_modularity(indptr, indices, data, membership, resolution=1.0):
+    """
+    Function to get the modularity of a partition of a weighted undirected graph in CSR form.
+
+    Args:
+        indptr (np.array): CSR row pointers
+        indices (np.array): CSR neighbours, both directions of every edge present
+        data (np.array): CSR weights
+        membership (np.array): Community of each node
+        resolution (float, optional): Resolution, above 1 favours smaller communities. Defaults to 1.0.
+
+    Returns:
+        float: Modularity
+    """
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    total = data.sum()
+    if total == 0:
+        return 0.0
+    internal = data[membership[rows] == membership[indices]].sum()
+    community_totals = np.bincount(membership, weights=np.bincount(rows, weights=data, minlength=len(membership)))
+    return float((internal - resolution * (community_totals**2).sum() / total) / total)
+
+def move_nodes(indptr, indices, data, degrees, membership, resolution, rng):
+    """
+    Function for the local moving phase: each node is moved to whichever neighbouring community gains the most modularity.
+    Nodes start queued in random order, and only the neighbours of a node that moved are queued again,
+    so once most nodes have settled a pass costs next to nothing.
+
+    Args:
+        indptr (np.array): CSR row pointers
+        indices (np.array): CSR neighbours
+        data (np.array): CSR weights
+        degrees (np.array): Weighted degree of each node, self loops included
+        membership (np.array): Starting community of each node
+        resolution (float): Resolution
+        rng (np.random.Generator): Random generator for the visiting order
+
+    Returns:
+        np.array: Community of each node
+        int: Number of moves made
+    """
+    # plain lists, python loops over them are several times quicker than over numpy arrays
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    data = data.tolist()
+    degree_list = degrees.tolist()
+    membership = membership.tolist()
+    community_totals = np.bincount(membership, weights=degrees, minlength=len(membership)).tolist()
+    total = float(degrees.sum())
+    queue = deque(rng.permutation(len(membership)).tolist())
+    queued = [True] * len(membership)
+    moves = 0
+    while queue:
+        node = queue.popleft()
+        queued[node] = False
+        community = membership[node]
+        degree = degree_list[node]
+        links = {}
+        for position in range(indptr[node], indptr[node+1]):
+            neighbour = indices[position]
+            if neighbour != node:
+                neighbour_community = membership[neighbour]
+                links[neighbour_community] = links.get(neighbour_community, 0.0) + data[position]
+        community_totals[community] -= degree
+        best = community
+        best_gain = links.get(community, 0.0) - resolution * community_totals[community] * degree / total
+        for neighbour_community, weight in links.items():
+            gain = weight - resolution * community_totals[neighbour_community] * degree / total
+            if gain > best_gain:
+                best = neighbour_community
+                best_gain = gain
+        community_totals[best] += degree
+        if best != community:
+            membership[node] = best
+            moves += 1
+            # neighbours outside the new community might now prefer it
+            for position in range(indptr[node], indptr[node+1]):
+                neighbour = indices[position]
+                if not queued[neighbour] and membership[neighbour] != best:
+                    queued[neighbour] = True
+                    queue.append(neighbour)
+    return np.asarray(membership, dtype=np.int64), moves
+
+def refine_partition(indptr, indices, data, degrees, membership, resolution, rng, randomness=0.01):
+    """
+    Function for the Leiden refinement phase: inside each community, nodes start on their own and are merged
+    into well-connected subcommunities, picked at random weighted towards the bigger gains.
+    Aggregating on the refined partition is what stops Leiden producing the badly connected communities Louvain can.
+
+    Args:
+        indptr (np.array): CSR row pointers
+        indices (np.array): CSR neighbours
+        data (np.array): CSR weights
+        degrees (np.array): Weighted degree of each node, self loops included
+        membership (np.array): Community of each node from move_nodes
+        resolution (float): Resolution
+        rng (np.random.Generator): Random generator for the visiting order and merges
+        randomness (float, optional): How far from greedy the merges are; 0 is greedy. Defaults to 0.01.
+
+    Returns:
+        np.array: Subcommunity of each node, numbered by its founding node
+    """
+    num_nodes = len(membership)
+    rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    same = (membership[rows] == membership[indices]) & (rows != indices)
+    # weight from each node to the rest of its community
+    internal = np.bincount(rows[same], weights=data[same], minlength=num_nodes).tolist()
+    community_totals = np.bincount(membership, weights=degrees, minlength=num_nodes).tolist()
+    total = float(degrees.sum())
+
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    data = data.tolist()
+    degree_list = degrees.tolist()
+    membership = membership.tolist()
+    refined = list(range(num_nodes))
+    refined_totals = list(degree_list)
+    refined_sizes = [1] * num_nodes
+    # weight from each subcommunity to the rest of its community
+    refined_external = list(internal)
+
+    for node in rng.permutation(num_nodes).tolist():
+        if refined_sizes[refined[node]] > 1:
+            # only nodes still on their own are merged
+            continue
+        community = membership[node]
+        degree = degree_list[node]
+        if internal[node] < resolution * degree * (community_totals[community] - degree) / total:
+            # not well connected to its own community
+            continue
+        links = {}
+        for position in range(indptr[node], indptr[node+1]):
+            neighbour = indices[position]
+            if neighbour != node and membership[neighbour] == community:
+                links[refined[neighbour]] = links.get(refined[neighbour], 0.0) + data[position]
+        candidates = []
+        gains = []
+        for subcommunity, weight in links.items():
+            well_connected = refined_external[subcommunity] >= \
+                resolution * refined_totals[subcommunity] * (community_totals[community] - refined_totals[subcommunity]) / total
+            gain = weight - resolution * refined_totals[subcommunity] * degree / total
+            if well_connected and gain >= 0:
+                candidates.append(subcommunity)
+                gains.append(gain)
+        if not candidates:
+            continue
+        if randomness > 0:
+            scaled = (np.asarray(gains) - max(gains)) / (randomness * total)
+            probabilities = np.exp(scaled)
+            choice = int(rng.choice(len(candidates), p=probabilities / probabilities.sum()))
+        else:
+            choice = int(np.argmax(gains))
+        target = candidates[choice]
+        refined[node] = target
+        refined_sizes[target] += 1
+        refined_totals[target] += degree
+        refined_external[target] += internal[node] - 2 * links[target]
+    return np.asarray(refined, dtype=np.int64)
+
+def aggregate_graph(indptr, indices, data, labels, num_labels):
+    """
+    Function to collapse a graph onto a partition: each part becomes a node,
+    and the edges between parts are summed, the edges within a part becoming a self loop.
+
+    Args:
+        indptr (np.array): CSR row pointers
+        indices (np.array): CSR neighbours
+        data (np.array): CSR weights
+        labels (np.array): Part of each node, 0..num_labels-1
+        num_labels (int): Number of parts
+
+    Returns:
+        np.array: indptr of the collapsed graph
+        np.array: indices of the collapsed graph
+        np.array: data of the collapsed graph
+    """
+    rows = labels[np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))]
+    codes = rows.astype(np.int64) * num_labels + labels[indices]
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    new_data = np.bincount(inverse.reshape(-1), weights=data)
+    new_rows = unique_codes // num_labels
+    new_indptr = np.concatenate([[0], np.cumsum(np.bincount(new_rows, minlength=num_labels))]).astype(np.int64)
+    return new_indptr, unique_codes % num_labels, new_data
+
+def detect_communities(indptr, indices, data, method="leiden", resolution=1.0, seed=0, randomness=0.01, initial=None, verbose=True):
+    """
+    Function to find the communities of a weighted undirected graph by modularity, with Louvain or Leiden.
+    Runs headless on the CSR adjacency from graph_adjacency; the same seed always gives the same communities.
+    Communities are numbered by size, biggest first.
+
+    Args:
+        indptr (np.array): CSR row pointers
+        indices (np.array): CSR neighbours, both directions of every edge present
+        data (np.array): CSR weights
+        method (string, optional): "louvain" or "leiden". Defaults to "leiden".
+        resolution (float, optional): Resolution, above 1 favours smaller communities. Defaults to 1.0.
+        seed (int, optional): Random seed. Defaults to 0.
+        randomness (float, optional): Leiden refinement randomness, see refine_partition. Defaults to 0.01.
+        initial (np.array, optional): Community of each node to start from, e.g. an earlier result. Defaults to None (singletons).
+        verbose (bool, optional): Print the nodes, communities, modularity and time of each level. Defaults to True.
+
+    Returns:
+        np.array: Community of each node
+        float: Modularity of the partition
+        list: (level, nodes, communities, modularity, seconds) of each level
+    """
+    rng = np.random.default_rng(seed)
+    num_nodes = len(indptr) - 1
+    # which node of the current level each original node is in
+    node_level = np.arange(num_nodes)
+    membership = np.arange(num_nodes) if initial is None else np.unique(initial, return_inverse=True)[1].reshape(-1)
+    levels = []
+    level = 0
+    while True:
+        level_start = time.time()
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        degrees = np.bincount(rows, weights=data, minlength=len(indptr) - 1)
+        membership, moves = move_nodes(indptr, indices, data, degrees, membership, resolution, rng)
+        membership = np.unique(membership, return_inverse=True)[1].reshape(-1)
+        num_communities = int(membership.max()) + 1 if len(membership) else 0
+        if method == "leiden":
+            parts = np.unique(refine_partition(indptr, indices, data, degrees, membership, resolution, rng, randomness), return_inverse=True)[1].reshape(-1)
+        else:
+            parts = membership
+        num_parts = int(parts.max()) + 1 if len(parts) else 0
+        # collapsing keeps modularity, so this level's graph gives the modularity of the whole partition
+        levels.append((level, len(indptr) - 1, num_communities, graph_modularity(indptr, indices, data, membership, resolution), time.time() - level_start))
+        if verbose:
+            print(f"level {level}: {levels[-1][1]} nodes -> {num_communities} communities, modularity {levels[-1][3]:.6f}, {levels[-1][4]:.2f}s")
+        if num_communities == len(indptr) - 1:
+            # every community is a single node, nothing left to merge
+            break
+        if num_parts == len(indptr) - 1:
+            # the refinement merged nothing, collapse the communities themselves so the next level still shrinks
+            parts = membership
+            num_parts = num_communities
+        # the next level's nodes are the parts; under Leiden they start in their part's community
+        next_membership = np.zeros(num_parts, dtype=np.int64)
+        next_membership[parts] = membership
+        indptr, indices, data = aggregate_graph(indptr, indices, data, parts, num_parts)
+        node_level = parts[node_level]
+        membership = next_membership if method == "leiden" else np.arange(num_parts)
+        level += 1
+
+    communities = membership[node_level]
+    # number by size, biggest first, ties by first node, so numbering doesn't depend on the order things merged
+    sizes = np.bincount(communities)
+    firsts = np.full(len(sizes), num_nodes)
+    np.minimum.at(firsts, communities, np.arange(num_nodes))
+    order = np.lexsort((firsts, -sizes))
+    renumber = np.empty(len(sizes), dtype=np.int64)
+    renumber[order] = np.arange(len(sizes))
+    communities = renumber[communities]
+    return communities, levels[-1][3], levels
+
+def partition_nmi(first, second):
+    """
+    Function for the normalised mutual information between two partitions of the same nodes,
+    1 when they are the same up to numbering, near 0 when they are unrelated.
+    Normalised by the mean of the two entropies.
+
+    Args:
+        first (np.array): Community of each node
+        second (np.array): Community of each node under another partition
+
+    Returns:
+        float: NMI between the two
+    """
+    first = np.unique(first, return_inverse=True)[1].reshape(-1)
+    second = np.unique(second, return_inverse=True)[1].reshape(-1)
+    num_nodes = len(first)
+    # contingency table, only the non-empty cells
+    joint = np.unique(first.astype(np.int64) * (int(second.max()) + 1) + second, return_counts=True)[1] / num_nodes
+    first_sizes = np.bincount(first) / num_nodes
+    second_sizes = np.bincount(second) / num_nodes
+    first_entropy = -np.sum(first_sizes * np.log(first_sizes))
+    second_entropy = -np.sum(second_sizes * np.log(second_sizes))
+    if first_entropy + second_entropy == 0:
+        # both put everything in one community
+        return 1.0
+    mutual_information = first_entropy + second_entropy + np.sum(joint * np.log(joint))
+    return float(max(mutual_information, 0.0) / ((first_entropy + second_entropy) / 2))
+
+def best_matches(reference, partition, communities):
+    """
+    Function to find, for some communities of a reference partition, the community of another partition overlapping each most,
+    by Jaccard similarity of their nodes. A community that survives between runs keeps a Jaccard near 1.
+
+    Args:
+        reference (np.array): Community of each node in the reference partition
+        partition (np.array): Community of each node in the other partition
+        communities (list): Reference communities to match
+
+    Returns:
+        list: (matching community, Jaccard) for each of the given communities
+    """
+    partition_sizes = np.bincount(partition)
+    matches = []
+    for community in communities:
+        members = reference == community
+        overlaps = np.bincount(partition[members], minlength=len(partition_sizes))
+        jaccards = overlaps / (members.sum() + partition_sizes - overlaps)
+        best = int(np.argmax(jaccards))
+        matches.append((best, float(jaccards[best])))
+    return matches
+
+def write_partitions(filename, labels, partitions, resolutions, seeds, modularities):
+    """
+    Function to write many partitions of one graph into a single compressed binary file.
+    Partitions are stored as one (runs, nodes) matrix in the smallest integer type that holds every community number.
+
+    Args:
+        filename (string): Path of the .npz file
+        labels (list): Hashtag of each node
+        partitions (np.array): (runs, nodes) community of each node in each run
+        resolutions (np.array): Resolution of each run
+        seeds (np.array): Seed of each run
+        modularities (np.array): Modularity of each run
+    """
+    tmp_filename = os.path.join(os.path.dirname(filename), "." + os.path.basename(filename) + ".tmp.npz")
+    np.savez_compressed(
+        tmp_filename,
+        labels=np.frombuffer("\n".join(labels).encode("utf-8"), dtype=np.uint8),
+        partitions=partitions.astype(np.min_scalar_type(int(partitions.max()) if partitions.size else 0)),
+        resolutions=np.asarray(resolutions, dtype=np.float64),
+        seeds=np.asarray(seeds, dtype=np.int64),
+        modularities=np.asarray(modularities, dtype=np.float64),
+    )
+    os.replace(tmp_filename, filename)
+
+def load_partitions(filename):
+    """
+    Function to load partitions written by write_partitions.
+
+    Args:
+        filename (string): Path of the .npz file
+
+    Returns:
+        dict: {"labels": list of hashtags, "partitions": (runs, nodes), "resolutions", "seeds", "modularities": per run}
+    """
+    with np.load(filename) as partitions_file:
+        partitions = {name: partitions_file[name] for name in partitions_file.files}
+    labels = partitions["labels"].tobytes().decode("utf-8")
+    partitions["labels"] = labels.split("\n") if labels else []
+    return partitions
+
+def window_adjacency(slices, num_labels, min_appearances=1):
+    """
+    Function to add up the 2-collocation counts of some day slices into one undirected graph, in CSR form,
+    keeping only the hashtags which appear at least min_appearances times (summed edge weights) in them.
+    Only the counts are needed, so slices read with load_checkpoint_day(..., names=["combos", "weights"]) will do.
+
+    Args:
+        slices (list): Dicts with "combos" and "weights", in global ids
+        num_labels (int): Number of global ids
+        min_appearances (int, optional): Smallest appearances a hashtag needs to be kept. Defaults to 1.
+
+    Returns:
+        np.array: Global ids of the graph's nodes, ascending
+        np.array: Appearances of each node
+        np.array: indptr, see graph_adjacency
+        np.array: indices
+        np.array: data, as float64
+    """
+    combos = np.concatenate([day_slice["combos"] for day_slice in slices]).astype(np.int64)
+    weights = np.concatenate([day_slice["weights"] for day_slice in slices])
+    # the same pair can come out either way round on different days
+    keys = np.minimum(combos[:, 0], combos[:, 1]) * num_labels + np.maximum(combos[:, 0], combos[:, 1])
+    keys, inverse = np.unique(keys, return_inverse=True)
+    weights = np.bincount(inverse.reshape(-1), weights=weights)
+    combos = np.stack([keys // num_labels, keys % num_labels], axis=1)
+    appearances = np.bincount(combos.reshape(-1), weights=np.repeat(weights, 2), minlength=num_labels).astype(np.int64)
+    nodes = np.flatnonzero(appearances >= max(min_appearances, 1))
+    positions = np.full(num_labels, -1, dtype=np.int64)
+    positions[nodes] = np.arange(len(nodes))
+    combos = positions[combos]
+    kept = (combos >= 0).all(axis=1)
+    indptr, indices, data = graph_adjacency({"combos": combos[kept], "weights": weights[kept], "labels": nodes})
+    return nodes, appearances[nodes], indptr, indices, data.astype(np.float64)
+
+def match_communities(previous_nodes, previous_tracks, current_nodes, current_communities, next_track, threshold=0.3, min_size=5):
+    """
+    Function to carry tracked communities over from one window to the next and find what happened to them.
+    A previous and a current community match when the Jaccard similarity of their hashtags is at least the threshold;
+    matches are taken best first, one to one, for the current community to keep the previous one's track,
+    and every other current community big enough to track starts a new one.
+    A current community with no match is a birth, a previous one with no match a death,
+    a current one matching several previous ones a merge, and a previous one matching several current ones a split.
+
+    Args:
+        previous_nodes (np.array): Global ids of the previous window's nodes, ascending
+        previous_tracks (np.array): Track of each previous node, -1 for communities too small to track
+        current_nodes (np.array): Global ids of the current window's nodes, ascending
+        current_communities (np.array): Community of each current node
+        next_track (int): Number to give the next new track
+        threshold (float, optional): Smallest Jaccard for a match. Defaults to 0.3.
+        min_size (int, optional): Fewest hashtags for a community to be tracked. Defaults to 5.
+
+    Returns:
+        np.array: Track of each current node, -1 for communities too small to track
+        list: (event, track, size, related tracks) of each birth, death, merge and split
+        int: Number to give the next new track after these
+    """
+    current_sizes = np.bincount(current_communities)
+    tracked = np.flatnonzero(current_sizes >= min_size)
+    previous_ids, previous_sizes = np.unique(previous_tracks[previous_tracks >= 0], return_counts=True)
+    previous_sizes = dict(zip(previous_ids.tolist(), previous_sizes.tolist()))
+
+    # hashtags shared between each pair of communities
+    _, previous_positions, current_positions = np.intersect1d(previous_nodes, current_nodes, assume_unique=True, return_indices=True)
+    shared_tracks = previous_tracks[previous_positions]
+    shared_communities = current_communities[current_positions]
+    both = (shared_tracks >= 0) & (current_sizes[shared_communities] >= min_size)
+    pairs, overlaps = np.unique(np.stack([shared_tracks[both], shared_communities[both]], axis=1), axis=0, return_counts=True)
+    matches = []
+    for (track, community), overlap in zip(pairs.tolist(), overlaps.tolist()):
+        jaccard = overlap / (previous_sizes[track] + current_sizes[community] - overlap)
+        if jaccard >= threshold:
+            matches.append((jaccard, track, community))
+    matches.sort(key=lambda match: (-match[0], match[1], match[2]))
+
+    community_tracks = {}
+    used_tracks = set()
+    for _, track, community in matches:
+        if community not in community_tracks and track not in used_tracks:
+            community_tracks[community] = track
+            used_tracks.add(track)
+    for community in tracked.tolist():
+        if community not in community_tracks:
+            community_tracks[community] = next_track
+            next_track += 1
+
+    predecessors = {community: [] for community in tracked.tolist()}
+    successors = {track: [] for track in previous_sizes}
+    for _, track, community in matches:
+        predecessors[community].append(track)
+        successors[track].append(community_tracks[community])
+    events = []
+    for community, tracks in predecessors.items():
+        if not tracks:
+            events.append(("birth", community_tracks[community], int(current_sizes[community]), []))
+        elif len(tracks) > 1:
+            events.append(("merge", community_tracks[community], int(current_sizes[community]), sorted(tracks)))
+    for track, tracks in successors.items():
+        if not tracks:
+            events.append(("death", track, previous_sizes[track], []))
+        elif len(tracks) > 1:
+            events.append(("split", track, previous_sizes[track], sorted(tracks)))
+
+    lookup = np.full(len(current_sizes), -1, dtype=np.int64)
+    for community, track in community_tracks.items():
+        lookup[community] = track
+    return lookup[current_communities], events, next_track
+
+def layout_tree(positions, masses, max_leaf=8, max_depth=20):
+    """
+    Function to build the quadtree for Barnes-Hut repulsion, one level at a time with numpy rather than node by node.
+    Level L splits the bounding square into a 2^L by 2^L grid; each level keeps only its non-empty cells,
+    with their mass, centre of mass, and where their four children are in the next level.
+    Levels are added until no cell holds more than max_leaf nodes, so dense clusters get as deep a tree as they need.
+
+    Args:
+        positions (np.array): (n, 2) node positions
+        masses (np.array): Mass of each node
+        max_leaf (int, optional): Most nodes a deepest level cell may hold. Defaults to 8.
+        max_depth (int, optional): Deepest level allowed, for nodes sitting on top of each other. Defaults to 20.
+
+    Returns:
+        list: For each level, a dict of "codes", "mass", "centre_x", "centre_y", "width", "node_cells" (each node's cell)
+              and, above the deepest level, "children" ((cells, 4) positions in the next level, -1 for empty);
+              the deepest level also has "members" (nodes sorted by leaf) and "starts" (where each leaf's members start)
+    """
+    low = positions.min(axis=0)
+    size = float((positions.max(axis=0) - low).max()) * (1 + 1e-9) or 1.0
+    levels = []
+    for level in range(max_depth + 1):
+        cells = 1 << level
+        grid = np.minimum(((positions - low) / size * cells).astype(np.int64), cells - 1)
+        codes, node_cells = np.unique(grid[:, 0] * cells + grid[:, 1], return_inverse=True)
+        node_cells = node_cells.reshape(-1)
+        mass = np.bincount(node_cells, weights=masses)
+        levels.append({
+            "codes": codes,
+            "mass": mass,
+            "centre_x": np.bincount(node_cells, weights=masses * positions[:, 0]) / mass,
+            "centre_y": np.bincount(node_cells, weights=masses * positions[:, 1]) / mass,
+            "width": size / cells,
+            "node_cells": node_cells
+        })
+        if np.bincount(node_cells).max() <= max_leaf:
+            break
+    for level in range(len(levels) - 1):
+        cells = 1 << level
+        parents = levels[level]["codes"]
+        child_codes = levels[level + 1]["codes"]
+        # the four children of (x, y) are (2x + dx, 2y + dy) in a grid twice as wide
+        wanted = ((2 * (parents // cells))[:, None] + np.array([0, 0, 1, 1])) * (2 * cells) \
+            + (2 * (parents % cells))[:, None] + np.array([0, 1, 0, 1])
+        found = np.minimum(np.searchsorted(child_codes, wanted), len(child_codes) - 1)
+        levels[level]["children"] = np.where(child_codes[found] == wanted, found, -1)
+    leaves = levels[-1]["node_cells"]
+    levels[-1]["members"] = np.argsort(leaves, kind="stable")
+    levels[-1]["starts"] = np.concatenate([[0], np.cumsum(np.bincount(leaves))])
+    return levels
+
+def barnes_hut_repulsion(positions, masses, tree, nodes, theta=1.2):
+    """
+    Function for the ForceAtlas2 repulsion on some nodes, k_r (m_i m_j) / d pushing every pair apart,
+    with far away cells of the quadtree standing in for all the nodes in them.
+    A cell is far enough when its width is under theta times its distance; deepest level cells always are,
+    apart from the node's own, whose few other nodes are taken one by one.
+
+    Args:
+        positions (np.array): (n, 2) node positions
+        masses (np.array): Mass of each node
+        tree (list): Quadtree from layout_tree
+        nodes (np.array): Nodes to find the repulsion on
+        theta (float, optional): Opening threshold, higher is faster and rougher. Defaults to 1.2.
+
+    Returns:
+        np.array: (len(nodes), 2) repulsion on each node, before scaling by k_r
+    """
+    node_x = positions[nodes, 0]
+    node_y = positions[nodes, 1]
+    node_masses = masses[nodes]
+    force_x = np.zeros(len(nodes))
+    force_y = np.zeros(len(nodes))
+
+    def push(pair_nodes, other_x, other_y, other_masses):
+        delta_x = node_x[pair_nodes] - other_x
+        delta_y = node_y[pair_nodes] - other_y
+        strength = node_masses[pair_nodes] * other_masses / np.maximum(delta_x * delta_x + delta_y * delta_y, 1e-12)
+        force_x[:] += np.bincount(pair_nodes, weights=delta_x * strength, minlength=len(nodes))
+        force_y[:] += np.bincount(pair_nodes, weights=delta_y * strength, minlength=len(nodes))
+
+    # (node, cell) pairs still to look at, starting from the root
+    pair_nodes = np.arange(len(nodes))
+    pair_cells = np.zeros(len(nodes), dtype=np.int64)
+    for level, cells in enumerate(tree):
+        own = cells["node_cells"][nodes[pair_nodes]] == pair_cells
+        if level == len(tree) - 1:
+            far_cells = pair_cells[~own]
+            push(pair_nodes[~own], cells["centre_x"][far_cells], cells["centre_y"][far_cells], cells["mass"][far_cells])
+            # every other node in the node's own leaf
+            own_nodes = pair_nodes[own]
+            own_cells = pair_cells[own]
+            counts = cells["starts"][own_cells + 1] - cells["starts"][own_cells]
+            pair_nodes = np.repeat(own_nodes, counts)
+            firsts = np.repeat(cells["starts"][own_cells] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+            others = cells["members"][firsts + np.arange(len(pair_nodes))]
+            different = others != nodes[pair_nodes]
+            others = others[different]
+            push(pair_nodes[different], positions[others, 0], positions[others, 1], masses[others])
+            break
+        centre_x = cells["centre_x"][pair_cells]
+        centre_y = cells["centre_y"][pair_cells]
+        delta_x = node_x[pair_nodes] - centre_x
+        delta_y = node_y[pair_nodes] - centre_y
+        accept = ~own & (cells["width"] ** 2 < theta ** 2 * (delta_x * delta_x + delta_y * delta_y))
+        push(pair_nodes[accept], centre_x[accept], centre_y[accept], cells["mass"][pair_cells[accept]])
+        # open everything else into its children
+        children = cells["children"][pair_cells[~accept]]
+        present = children >= 0
+        pair_nodes = np.repeat(pair_nodes[~accept], 4)[present.reshape(-1)]
+        pair_cells = children[present]
+    return np.stack([force_x, force_y], axis=1)
+
+def forceatlas2_layout(indptr, indices, data, iterations=500, scaling=2.0, gravity=1.0, theta=1.2, seed=0, threads=1, positions=None, verbose=True):
+    """
+    Function for a ForceAtlas2 layout of a graph, as gephi's, without a GUI.
+    Nodes weigh their degree + 1, repel each other by Barnes-Hut (O(n log n) per iteration), are pulled together along
+    their edges in proportion to distance and weight, and are pulled to the middle by gravity; each node's step is
+    set by ForceAtlas2's adaptive speed, so settled nodes stop swinging while the rest keep moving.
+    The repulsion is split over threads by node, so the same seed gives the same layout for any number of threads.
+
+    Args:
+        indptr (np.array): CSR row pointers, see graph_adjacency
+        indices (np.array): CSR neighbours
+        data (np.array): CSR weights
+        iterations (int, optional): Number of iterations. Defaults to 500.
+        scaling (float, optional): Repulsion strength k_r. Defaults to 2.0.
+        gravity (float, optional): Gravity strength k_g. Defaults to 1.0.
+        theta (float, optional): Barnes-Hut opening threshold. Defaults to 1.2.
+        seed (int, optional): Random seed for the starting positions. Defaults to 0.
+        threads (int, optional): Threads for the repulsion. Defaults to 1.
+        positions (np.array, optional): (n, 2) positions to start from, e.g. a previous layout. Defaults to None (random).
+        verbose (bool, optional): Print progress every 50 iterations. Defaults to True.
+
+    Returns:
+        np.array: (n, 2) node positions
+    """
+    num_nodes = len(indptr) - 1
+    if positions is None:
+        positions = np.random.default_rng(seed).uniform(-1, 1, (num_nodes, 2)) * np.sqrt(num_nodes) * 10
+    positions = positions.astype(np.float64)
+    if num_nodes < 2:
+        return positions
+    masses = np.diff(indptr).astype(np.float64) + 1
+    rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    chunks = np.array_split(np.arange(num_nodes), max(threads, 1) * 4)
+    pool = ThreadPool(threads) if threads > 1 else None
+    speed = 1.0
+    speed_efficiency = 1.0
+    previous = np.zeros((num_nodes, 2))
+    start = time.time()
+    try:
+        for iteration in range(iterations):
+            tree = layout_tree(positions, masses)
+            if pool is not None:
+                repulsion = np.concatenate(pool.map(lambda chunk: barnes_hut_repulsion(positions, masses, tree, chunk, theta), chunks))
+            else:
+                repulsion = barnes_hut_repulsion(positions, masses, tree, np.arange(num_nodes), theta)
+            force = scaling * repulsion
+            # linear attraction along every edge
+            delta = positions[rows] - positions[indices]
+            force[:, 0] -= np.bincount(rows, weights=data * delta[:, 0], minlength=num_nodes)
+            force[:, 1] -= np.bincount(rows, weights=data * delta[:, 1], minlength=num_nodes)
+            distances = np.sqrt((positions ** 2).sum(axis=1))
+            force -= positions * (gravity * masses / np.maximum(distances, 1e-12))[:, None]
+
+            # adaptive speed, as in gephi's ForceAtlas2
+            swinging = masses * np.sqrt(((previous - force) ** 2).sum(axis=1))
+            total_swinging = swinging.sum()
+            total_traction = (masses * 0.5 * np.sqrt(((previous + force) ** 2).sum(axis=1))).sum()
+            estimated_tolerance = 0.05 * np.sqrt(num_nodes)
+            jitter = max(np.sqrt(estimated_tolerance), min(10, estimated_tolerance * total_traction / num_nodes ** 2))
+            if total_swinging / max(total_traction, 1e-12) > 2.0:
+                if speed_efficiency > 0.05:
+                    speed_efficiency *= 0.5
+                jitter = max(jitter, 1.0)
+            target_speed = jitter * speed_efficiency * total_traction / max(total_swinging, 1e-12)
+            if total_swinging > jitter * total_traction:
+                if speed_efficiency > 0.05:
+                    speed_efficiency *= 0.7
+            elif speed < 1000:
+                speed_efficiency *= 1.3
+            speed = speed + min(target_speed - speed, 0.5 * speed)
+            positions = positions + force * (speed / (1 + np.sqrt(speed * swinging)))[:, None]
+            previous = force
+            if verbose and (iteration + 1) % 50 == 0:
+                print(f"{nicetime(start, time.time())} | Iteration {iteration + 1}/{iterations}, speed {speed:.4f}")
+    finally:
+        if pool is not None:
+            pool.close()
+    return positions
+
+def core_numbers(indptr, indices):
+    """
+    Function for the core number of every node: the largest k for which it is in the k-core,
+    the biggest subgraph where every node has at least k neighbours.
+    Uses Batagelj and Zaversnik's bucket algorithm, peeling nodes off in degree order in O(nodes + edges);
+    self loops are ignored and edge weights play no part.
+
+    Args:
+        indptr (np.array): CSR row pointers, see graph_adjacency
+        indices (np.array): CSR neighbours
+
+    Returns:
+        np.array: Core number of each node
+    """
+    num_nodes = len(indptr) - 1
+    rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    degrees = np.diff(indptr) - np.bincount(rows[indices == rows], minlength=num_nodes)
+    # nodes sorted by degree, with where each degree's bucket starts
+    order = np.argsort(degrees, kind="stable")
+    positions = np.empty(num_nodes, dtype=np.int64)
+    positions[order] = np.arange(num_nodes)
+    bucket_starts = np.concatenate([[0], np.cumsum(np.bincount(degrees))])[:-1].tolist() if num_nodes else []
+    # plain lists, as in move_nodes
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    degrees = degrees.tolist()
+    order = order.tolist()
+    positions = positions.tolist()
+    for i in range(num_nodes):
+        node = order[i]
+        node_degree = degrees[node]
+        for position in range(indptr[node], indptr[node+1]):
+            neighbour = indices[position]
+            neighbour_degree = degrees[neighbour]
+            if neighbour_degree > node_degree:
+                # move the neighbour to the front of its bucket, then shift the bucket along past it
+                neighbour_position = positions[neighbour]
+                front_position = bucket_starts[neighbour_degree]
+                front = order[front_position]
+                if front != neighbour:
+                    order[neighbour_position], order[front_position] = front, neighbour
+                    positions[neighbour], positions[front] = front_position, neighbour_position
+                bucket_starts[neighbour_degree] += 1
+                degrees[neighbour] = neighbour_degree - 1
+    return np.asarray(degrees, dtype=np.int64)
+
+def weighted_degrees(indptr, data):
+    """
+    Function for the weighted degree of every node, the summed weight of its edges.
+    For a collocation graph this is the node's appearances.
+
+    Args:
+        indptr (np.array): CSR row pointers, see graph_adjacency
+        data (np.array): CSR weights
+
+    Returns:
+        np.array: Weighted degree of each node
+    """
+    return np.bincount(np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)), weights=data, minlength=len(indptr) - 1)
+
+def top_neighbour_edges(combos, weights, num_nodes, top_k, mutual=False):
+    """
+    Function to find which edges are among the top_k heaviest of their nodes, ties going to the edge listed first.
+    An edge is kept if it's in the top_k of either of its two nodes, or of both with mutual.
+
+    Args:
+        combos (np.array): (n, 2) array of node ids
+        weights (np.array): Weight of each edge
+        num_nodes (int): Number of nodes
+        top_k (int): Edges to keep per node
+        mutual (bool, optional): Keep only edges in the top_k of both nodes. Defaults to False.
+
+    Returns:
+        np.array: Mask of the edges to keep
+    """
+    num_edges = len(weights)
+    # every edge once from each end
+    sources = np.concatenate([combos[:, 0], combos[:, 1]])
+    edges = np.concatenate([np.arange(num_edges), np.arange(num_edges)])
+    order = np.lexsort((edges, -np.concatenate([weights, weights]), sources))
+    starts = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=num_nodes))])
+    ranks = np.arange(len(order)) - starts[sources[order]]
+    kept = np.bincount(edges[order[ranks < top_k]], minlength=num_edges)
+    return kept == 2 if mutual else kept > 0
@@ -1,47 +1,79 @@
 """
-Simple script to filter out all edges with less than 1000 appearances from our edges CSV.
+Script to prune the collocation graph down to the nodes and edges above some thresholds, for several thresholds at once.
+Works straight from the collocation checkpoint written by collocations.py, so the CSVs are never re-read,
+and every threshold comes out of the same pass over the counts.
+
+Usage:
+    python edges_filter.py [node thresholds, comma separated] [edge thresholds, comma separated] [combination size]
+    e.g. python edges_filter.py 500,1000,2000 0,10
+
+    Node thresholds keep hashtags with at least that many appearances, and edges between two kept hashtags.
+    Edge thresholds additionally drop edges weighing less than that; 0 keeps them all.
+    Defaults to a node threshold of 1000 and no edge threshold, which gives the original _1000plus files.
+
+Returns:
+    data/collocations/x_hashtag_appearances_[node threshold]plus.csv
+        Nodes kept at each node threshold.
+    data/collocations/x_hashtag_collocations_[node threshold]plus.csv
+        Edges kept at each node threshold, with no edge threshold.
+    data/collocations/x_hashtag_collocations_[node threshold]plus_[edge threshold]weight.csv
+        Edges kept at each pair of node and edge thresholds, for edge thresholds above 0.
+    data/collocations/x_hashtag_graph_[node threshold]plus[_[edge threshold]weight].npz
+        Each pruned graph's nodes and edges in one binary file, see disslib.load_graph.
+    data/collocations/x_hashtag_thresholds.csv
+        Number of nodes and edges kept at every pair of thresholds.
 """
+import sys
 import csv
+import disslib
 
-def main():
+def main(args):
     """
-    Simple script to filter out all edges with less than 1000 appearances from our edges CSV.
+    Driver function to read the arguments, load the counts, and write the pruned graphs out.
+
+    Args:
+        args (list): List of given arguments from the command line.
     """
-    # I know nesting these isn't "proper", sue me again
-    # 4 files open
-    with open("data/collocations/2_hashtag_appearances.csv", newline='', encoding="utf-8") as app_orig:
-        with open("data/collocations/2_hashtag_collocations.csv", newline='', encoding="utf-8") as coll_orig:
-            with open("data/collocations/2_hashtag_appearances_1000plus.csv", "w+", encoding="utf-8") as app_new:
-                with open("data/collocations/2_hashtag_collocations_1000plus.csv", "w+", encoding="utf-8") as coll_new:
-                    # set up readers
-                    appearances_csv = csv.reader(app_orig, delimiter=' ', quotechar='|')
-                    collocations_csv = csv.reader(coll_orig, delimiter=' ', quotechar='|')
-                    next(appearances_csv, None)
-                    next(collocations_csv, None)
-
-                    # set up writers
-                    app_writer = csv.writer(app_new, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                    coll_writer = csv.writer(coll_new, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                    app_writer.writerow(["ID", "Appearances"])
-                    coll_writer.writerow(["Source", "Target", "Weight"])
-
-                    # loop variable
-                    above_999_set = set()
-                    for app_line in appearances_csv:
-                        # construct set of good hashtags with >999 appearances
-                        if int(app_line[1]) > 999:
-                            above_999_set.add(app_line[0])
-                            app_writer.writerow(app_line)
-
-                    check_set = set()
-                    for coll_line in collocations_csv:
-                        # check for both hashtags being in the set of good hashtags
-                        if coll_line[0] in above_999_set:
-                            if coll_line[1] in above_999_set:
-                                coll_writer.writerow(coll_line)
-
-                    print(above_999_set.difference(check_set))
-                    print(check_set.difference(above_999_set))
+    node_thresholds = [int(threshold) for threshold in args[0].split(",")] if len(args) > 0 else [1000]
+    edge_thresholds = [int(threshold) for threshold in args[1].split(",")] if len(args) > 1 else [0]
+    combination_size = int(args[2]) if len(args) > 2 else 2
+    prefix = "data/collocations/" + str(combination_size) + "_hashtag_"
+
+    checkpoint = disslib.load_collocation_checkpoint(prefix + "checkpoint", combination_size)
+    if checkpoint["aggregate"] is None:
+        print(f"No collocation checkpoint found in {prefix}checkpoint, run collocations.py first.")
+        sys.exit(1)
+    labels = checkpoint["labels"]
+    combos, weights, nodes, appearances = disslib.graph_order(
+        checkpoint["aggregate"]["combos"],
+        checkpoint["aggregate"]["weights"],
+        len(labels)
+    )
+    # an edge survives a node threshold if its least appearing hashtag does
+    edge_floors = appearances[combos].min(axis=1)
+
+    summary = []
+    for node_threshold in node_thresholds:
+        node_mask = appearances[nodes] >= node_threshold
+        disslib.write_nodes_csv(
+            prefix + "appearances_" + str(node_threshold) + "plus.csv",
+            nodes[node_mask],
+            appearances,
+            labels,
+            header=("ID", "Appearances")
+        )
+        for edge_threshold in edge_thresholds:
+            edge_mask = (edge_floors >= node_threshold) & (weights >= edge_threshold)
+            suffix = str(node_threshold) + "plus" + (("_" + str(edge_threshold) + "weight") if edge_threshold > 0 else "")
+            disslib.write_edges_csv(prefix + "collocations_" + suffix + ".csv", combos[edge_mask], weights[edge_mask], labels)
+            disslib.write_graph(prefix + "graph_" + suffix + ".npz", combos[edge_mask], weights[edge_mask], nodes[node_mask], appearances, labels)
+            summary.append([node_threshold, edge_threshold, int(node_mask.sum()), int(edge_mask.sum())])
+            print(f"Appearances >= {node_threshold}, weight >= {edge_threshold}: {summary[-1][2]} nodes, {summary[-1][3]} edges")
+
+    with open(prefix + "thresholds.csv", "w+", encoding="utf-8") as summary_handle:
+        summary_writer = csv.writer(summary_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        summary_writer.writerow(["NodeThreshold", "EdgeThreshold", "Nodes", "Edges"])
+        summary_writer.writerows(summary)
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
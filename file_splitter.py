@@ -1,24 +1,43 @@
-import pandas as pd
-import numpy as np
+"""
+Script to split an oversized JSON day file into parts, streaming the compressed lines.
+Never loads the file into a dataframe, so memory use stays constant.
+
+Usage:
+    python file_splitter.py <file> parts <number of parts> [output directory]
+    python file_splitter.py <file> lines <lines per part> [output directory]
+    python file_splitter.py <file> bytes <uncompressed bytes per part> [output directory]
+
+Returns:
+    [output directory]/elections2022_tweets-[date]PART[n].json.gz
+        Gzipped JSON files, one per part.
+"""
+import sys
 import disslib
 
-def main():
-    file_to_split = "data/elections2022/elections22/TOOBIG/elections2022_tweets-20221029.json"
-    filedate = file_to_split.split(".")[0].split("-")[1]
-    print("loading file")
-    current_file = disslib.load_tweets_json(file_to_split)
-    sz = len(current_file.index) // 2
-    print("splitting dataframe 1")
-    df1 = current_file.iloc[:, :sz]
-    print("writing out df1")
-    df1.to_json("data/elections2022/elections22/elections2022_tweets-"+filedate+"PART1.json.gz")
-    del df1
-    print("splitting dataframe 2")
-    df2 = current_file.iloc[:, sz:]
-    del current_file
-    print("writing out df2")
-    df2.to_json("data/elections2022/elections22/elections2022_tweets-"+filedate+"PART2.json.gz")
-    del df2
-    print("done")
+def main(args):
+    """
+    Driver function to read the arguments and split the file.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    if len(args) < 3 or args[1] not in ("parts", "lines", "bytes"):
+        print(__doc__)
+        sys.exit(1)
+    file_to_split = args[0]
+    mode = args[1]
+    value = int(args[2])
+    output_dir = args[3] if len(args) > 3 else None
+
+    print(f"Splitting {file_to_split} by {mode}: {value}")
+    written = disslib.split_tweets_json(
+        file_to_split,
+        parts=value if mode == "parts" else None,
+        max_lines=value if mode == "lines" else None,
+        max_bytes=value if mode == "bytes" else None,
+        output_dir=output_dir
+    )
+    print(f"Done, {len(written)} parts written.")
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main(sys.argv[1:])
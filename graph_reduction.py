@@ -0,0 +1,88 @@
+"""
+Script to cut a collocation graph down by its structure rather than only by appearances, for drawing and community detection.
+Works on the binary graph written by collocations.py or edges_filter.py, and always writes every hashtag's core number,
+so the cut can be chosen from them or they can be loaded into gephi as a node attribute.
+
+Usage:
+    python graph_reduction.py [binary graph] [min core] [min weighted degree] [top k neighbours]
+    e.g. python graph_reduction.py data/collocations/2_hashtag_graph.npz 10 500 20
+
+    Hashtags are kept when they're in the [min core]-core of the whole graph and their edges weigh at least
+    [min weighted degree] in total; of the edges between kept hashtags, only each hashtag's [top k neighbours]
+    heaviest are kept, and hashtags left with no edges are dropped. 0 turns any of the three off.
+
+Returns:
+    data/collocations/2_hashtag_cores_[graph suffix].csv
+        Every hashtag of the graph with its appearances, weighted degree and core number.
+    data/collocations/2_hashtag_graph_[graph suffix]_[cut].npz
+        The cut down graph, e.g. 2_hashtag_graph_all_10core_500degree_20top.npz, see disslib.load_graph.
+    data/collocations/2_hashtag_collocations_[graph suffix]_[cut].csv
+    data/collocations/2_hashtag_appearances_[graph suffix]_[cut].csv
+        Its edges and nodes, as edges_filter.py writes them.
+"""
+import os
+import sys
+import csv
+import time
+import numpy as np
+import disslib
+from communities import graph_suffix
+
+def main(args):
+    """
+    Driver function to read the arguments, find the core numbers and write the cut down graph out.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    graph_filename = args[0] if len(args) > 0 else "data/collocations/2_hashtag_graph.npz"
+    min_core = int(args[1]) if len(args) > 1 else 0
+    min_degree = float(args[2]) if len(args) > 2 else 0
+    top_k = int(args[3]) if len(args) > 3 else 0
+    folder = os.path.dirname(graph_filename)
+    suffix = graph_suffix(graph_filename)
+
+    start = time.time()
+    graph = disslib.load_graph(graph_filename)
+    labels = graph["labels"]
+    indptr, indices, data = disslib.graph_adjacency(graph)
+    print(f"{disslib.nicetime(start, time.time())} | Loaded {len(labels)} nodes and {len(graph['weights'])} edges from {graph_filename}")
+
+    cores = disslib.core_numbers(indptr, indices)
+    degrees = disslib.weighted_degrees(indptr, data)
+    print(f"{disslib.nicetime(start, time.time())} | Core numbers found, degeneracy {int(cores.max()) if len(cores) else 0}")
+    with open(os.path.join(folder, "2_hashtag_cores_" + suffix + ".csv"), "w+", encoding="utf-8") as cores_handle:
+        cores_writer = csv.writer(cores_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        cores_writer.writerow(["ID", "Appearances", "WeightedDegree", "Core"])
+        for row in zip(labels, graph["appearances"].tolist(), degrees.astype(np.int64).tolist(), cores.tolist()):
+            cores_writer.writerow(row)
+
+    cut = []
+    if min_core > 0:
+        cut.append(str(min_core) + "core")
+    if min_degree > 0:
+        cut.append(f"{min_degree:g}degree")
+    if top_k > 0:
+        cut.append(str(top_k) + "top")
+    if not cut:
+        print(f"{disslib.nicetime(start, time.time())} | No cut asked for, only the core numbers written.")
+        return
+    cut = "_".join(cut)
+
+    node_mask = (cores >= min_core) & (degrees >= min_degree)
+    edge_mask = node_mask[graph["combos"]].all(axis=1)
+    if top_k > 0:
+        edge_mask[edge_mask] = disslib.top_neighbour_edges(graph["combos"][edge_mask], graph["weights"][edge_mask], len(labels), top_k)
+    combos = graph["combos"][edge_mask]
+    weights = graph["weights"][edge_mask]
+    # only hashtags left with an edge, in their original order
+    nodes = np.flatnonzero(np.bincount(combos.reshape(-1), minlength=len(labels)) > 0)
+    print(f"{disslib.nicetime(start, time.time())} | Cut {cut}: {len(nodes)} nodes, {len(combos)} edges")
+
+    disslib.write_edges_csv(os.path.join(folder, "2_hashtag_collocations_" + suffix + "_" + cut + ".csv"), combos, weights, labels)
+    disslib.write_nodes_csv(os.path.join(folder, "2_hashtag_appearances_" + suffix + "_" + cut + ".csv"), nodes, graph["appearances"], labels, header=("ID", "Appearances"))
+    disslib.write_graph(os.path.join(folder, "2_hashtag_graph_" + suffix + "_" + cut + ".npz"), combos, weights, nodes, graph["appearances"], labels)
+    print(f"{disslib.nicetime(start, time.time())} | Written to {os.path.join(folder, '2_hashtag_graph_' + suffix + '_' + cut + '.npz')}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,45 @@
+"""
+Script to make raw JSON day files seekable, so single tweets can be read without decoding the whole day.
+Each file is recompressed into a copy with a seek point every few MB and indexed, see disslib.build_gzip_index.
+The raw file is left untouched, so the converter's manifest still sees it as converted; the copy is still
+an ordinary gzip file, and takes about as much disk again as the raw one.
+
+Usage:
+    python gzip_indexer.py <file or directory/> [MB between seek points]
+
+Returns:
+    [file].json.seekable.gz
+        Reblocked copy of each file, next to it.
+    [file].json.seekable.gz.idx.npz
+        Sidecar of seek points, line offsets and tweet ids of the copy.
+"""
+import os
+import sys
+import glob
+import disslib
+
+def main(args):
+    """
+    Driver function to read the arguments and index the files.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    if len(args) < 1:
+        print(__doc__)
+        sys.exit(1)
+    path_to_files = args[0]
+    span = int(float(args[1]) * 1024**2) if len(args) > 1 else disslib.GZIP_CHECKPOINT_BYTES
+
+    if path_to_files.endswith('/'):
+        files = sorted(glob.glob(os.path.join(path_to_files, '*.json.gz')))
+    else:
+        files = sorted(glob.glob(path_to_files))
+    print(f"{len(files)} files to index, seek point every {span} bytes")
+
+    for filename in files:
+        disslib.build_gzip_index(filename, span=span)
+    print("Done.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
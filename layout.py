@@ -0,0 +1,183 @@
+"""
+Script to lay a collocation graph out with ForceAtlas2 and draw it, replacing the layout and export steps in gephi.
+The layout runs headless on the binary graph written by collocations.py or edges_filter.py, with Barnes-Hut repulsion
+spread over threads, so it copes with graphs far bigger than gephi opens. The same seed always gives the same layout.
+
+Usage:
+    python layout.py [binary graph] [communities csv] [iterations] [threads] [seed]
+    e.g. python layout.py data/collocations/2_hashtag_graph_1000plus.npz data/collocations/2_hashtag_modularities_nodes_1000plus.csv 1000 8
+
+    The communities CSV is the one communities.py writes (or gephi exported); "-" or nothing draws every node the same colour.
+
+Returns:
+    data/collocations/2_hashtag_layout_[graph suffix].npz
+        x and y of every node, in the graph's node order, see load_layout.
+    data/collocations/2_hashtag_layout_[graph suffix].png
+        The graph, nodes coloured by community and sized by appearances.
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import matplotlib.patches as mpatches
+from matplotlib.collections import LineCollection
+import disslib
+from communities import graph_suffix
+
+# colours of the biggest communities, biggest first; the rest are drawn in OTHER_COLOUR
+COMMUNITY_COLOURS = list(plt.get_cmap("tab10").colors)
+OTHER_COLOUR = "lightgrey"
+
+def main(args):
+    """
+    Driver function to read the arguments, lay the graph out and draw it.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    graph_filename = args[0] if len(args) > 0 else "data/collocations/2_hashtag_graph.npz"
+    communities_filename = args[1] if len(args) > 1 and args[1] != "-" else None
+    iterations = int(args[2]) if len(args) > 2 else 500
+    threads = int(args[3]) if len(args) > 3 else os.cpu_count()
+    seed = int(args[4]) if len(args) > 4 else 0
+    prefix = os.path.join(os.path.dirname(graph_filename), "2_hashtag_layout_" + graph_suffix(graph_filename))
+
+    start = time.time()
+    graph = disslib.load_graph(graph_filename)
+    print(f"{disslib.nicetime(start, time.time())} | Loaded {len(graph['labels'])} nodes and {len(graph['weights'])} edges from {graph_filename}")
+    positions = make_layout(graph, prefix + ".npz", iterations, threads, seed)
+    print(f"{disslib.nicetime(start, time.time())} | Layout written to {prefix}.npz")
+
+    communities = load_communities(communities_filename, graph["labels"]) if communities_filename else np.zeros(len(graph["labels"]), dtype=np.int64)
+    draw_network(prefix + ".png", positions, graph["appearances"], communities, graph)
+    print(f"{disslib.nicetime(start, time.time())} | Drawn to {prefix}.png")
+
+def make_layout(graph, filename, iterations, threads, seed):
+    """
+    Function to run ForceAtlas2 on a graph from its seed and save the result.
+
+    Args:
+        graph (dict): Graph from disslib.load_graph
+        filename (string): Path of the layout .npz
+        iterations (int): Number of iterations to run
+        threads (int): Threads for the repulsion
+        seed (int): Random seed for a fresh layout
+
+    Returns:
+        np.array: (n, 2) node positions
+    """
+    indptr, indices, data = disslib.graph_adjacency(graph)
+    positions = disslib.forceatlas2_layout(
+        indptr, indices, data.astype(np.float64), iterations=iterations, seed=seed, threads=threads
+    )
+    np.savez(
+        filename,
+        labels=np.frombuffer("\n".join(graph["labels"]).encode("utf-8"), dtype=np.uint8),
+        x=positions[:, 0],
+        y=positions[:, 1]
+    )
+    return positions
+
+def load_layout(filename, labels):
+    """
+    Function to load a saved layout, checking it belongs to the graph.
+
+    Args:
+        filename (string): Path of the layout .npz
+        labels (list): Hashtag of each node of the graph
+
+    Returns:
+        np.array: (n, 2) node positions, or None if the layout is of a different graph
+    """
+    with np.load(filename) as layout_file:
+        layout_labels = layout_file["labels"].tobytes().decode("utf-8")
+        if (layout_labels.split("\n") if layout_labels else []) != list(labels):
+            print(f"{filename} is the layout of a different graph, not using it.")
+            return None
+        return np.stack([layout_file["x"], layout_file["y"]], axis=1)
+
+def load_communities(filename, labels):
+    """
+    Function to get the community of every node from a communities CSV,
+    renumbered so 0 is the biggest community, 1 the next, and so on; nodes missing from it get -1.
+
+    Args:
+        filename (string): Path of the communities CSV, with ID and modularity_class columns
+        labels (list): Hashtag of each node of the graph
+
+    Returns:
+        np.array: Community of each node
+    """
+    data = pd.read_csv(filename, delimiter=" ", quotechar="|", encoding="utf-8", keep_default_na=False)
+    data.columns = [column.lower() for column in data.columns]
+    classes = data["modularity_class"].astype(np.int64)
+    ranks = {community: rank for rank, community in enumerate(classes.value_counts().index.tolist())}
+    lookup = dict(zip(data["id"].astype(str), classes.map(ranks)))
+    return np.array([lookup.get(label, -1) for label in labels], dtype=np.int64)
+
+def draw_network(filename, positions, sizes, communities, graph=None, names=None, zoom=None, label_count=0, max_edges=0, title=None):
+    """
+    Function to draw a laid out graph as gephi exported it: nodes coloured by community and sized by the given values,
+    optionally with the heaviest edges underneath in their source's colour.
+
+    Args:
+        filename (string): Path of the image
+        positions (np.array): (n, 2) node positions
+        sizes (np.array): Value to size each node by, e.g. appearances or toxicity
+        communities (np.array): Community of each node, 0 the biggest, -1 for none
+        graph (dict, optional): Graph from disslib.load_graph, for its edges and labels. Defaults to None.
+        names (list, optional): Name of each of the biggest communities for the legend. Defaults to None (no legend).
+        zoom (float, optional): Draw only the middle this fraction of the layout's width. Defaults to None (all of it).
+        label_count (int, optional): Label this many of the biggest nodes in view. Defaults to 0.
+        max_edges (int, optional): Most edges to draw, heaviest first. Defaults to 0 (none, as in the write-up).
+        title (string, optional): Title of the image. Defaults to None.
+    """
+    colours = np.array([COMMUNITY_COLOURS[community] if 0 <= community < len(COMMUNITY_COLOURS) else matplotlib.colors.to_rgb(OTHER_COLOUR)
+                        for community in communities.tolist()]).reshape(-1, 3)
+    sizes = np.nan_to_num(np.asarray(sizes, dtype=np.float64))
+    spread = sizes.max() - sizes.min() if len(sizes) else 0
+    areas = 10 + 400 * ((sizes - sizes.min()) / spread if spread > 0 else np.zeros(len(sizes)))
+
+    fig, ax = plt.subplots(figsize=(12, 12))
+    if graph is not None and max_edges > 0 and len(graph["weights"]) > 0:
+        heaviest = np.argsort(graph["weights"], kind="stable")[::-1][:max_edges]
+        combos = graph["combos"][heaviest]
+        ax.add_collection(LineCollection(
+            np.stack([positions[combos[:, 0]], positions[combos[:, 1]]], axis=1),
+            colors=colours[combos[:, 0]],
+            linewidths=0.2,
+            alpha=0.15,
+            zorder=1
+        ))
+    # biggest on top
+    order = np.argsort(areas, kind="stable")
+    ax.scatter(positions[order, 0], positions[order, 1], s=areas[order], c=colours[order], alpha=0.7, edgecolors="dimgrey", linewidths=0.3, zorder=2)
+
+    if zoom is not None:
+        centre = np.median(positions, axis=0)
+        half = (positions.max(axis=0) - positions.min(axis=0)).max() * zoom / 2
+        ax.set_xlim(centre[0] - half, centre[0] + half)
+        ax.set_ylim(centre[1] - half, centre[1] + half)
+    else:
+        ax.autoscale_view()
+    if label_count > 0 and graph is not None:
+        (x_low, x_high), (y_low, y_high) = ax.get_xlim(), ax.get_ylim()
+        in_view = np.flatnonzero((positions[:, 0] >= x_low) & (positions[:, 0] <= x_high) & (positions[:, 1] >= y_low) & (positions[:, 1] <= y_high))
+        for node in in_view[np.argsort(sizes[in_view], kind="stable")[::-1][:label_count]].tolist():
+            ax.annotate(graph["labels"][node], positions[node], fontsize=8, ha="center", va="center", zorder=3)
+    if names:
+        ax.legend(handles=[mpatches.Patch(color=COMMUNITY_COLOURS[rank], label=name) for rank, name in enumerate(names[:len(COMMUNITY_COLOURS)])]
+                  + [mpatches.Patch(color=OTHER_COLOUR, label="All other")], loc="lower right")
+    if title:
+        ax.set_title(title)
+    ax.set_aspect("equal")
+    ax.axis("off")
+    fig.savefig(filename, dpi=150, bbox_inches="tight")
+    plt.close(fig)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
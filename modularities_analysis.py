@@ -9,7 +9,6 @@ Returns:
 """
 
 import logging
-import pickle
 import time
 import datetime as dt
 import glob
@@ -39,8 +38,8 @@ def main():
     """
     # open files
     modularity_data = pd.read_csv("data/collocations/2_hashtag_modularities_nodes_1000plus.csv", encoding="utf-8", sep=" ", header=0, names=["ID", "appearances", "modularity"])
-    with open("data/collocations/2_hashtag_tweetIDs.pkl", "rb") as hashtags_ids_pickle:
-        hashtags_tweetids = pickle.load(hashtags_ids_pickle)
+    # memory-mapped postings store, so only the hashtags we ask about are read
+    hashtags_tweetids = disslib.load_postings("data/collocations/2_hashtag_postings")
 
     # convert modularity column to numeric
     modularity_data["modularity_class"] = pd.to_numeric(modularity_data["modularity"])
@@ -57,14 +56,17 @@ def main():
     # using the hashtags in each group, find the tweet IDs that contain those hashtags
     #nodes_999_names = set(modularity_data["ID"])
     nodes_999_names = set(filtered_data["ID"])
-    tweets_to_process = set()
-    for key, tweetids in hashtags_tweetids.items():
-        if key in nodes_999_names:
-            for str_id in tweetids:
-                tweets_to_process.add(np.int64(str_id))
-
-    # get the pkl and json files
-    pkl_files, json_files = disslib.get_tweet_files(dir_path="data/elections2022/", pairs_only=True)
+    tweets_to_process = disslib.postings_union(hashtags_tweetids, nodes_999_names).astype(np.int64)
+
+    # get the json files which have a converted day partition
+    # the text only lives in the json, the botscores only in the converted data
+    _, json_files = disslib.get_tweet_files(dir_path="data/elections2022/", pairs_only=False)
+    partitions = disslib.get_tweet_partitions("data/elections2022/")
+    converted_dates = {disslib.partition_date(partition) for partition in partitions}
+    json_files = [file for file in json_files if disslib.file_date(file) in converted_dates]
+    dataset_path = disslib.tweet_dataset_path("data/elections2022/")
+    # make sure the tweet id index is current before any of the file processing fetches from it
+    disslib.load_tweet_index(dataset_path)
 
     # figure out what is and isn't done already
     # enables on a toggle for demonstration purposes
@@ -102,7 +104,7 @@ def main():
     print(f"{str(os.getpid()).rjust(10)} |          | {disslib.nicetime(start, start)} | Number of tweets to find: {len(tweets_to_process)}")
 
     # main loop logic:
-    #   - comb through all the json files which also have pkl files for each day,
+    #   - comb through all the json files which also have a converted partition for each day,
     #   - collect the tweets in each modularity group,
     #   - run toxicity and sentiment analysis on each collected tweet,
     #   - then append the results of each process into a collation dataframe.
@@ -133,10 +135,10 @@ def main():
 
             # parse arguments into a list of tuples so that our spawned threads can use them
             # i don't know why multiprocessing needs me to do this, it's just how it works
-            for index, json_file in enumerate(json_files):
-                filedate = json_file.split(".")[0].split("-")[1]
+            for json_file in json_files:
+                filedate = disslib.file_date(json_file)
                 if filedate not in done_set:
-                    pkl_file = pkl_files[index]
+                    partition = disslib.tweet_partition_path(dataset_path, filedate)
                     args_tuples.append((
                         tweets_to_process,
                         tox_model,
@@ -146,7 +148,7 @@ def main():
                         tweets_found,
                         start,
                         json_file,
-                        pkl_file,
+                        partition,
                         lock
                         ))
 
@@ -169,7 +171,7 @@ def main():
 
         # main loop
         for json_file in to_process:
-            pkl_file = json_file.split(".")[0]+".pkl.gz"
+            partition = disslib.tweet_partition_path(dataset_path, disslib.file_date(json_file))
             process_files(
                 (tweets_to_process,
                 tox_model,
@@ -179,7 +181,7 @@ def main():
                 tweets_found,
                 start,
                 json_file,
-                pkl_file,
+                partition,
                 lock)
             )
 
@@ -191,7 +193,7 @@ def process_files(arg_tuple):
     Args:
         arg_tuple (tuple): Tuple containing all arguments. Unpacked on first line:
             tweets_to_process: 
-                List of ALL tweet IDs to process.
+                Sorted array of ALL tweet IDs to process.
             tox_model: 
                 ToLD-Br, loaded by disslib.load_toxicity_model()
             sentilex: 
@@ -206,13 +208,13 @@ def process_files(arg_tuple):
                 Start time of outer loop, passed in for printing purposes.
             json_file:
                 Name of the JSON file we're currently working on.
-            pkl_file:
-                Name of the JSON file we're currently working on.
+            partition:
+                Day partition of the converted parquet dataset matching the JSON file.
             inner_lock:
                 The global lock outside, renamed for clarity.
     """
     # unpack arguments and set up variables
-    (tweets_to_process, tox_model, sentilex, br_stopwords, pt_core, tweets_found, start, json_file, pkl_file, inner_lock) = arg_tuple
+    (tweets_to_process, tox_model, sentilex, br_stopwords, pt_core, tweets_found, start, json_file, partition, inner_lock) = arg_tuple
     pid = os.getpid()
     proc_start = time.time()
 
@@ -222,12 +224,25 @@ def process_files(arg_tuple):
 
     # initial prints
     disslib.safe_print(inner_lock, pid, start, proc_start, filedate, f"Now loading JSON file: {json_file}")
-    disslib.safe_print(inner_lock, pid, start, proc_start, filedate, f"Corresponding PKL: {pkl_file}")
-
-    # load and filter JSON file
-    raw_twts = disslib.load_tweets_json(json_file)
-    raw_twts["id_str"] = pd.to_numeric(raw_twts["id_str"])
-    filtered_json_twts = raw_twts[raw_twts["id_str"].isin(tweets_to_process)].copy()
+    disslib.safe_print(inner_lock, pid, start, proc_start, filedate, f"Corresponding partition: {partition}")
+
+    # only process tweets which the conversion kept for this day,
+    # so a tweet captured in two day files doesn't go through the toxicity model twice
+    day_ids = disslib.load_seen_id_run(
+        disslib.seen_ids_path(os.path.dirname(os.path.normpath(partition))),
+        disslib.seen_id_run_name(json_file)
+    )
+
+    # stream and filter JSON file batch by batch
+    # only the hits are kept, so we never hold the whole day in memory
+    hit_batches = []
+    for raw_twts in disslib.stream_tweets_json(json_file):
+        raw_twts["id_str"] = pd.to_numeric(raw_twts["id_str"])
+        raw_twts = raw_twts[raw_twts["id_str"].isin(tweets_to_process)]
+        if len(day_ids) > 0:
+            raw_twts = raw_twts[np.isin(raw_twts["id_str"].to_numpy(dtype=np.uint64), day_ids)]
+        hit_batches.append(raw_twts)
+    filtered_json_twts = pd.concat(hit_batches, ignore_index=True) if hit_batches else pd.DataFrame()
 
     # timestamp for finishing loading and filtering the JSON file
     data_filtered = time.time()
@@ -260,32 +275,32 @@ def process_files(arg_tuple):
         # calculate all toxicities
         filtered_json_twts["toxicity"] = run_tox_model(texts_to_process, tox_model, inner_lock, start, filedate)
         tox_done = time.time()
-        disslib.safe_print(inner_lock, pid, start, tox_done, filedate, "Toxicity analysis complete; now loading and constructing PKL file to dataframe")
+        disslib.safe_print(inner_lock, pid, start, tox_done, filedate, "Toxicity analysis complete; now loading converted data to dataframe")
 
         # drop text column so it doesn't end up in the final data
         # otherwise those files would be enormous
         filtered_json_twts.drop(["text"], axis=1)
 
-        # now load the PKL data so we can steal the botscores
-        pkl_data = disslib.load_tweets_pkl(pkl_file)
-        pkl_data["id_str"] = pd.to_numeric(pkl_data["id_str"])
-
-        # cut down the PKL to just what we want
-        pkl_data = pkl_data[["id_str", "timestamp_ms", "quoted_status.id_str", "hashtags", "botscore"]]
-
-        # add the columns we're going to add
-        pkl_data = pkl_data.reindex(columns=["id_str", "timestamp_ms", "quoted_status.id_str", "hashtags", "botscore", "sentiment", "toxicity"])
+        # now fetch the converted data for just these tweets so we can steal the botscores
+        # the tweet index points straight at their rows, so only the row groups holding them get read
+        converted_data = disslib.fetch_tweets(
+            os.path.dirname(os.path.normpath(partition)),
+            filtered_json_twts["id_str"],
+            columns=["id_str", "timestamp_ms", "quoted_status.id_str", "hashtags", "botscore"]
+        )
+        converted_data["id_str"] = pd.to_numeric(converted_data["id_str"])
 
-        # filter the pkl data to only tweets we have data for
-        filtered_pkl_data = pkl_data[pkl_data["id_str"].isin(tweets_to_process)].copy()
+        # filter the converted data to only tweets we have data for
+        filtered_converted_data = converted_data[converted_data["id_str"].isin(tweets_to_process)].copy()
 
         # copy over the sentiment and toxicity columns we just calculated
-        # order is preserved so no worries there
-        filtered_pkl_data["sentiment"] = filtered_json_twts["sentiment"]
-        filtered_pkl_data["toxicity"] = filtered_json_twts["toxicity"]
+        # the converted data is sorted by id, so match the rows up by id rather than by order
+        filtered_converted_data = filtered_converted_data.merge(
+            filtered_json_twts[["id_str", "sentiment", "toxicity"]], on="id_str", how="left"
+        )
 
         # write out the final file
-        filtered_pkl_data.to_csv(filename, sep=" ", encoding="utf-8", index=False)
+        filtered_converted_data.to_csv(filename, sep=" ", encoding="utf-8", index=False)
         written_out = time.time()
         disslib.safe_print(inner_lock, pid, start, written_out, filedate, f"CSV file {filename} written out from constructed dataframe")
 
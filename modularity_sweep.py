@@ -0,0 +1,157 @@
+"""
+Script to run community detection over many resolutions and seeds at once, spread over the cores,
+to check the communities used in the analysis aren't an accident of one gephi run at one resolution.
+Reports how many communities each run finds, its modularity, how stable the partitions are between seeds (NMI),
+and how well the biggest communities of a reference run survive in every other run.
+
+Usage:
+    python modularity_sweep.py [binary graph] [resolutions, comma separated] [number of seeds] [leiden|louvain] [workers]
+    e.g. python modularity_sweep.py data/collocations/2_hashtag_graph_1000plus.npz 0.5,0.75,1,1.25,1.5 10 leiden 8
+
+    The reference run is the best scoring seed at the resolution nearest 1.
+
+Returns:
+    data/collocations/2_hashtag_sweep_[graph suffix].npz
+        Every partition, see disslib.load_partitions.
+    data/collocations/2_hashtag_sweep_[graph suffix].csv
+        One row per run: communities, modularity, mean NMI to the other seeds at its resolution, NMI to the reference run,
+        and for each of the reference run's biggest communities the best matching community and its Jaccard.
+    data/collocations/2_hashtag_sweep_[graph suffix]_stability.csv
+        One row per resolution: mean communities and modularity, mean and lowest NMI between its seeds.
+"""
+import os
+import sys
+import csv
+import time
+import itertools
+from multiprocessing import Pool
+import numpy as np
+import disslib
+from communities import graph_suffix
+
+# how many of the reference run's biggest communities to follow through the sweep
+TRACKED_COMMUNITIES = 4
+
+# adjacency of the graph, loaded once in each worker
+SWEEP_GRAPH = None
+
+def main(args):
+    """
+    Driver function to read the arguments, run the sweep and write the partitions and reports out.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    graph_filename = args[0] if len(args) > 0 else "data/collocations/2_hashtag_graph.npz"
+    resolutions = [float(resolution) for resolution in args[1].split(",")] if len(args) > 1 else [0.5, 0.75, 1.0, 1.25, 1.5, 2.0]
+    num_seeds = int(args[2]) if len(args) > 2 else 5
+    method = args[3] if len(args) > 3 else "leiden"
+    workers = int(args[4]) if len(args) > 4 else os.cpu_count()
+    if method not in ("leiden", "louvain"):
+        print(__doc__)
+        sys.exit(1)
+    prefix = os.path.join(os.path.dirname(graph_filename), "2_hashtag_sweep_" + graph_suffix(graph_filename))
+
+    start = time.time()
+    labels = disslib.load_graph(graph_filename)["labels"]
+    runs = [(resolution, seed) for resolution in resolutions for seed in range(num_seeds)]
+    print(f"{disslib.nicetime(start, time.time())} | Running {len(runs)} {method} runs on {len(labels)} nodes with {workers} workers")
+    with Pool(workers, initializer=load_sweep_graph, initargs=(graph_filename,)) as pool:
+        results = pool.map(sweep_run, [(method, resolution, seed) for resolution, seed in runs])
+    partitions = np.stack([communities for communities, _ in results]) if results else np.zeros((0, len(labels)), dtype=np.int64)
+    modularities = np.array([modularity for _, modularity in results])
+    print(f"{disslib.nicetime(start, time.time())} | Runs done")
+
+    disslib.write_partitions(
+        prefix + ".npz",
+        labels,
+        partitions,
+        [resolution for resolution, _ in runs],
+        [seed for _, seed in runs],
+        modularities
+    )
+
+    # reference: best seed at the resolution nearest 1
+    nearest = min(resolutions, key=lambda resolution: abs(resolution - 1.0))
+    reference_run = max((run for run, (resolution, _) in enumerate(runs) if resolution == nearest), key=lambda run: modularities[run])
+    reference = partitions[reference_run]
+    tracked = list(range(min(TRACKED_COMMUNITIES, int(reference.max()) + 1)))
+    print(f"{disslib.nicetime(start, time.time())} | Reference run: resolution {nearest}, seed {runs[reference_run][1]}, modularity {modularities[reference_run]:.6f}")
+
+    # stability between the seeds of each resolution
+    seed_nmis = {run: [] for run in range(len(runs))}
+    stability = []
+    for resolution in resolutions:
+        resolution_runs = [run for run, (run_resolution, _) in enumerate(runs) if run_resolution == resolution]
+        pair_nmis = []
+        for first, second in itertools.combinations(resolution_runs, 2):
+            nmi = disslib.partition_nmi(partitions[first], partitions[second])
+            seed_nmis[first].append(nmi)
+            seed_nmis[second].append(nmi)
+            pair_nmis.append(nmi)
+        stability.append([
+            resolution,
+            len(resolution_runs),
+            round(float(np.mean([int(partitions[run].max()) + 1 for run in resolution_runs])), 2),
+            round(float(np.mean(modularities[resolution_runs])), 6),
+            round(float(np.mean(pair_nmis)), 6) if pair_nmis else 1.0,
+            round(float(np.min(pair_nmis)), 6) if pair_nmis else 1.0
+        ])
+        print(f"Resolution {resolution}: {stability[-1][2]} communities, modularity {stability[-1][3]}, NMI between seeds {stability[-1][4]} (lowest {stability[-1][5]})")
+
+    with open(prefix + ".csv", "w+", encoding="utf-8") as runs_handle:
+        runs_writer = csv.writer(runs_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        runs_writer.writerow(
+            ["Resolution", "Seed", "Communities", "Modularity", "SeedNMI", "ReferenceNMI"]
+            + [column for community in tracked for column in (f"Match{community}", f"Jaccard{community}")]
+        )
+        for run, (resolution, seed) in enumerate(runs):
+            matches = disslib.best_matches(reference, partitions[run], tracked)
+            runs_writer.writerow(
+                [
+                    resolution,
+                    seed,
+                    int(partitions[run].max()) + 1,
+                    round(float(modularities[run]), 6),
+                    round(float(np.mean(seed_nmis[run])), 6) if seed_nmis[run] else 1.0,
+                    round(disslib.partition_nmi(reference, partitions[run]), 6)
+                ]
+                + [value for match, jaccard in matches for value in (match, round(jaccard, 6))]
+            )
+
+    with open(prefix + "_stability.csv", "w+", encoding="utf-8") as stability_handle:
+        stability_writer = csv.writer(stability_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        stability_writer.writerow(["Resolution", "Runs", "Communities", "Modularity", "MeanNMI", "MinNMI"])
+        stability_writer.writerows(stability)
+    print(f"{disslib.nicetime(start, time.time())} | Written to {prefix}.npz, {prefix}.csv and {prefix}_stability.csv")
+
+def load_sweep_graph(graph_filename):
+    """
+    Pool initialiser to load the graph's adjacency once per worker rather than once per run.
+
+    Args:
+        graph_filename (string): Path of the binary graph
+    """
+    global SWEEP_GRAPH
+    indptr, indices, data = disslib.graph_adjacency(disslib.load_graph(graph_filename))
+    SWEEP_GRAPH = (indptr, indices, data.astype(np.float64))
+
+def sweep_run(arg_tuple):
+    """
+    Pool worker to find the communities at one resolution and seed.
+
+    Args:
+        arg_tuple (tuple): (method, resolution, seed)
+
+    Returns:
+        np.array: Community of each node, numbered by size
+        float: Modularity of the partition
+    """
+    (method, resolution, seed) = arg_tuple
+    communities, modularity, _ = disslib.detect_communities(
+        *SWEEP_GRAPH, method=method, resolution=resolution, seed=seed, verbose=False
+    )
+    return communities.astype(np.int32), modularity
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
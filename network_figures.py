@@ -0,0 +1,87 @@
+"""
+Script to regenerate every network figure in the write-up in one go, rather than by hand in gephi.
+Lays the graph out once with layout.py's ForceAtlas2 (or reuses the saved layout of the same graph),
+then draws each figure from it, so every figure shares the one layout and colouring, and the same seed
+always gives the same images.
+
+Usage:
+    python network_figures.py [binary graph] [communities csv] [hashtag scores csv] [output folder] [iterations] [threads] [seed]
+    e.g. python network_figures.py data/collocations/2_hashtag_graph_1000plus.npz data/collocations/2_hashtag_modularities_nodes_1000plus.csv
+
+    Defaults to the _1000plus graph and communities, data/FINAL/2_H_STBM_HASHTAGS.csv for the toxicity and botscore
+    of each hashtag, and data/figures for the images. The write-up's own images in writing/images are only replaced
+    when that folder is given explicitly.
+
+Returns:
+    [output folder]/net_mod_app.png
+        Whole network, coloured by community, sized by appearances.
+    [output folder]/net_mod_app_detail.png
+        Middle of net_mod_app, with the biggest hashtags labelled.
+    [output folder]/net_mod_tox.png
+        Whole network, coloured by community, sized by average toxicity.
+    [output folder]/net_mod_bot.png
+        Whole network, coloured by community, sized by average botscore.
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import disslib
+from communities import graph_suffix
+import layout
+
+# (image name, column to size nodes by, zoom, number of labels)
+FIGURES = [
+    ("net_mod_app", "appearances", None, 0),
+    ("net_mod_app_detail", "appearances", 0.2, 40),
+    ("net_mod_tox", "toxicity", None, 0),
+    ("net_mod_bot", "botscore", None, 0),
+]
+
+def main(args):
+    """
+    Driver function to read the arguments, get the layout and draw every figure.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    graph_filename = args[0] if len(args) > 0 else "data/collocations/2_hashtag_graph_1000plus.npz"
+    communities_filename = args[1] if len(args) > 1 else "data/collocations/2_hashtag_modularities_nodes_1000plus.csv"
+    scores_filename = args[2] if len(args) > 2 else "data/FINAL/2_H_STBM_HASHTAGS.csv"
+    output_folder = args[3] if len(args) > 3 else "data/figures"
+    iterations = int(args[4]) if len(args) > 4 else 1000
+    threads = int(args[5]) if len(args) > 5 else os.cpu_count()
+    seed = int(args[6]) if len(args) > 6 else 0
+    layout_filename = os.path.join(os.path.dirname(graph_filename), "2_hashtag_layout_" + graph_suffix(graph_filename) + ".npz")
+
+    start = time.time()
+    graph = disslib.load_graph(graph_filename)
+    print(f"{disslib.nicetime(start, time.time())} | Loaded {len(graph['labels'])} nodes and {len(graph['weights'])} edges from {graph_filename}")
+    positions = layout.load_layout(layout_filename, graph["labels"]) if os.path.exists(layout_filename) else None
+    if positions is None:
+        print(f"{disslib.nicetime(start, time.time())} | Laying out, {iterations} iterations on {threads} threads")
+        positions = layout.make_layout(graph, layout_filename, iterations, threads, seed)
+    print(f"{disslib.nicetime(start, time.time())} | Layout from {layout_filename}")
+
+    communities = layout.load_communities(communities_filename, graph["labels"])
+    columns = {"appearances": graph["appearances"]}
+    if os.path.exists(scores_filename):
+        scores = pd.read_csv(scores_filename, delimiter=";", encoding="utf-8", keep_default_na=False, na_values=[""])
+        scores.columns = [column.lower() for column in scores.columns]
+        scores = scores.set_index(scores["id"].astype(str))
+        for column in ("toxicity", "botscore"):
+            columns[column] = pd.to_numeric(scores[column], errors="coerce").reindex(graph["labels"]).to_numpy()
+    else:
+        print(f"No hashtag scores in {scores_filename}, skipping the toxicity and botscore figures.")
+
+    os.makedirs(output_folder, exist_ok=True)
+    for name, column, zoom, label_count in FIGURES:
+        if column not in columns:
+            continue
+        filename = os.path.join(output_folder, name + ".png")
+        layout.draw_network(filename, positions, columns[column], communities, graph, zoom=zoom, label_count=label_count)
+        print(f"{disslib.nicetime(start, time.time())} | Drawn {filename}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
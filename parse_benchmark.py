@@ -0,0 +1,133 @@
+"""
+Benchmark for tweet parsing, comparing the old per-tweet dictionary parsers to the compiled extractors.
+Checks the two produce the same columns and values before reporting any timings.
+
+Usage:
+    python parse_benchmark.py data/elections2022/elections2022_tweets-20220806.json.gz [max tweets]
+
+Returns:
+    Terminal output of tweets/second before and after, for both the converter and disslib.
+"""
+import sys
+import json
+import gzip
+import time
+import pandas as pd
+import disslib
+import ConvertTweetJsonToParquet as converter
+
+def main(args):
+    """
+    Driver function to load the tweets, check the parsers agree, and time them.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    filename = args[0]
+    max_tweets = int(args[1]) if len(args) > 1 else None
+
+    # decode the JSON up front so we only time the parsing
+    print(f"Decoding tweets from {filename}...")
+    tweets = []
+    with gzip.GzipFile(filename) as tw_file:
+        for line in tw_file:
+            tweets.append(json.loads(line.decode('utf-8')))
+            if max_tweets is not None and len(tweets) >= max_tweets:
+                break
+    print(f"Decoded {len(tweets)} tweets.")
+
+    # converter: parseTweet + json_normalize versus parseTweetRow + tweetsFrame
+    before, before_time = timed(lambda: pd.json_normalize([converter.parseTweet(tw) for tw in tweets]))
+    after, after_time = timed(lambda: converter.tweetsFrame([converter.parseTweetRow(tw) for tw in tweets]))
+    check_frames("converter", before, after)
+    report("converter", len(tweets), before_time, after_time)
+
+    # disslib: safeget dictionary comprehension versus the compiled extractor
+    before, before_time = timed(lambda: pd.json_normalize([legacy_parse_tweet(tw) for tw in tweets]))
+    after, after_time = timed(lambda: pd.DataFrame.from_records([disslib.TWEET_EXTRACTOR(tw) for tw in tweets], columns=disslib.TWEET_COLUMNS))
+    check_frames("disslib", before, after)
+    report("disslib", len(tweets), before_time, after_time)
+
+def legacy_parse_tweet(tw):
+    """
+    The old disslib.parse_tweet body, one safeget call per key path.
+
+    Args:
+        tw (dict): Dictionary of tweet data
+
+    Returns:
+        dict: Requested data
+    """
+    return {'.'.join(k): disslib.safeget(tw, k) for k in disslib.TWEET_FIELDS}
+
+def timed(function):
+    """
+    Helper function to time a single call.
+
+    Args:
+        function (function): Function to call with no arguments
+
+    Returns:
+        any: Whatever the function returned
+        float: Seconds taken
+    """
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def check_frames(name, before, after):
+    """
+    Function to check the old and new parsers agree, exiting if they don't.
+    List columns are compared sorted, as both parsers dedupe them through a set.
+
+    Args:
+        name (string): Name of the parser pair for printing
+        before (pd.df): Dataframe from the old parser
+        after (pd.df): Dataframe from the new parser
+    """
+    if set(before.columns) != set(after.columns):
+        print(f"{name}: column mismatch")
+        print(f"  only before: {set(before.columns) - set(after.columns)}")
+        print(f"  only after:  {set(after.columns) - set(before.columns)}")
+        sys.exit(1)
+    for column in before.columns:
+        old_values = [normalise_value(value) for value in before[column]]
+        new_values = [normalise_value(value) for value in after[column]]
+        if old_values != new_values:
+            print(f"{name}: values differ in column {column}")
+            sys.exit(1)
+    print(f"{name}: {len(after.columns)} columns match.")
+
+def normalise_value(value):
+    """
+    Helper function to make a cell comparable between the two parsers.
+
+    Args:
+        value (any): Cell value
+
+    Returns:
+        any: Sorted list for lists, None for missing values, otherwise the value
+    """
+    if isinstance(value, list):
+        try:
+            return sorted(value)
+        except TypeError:
+            return value
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+def report(name, num_tweets, before_time, after_time):
+    """
+    Helper function to print the tweets/second of both parsers.
+
+    Args:
+        name (string): Name of the parser pair for printing
+        num_tweets (int): Number of tweets parsed
+        before_time (float): Seconds taken by the old parser
+        after_time (float): Seconds taken by the new parser
+    """
+    print(f"{name}: before {num_tweets / before_time:,.0f} tweets/s, after {num_tweets / after_time:,.0f} tweets/s ({before_time / after_time:.2f}x)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -11,12 +11,14 @@ def main():
     day_combiner()
 
 def day_combiner():
-    all_filenames = glob.glob(os.path.join("data/POSTGRAD/with_retweets/", '*.pkl.tar.gz'))
+    all_filenames = glob.glob(os.path.join("data/POSTGRAD/with_retweets/", 'rtws*.pkl.tar.gz'))
+    # a day written whole before it was split into parts is read from that file only
+    all_filenames = [x for x in all_filenames if "-" not in os.path.basename(x) or legacy_filename(part_date(x)) not in all_filenames]
     main_df = pd.read_pickle(all_filenames.pop())
     for filename in all_filenames:
         main_df = pd.concat([main_df, pd.read_pickle(filename)], ignore_index=True)
     
-    main_df.to_pickle("data/POSTGRAD/with_retweets/with_retweets.pkl.tar.gz", index=False)
+    main_df.to_pickle("data/POSTGRAD/with_retweets/with_retweets.pkl.tar.gz")
 
 def day_by_day():
     with open("data/2_hashtag_stbm/2_H_STBM_TWEETS.csv", "r", encoding="utf-8") as mod_handle:
@@ -30,37 +32,62 @@ def day_by_day():
 
     all_filenames = glob.glob(os.path.join("data/elections2022/elections22/", '*.json.gz'))
     done_filenames = [str(x) for x in glob.glob(os.path.join("data/POSTGRAD/with_retweets/", '*.pkl.tar.gz'))]
+    # looked up by tweet id, as each batch's own index restarts at 0
+    tweet_scores = all_tweets.drop_duplicates(subset="id_str").set_index("id_str")
 
     random.shuffle(all_filenames)
     for filename in all_filenames:
         filedate = filename.split(".")[0].split("-")[1]
-        out_filename = "data/POSTGRAD/with_retweets/rtws" + filedate + ".pkl.tar.gz"
+        # a day is written in one part per batch, part 0 renamed in last so it marks the day as finished
+        out_filename = "data/POSTGRAD/with_retweets/rtws" + filedate + "-0.pkl.tar.gz"
         #print(out_filename)
         #print(done_filenames)
         if out_filename in done_filenames:
             print("Skipping finished file", out_filename)
             continue
+        elif legacy_filename(filedate) in done_filenames:
+            # finished whole, before days were split into parts
+            print("Skipping finished file", legacy_filename(filedate))
+            continue
         else:
             print("Loading file", filename)
-            current_file = disslib.load_tweets_json(filename)
-            current_file["id_str"] = pd.to_numeric(current_file["id_str"])
-            #print(current_file)
-            print("Handling retweets...")
-            day_rtws = handle_retweets(current_file, all_tweets)
-            current_file.dropna(subset="retweeted_status.id_str")
-            current_file = pd.concat([current_file, day_rtws])
-            del day_rtws
-            #print(current_file)
-            print("Merging dataframes...")
-            current_file.update(all_tweets)
+            print("Handling retweets and merging dataframes...")
+            # stream the day in batches, each written out as soon as it's done so only one is ever in memory
+            part_filenames = []
+            for current_batch in disslib.stream_tweets_json(filename):
+                current_batch["id_str"] = pd.to_numeric(current_batch["id_str"])
+                #print(current_batch)
+                day_rtws = handle_retweets(current_batch, all_tweets)
+                current_batch.dropna(subset="retweeted_status.id_str")
+                current_batch = pd.concat([current_batch, day_rtws], ignore_index=True)
+                del day_rtws
+                #print(current_batch)
+                current_batch = current_batch.set_index("id_str")
+                current_batch.update(tweet_scores)
+                part_filenames.append(write_part(current_batch.reset_index(), filedate, len(part_filenames)))
+                del current_batch
+            if not part_filenames:
+                # empty day, still marked as finished
+                part_filenames.append(write_part(pd.DataFrame(columns=all_tweets.columns), filedate, 0))
             #updated_tweets = pd.merge(all_tweets, current_file, how="left", on=["id_str"])
-            #print(current_file)
-            #print("^ New dataframe")
-            current_file.to_pickle(out_filename)
-            del current_file
-            print("Wrote to file")
+            for part_filename in part_filenames[::-1]:
+                os.replace(part_filename, part_filename.replace("/.rtws", "/rtws"))
+            print("Wrote to file in", len(part_filenames), "parts")
     print("Done")
 
+def legacy_filename(filedate):
+    return os.path.join("data/POSTGRAD/with_retweets/", "rtws" + filedate + ".pkl.tar.gz")
+
+def part_date(part_filename):
+    # rtws20221001-3.pkl.tar.gz -> 20221001
+    return os.path.basename(part_filename)[len("rtws"):].split("-")[0]
+
+def write_part(tweets, filedate, part):
+    # hidden until the whole day is written
+    part_filename = "data/POSTGRAD/with_retweets/.rtws" + filedate + "-" + str(part) + ".pkl.tar.gz"
+    tweets.to_pickle(part_filename)
+    return part_filename
+
 def handle_retweets(file_frame, all_tweets):
     file_frame["toxicity"] = np.nan
     file_frame["botscore"] = np.nan
@@ -0,0 +1,133 @@
+"""
+Script to follow the hashtag communities through the campaign, rather than finding them once over all of it.
+Runs community detection on successive day windows of the collocation graph, summed from the collocation checkpoint
+written by collocations.py, so no tweet data is read again. Each window starts from the previous window's partition,
+so only what changed between them has to be moved, and its communities are matched to the previous window's
+to follow them through births, deaths, merges and splits.
+
+Usage:
+    python temporal_communities.py [window days] [step days] [min appearances] [leiden|louvain] [seed] [resolution]
+    e.g. python temporal_communities.py 7 1 10 leiden 42
+
+    Windows and steps count the days in the checkpoint. Hashtags appearing fewer than [min appearances] times
+    in a window are left out of it.
+
+Returns:
+    data/collocations/2_hashtag_temporal_[window]d[step]s_windows.csv
+        One row per window: its days, nodes, edges, communities, tracked communities, modularity and time taken.
+    data/collocations/2_hashtag_temporal_[window]d[step]s_events.csv
+        One row per birth, death, merge or split: the window, the track, its size, and the tracks it merged from or split into.
+    data/collocations/2_hashtag_temporal_[window]d[step]s.npz
+        The track of every hashtag in every window, -1 where it's absent or its community too small to track.
+"""
+import os
+import sys
+import csv
+import time
+import numpy as np
+import disslib
+
+# Jaccard needed for two communities in successive windows to count as the same one
+MATCH_THRESHOLD = 0.3
+# communities with fewer hashtags than this aren't tracked
+MIN_TRACKED_SIZE = 5
+
+def main(args):
+    """
+    Driver function to read the arguments, run every window and write the tracks and events out.
+
+    Args:
+        args (list): List of given arguments from the command line.
+    """
+    window_days = int(args[0]) if len(args) > 0 else 7
+    step_days = int(args[1]) if len(args) > 1 else 1
+    min_appearances = int(args[2]) if len(args) > 2 else 1
+    method = args[3] if len(args) > 3 else "leiden"
+    seed = int(args[4]) if len(args) > 4 else 0
+    resolution = float(args[5]) if len(args) > 5 else 1.0
+    if method not in ("leiden", "louvain") or window_days < 1 or step_days < 1:
+        print(__doc__)
+        sys.exit(1)
+    prefix = "data/collocations/2_hashtag_temporal_" + str(window_days) + "d" + str(step_days) + "s"
+
+    start = time.time()
+    checkpoint = disslib.load_collocation_checkpoint("data/collocations/2_hashtag_checkpoint", 2)
+    days = sorted(checkpoint["days"])
+    if len(days) == 0:
+        print("No collocation checkpoint found in data/collocations/2_hashtag_checkpoint, run collocations.py first.")
+        sys.exit(1)
+    num_labels = len(checkpoint["labels"])
+    # every day is read once, counts only
+    slices = {date: disslib.load_checkpoint_day(checkpoint, date, names=["combos", "weights"]) for date in days}
+    windows = [days[first:first + window_days] for first in range(0, max(len(days) - window_days, 0) + 1, step_days)]
+    print(f"{disslib.nicetime(start, time.time())} | Loaded {len(days)} days, running {len(windows)} windows of {window_days} days")
+
+    summary = []
+    events = []
+    tracks = np.full((len(windows), num_labels), -1, dtype=np.int32)
+    previous_nodes = np.empty(0, dtype=np.int64)
+    previous_communities = np.empty(0, dtype=np.int64)
+    previous_tracks = np.empty(0, dtype=np.int64)
+    next_track = 0
+    for i, window in enumerate(windows):
+        window_start = time.time()
+        nodes, _, indptr, indices, data = disslib.window_adjacency([slices[date] for date in window], num_labels, min_appearances)
+        initial = warm_start(previous_nodes, previous_communities, nodes)
+        communities, modularity, levels = disslib.detect_communities(
+            indptr, indices, data, method=method, resolution=resolution, seed=seed, initial=initial, verbose=False
+        )
+        node_tracks, window_events, next_track = disslib.match_communities(
+            previous_nodes, previous_tracks, nodes, communities, next_track, MATCH_THRESHOLD, MIN_TRACKED_SIZE
+        )
+        tracks[i, nodes] = node_tracks
+        events += [[i, window[0], window[-1], event, track, size, ";".join(str(related) for related in related_tracks)]
+                   for event, track, size, related_tracks in window_events]
+        num_communities = int(communities.max()) + 1 if len(communities) else 0
+        summary.append([
+            i, window[0], window[-1], len(nodes), len(indices) // 2, num_communities,
+            len(np.unique(node_tracks[node_tracks >= 0])), round(modularity, 6), len(levels), round(time.time() - window_start, 3)
+        ])
+        print(f"{str(i).rjust(len(str(len(windows))))}/{len(windows)} | {disslib.nicetime(start, time.time())} | {window[0]}-{window[-1]}: "
+              f"{len(nodes)} nodes, {num_communities} communities, modularity {modularity:.6f}, {len(window_events)} events in {summary[-1][-1]:.2f}s")
+        previous_nodes, previous_communities, previous_tracks = nodes, communities, node_tracks
+
+    with open(prefix + "_windows.csv", "w+", encoding="utf-8") as windows_handle:
+        windows_writer = csv.writer(windows_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        windows_writer.writerow(["Window", "First", "Last", "Nodes", "Edges", "Communities", "Tracked", "Modularity", "Levels", "Seconds"])
+        windows_writer.writerows(summary)
+    with open(prefix + "_events.csv", "w+", encoding="utf-8") as events_handle:
+        events_writer = csv.writer(events_handle, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        events_writer.writerow(["Window", "First", "Last", "Event", "Track", "Size", "Related"])
+        events_writer.writerows(events)
+    tmp_filename = os.path.join(os.path.dirname(prefix), "." + os.path.basename(prefix) + ".tmp.npz")
+    np.savez_compressed(
+        tmp_filename,
+        labels=np.frombuffer("\n".join(checkpoint["labels"]).encode("utf-8"), dtype=np.uint8),
+        firsts=np.array([window[0] for window in windows]),
+        lasts=np.array([window[-1] for window in windows]),
+        tracks=tracks
+    )
+    os.replace(tmp_filename, prefix + ".npz")
+    print(f"{disslib.nicetime(start, time.time())} | {len(events)} events over {next_track} tracks, written to {prefix}_windows.csv, {prefix}_events.csv and {prefix}.npz")
+
+def warm_start(previous_nodes, previous_communities, nodes):
+    """
+    Function to get a window's starting partition from the previous window's:
+    hashtags in both keep their previous community, new ones start on their own.
+
+    Args:
+        previous_nodes (np.array): Global ids of the previous window's nodes, ascending
+        previous_communities (np.array): Community of each previous node
+        nodes (np.array): Global ids of this window's nodes, ascending
+
+    Returns:
+        np.array: Starting community of each node
+    """
+    num_previous = int(previous_communities.max()) + 1 if len(previous_communities) else 0
+    initial = np.arange(num_previous, num_previous + len(nodes))
+    _, previous_positions, positions = np.intersect1d(previous_nodes, nodes, assume_unique=True, return_indices=True)
+    initial[positions] = previous_communities[previous_positions]
+    return initial
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,669 @@
+"""
+Library for reading and writing tweets: the streaming JSON reader, the parquet dataset, the seen id set and the tweet id index.
+Kept apart from disslib, and needing only numpy, pandas and pyarrow, so ConvertTweetJsonToParquet.py runs without
+the NLP models disslib loads; disslib imports everything here, so disslib.<name> still works everywhere else.
+"""
+import json
+import gzip
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# how many tweets the streaming JSON reader parses before handing back a dataframe
+TWEET_BATCH_SIZE = 50000
+
+# key paths pulled out of every tweet by parse_tweet and the streaming reader
+# compiled once into TWEET_EXTRACTOR below, rather than walked with safeget per tweet
+TWEET_FIELDS = (
+    ('id_str',), 
+    ('user','id_str'),
+    ('user','screen_name'),
+    ('user','followers_count'),
+    #('timestamp_ms',),
+    ('entities','hashtags'),
+    ('entities','urls'),
+    ('entities','user_mentions'),
+    ('in_reply_to_status_id_str',),
+    ('in_reply_to_user_id_str',),
+    ('retweeted_status','id_str'),
+    ('retweeted_status','user','id_str'),
+    #('retweeted_status','entities','hashtags'),
+    #('retweeted_status','entities','urls'),
+    #('retweeted_status','entities','user_mentions'),
+    ('quoted_status','id_str'),
+    ('quoted_status','user','id_str'),
+    #('quoted_status','entities','hashtags'),
+    #('quoted_status','entities','urls'),
+    #('quoted_status','entities','user_mentions'),
+    #('coordinates',),
+    #('place',),
+    ## extended fields
+    #('truncated',),
+    #('extended_tweet','entities','hashtags'),
+    #('extended_tweet','entities','urls'),
+    #('extended_tweet','entities','user_mentions'),
+
+    #('retweeted_status','truncated'),
+    #('retweeted_status','extended_tweet','entities','hashtags'),
+    #('retweeted_status','extended_tweet','entities','urls'),
+    #('retweeted_status','extended_tweet','entities','user_mentions'),
+    
+    #('quoted_status','truncated'),
+    #('quoted_status','extended_tweet','entities','hashtags'),
+    #('quoted_status','extended_tweet','entities','urls'),
+    #('quoted_status','extended_tweet','entities','user_mentions'),
+)
+TWEET_COLUMNS = tuple('.'.join(k) for k in TWEET_FIELDS)
+
+# converted tweets live in a parquet dataset inside each data directory, one partition per day
+TWEET_DATASET = "parquet"
+# global set of tweet ids already ingested, one sorted uint64 run per input file
+# kept inside the dataset; the leading underscore keeps parquet readers away from it
+SEEN_IDS = "_seen_ids"
+# sorted tweet id -> (part file, row) index over the whole dataset, for fetching a few tweets by id
+TWEET_INDEX = "_tweet_index"
+# rows per parquet row group; partitions are sorted by id_str so each group covers a narrow id/time range
+TWEET_ROW_GROUP_SIZE = 50000
+
+def nicetime(start_time, end_time):
+    """
+    Function to return a nicely justified time from 2 timestamps, converted to HH:MM:SS.
+
+    Args:
+        start_time (timestamp): Start time
+        end_time (timestamp): End time
+        (you can work these out, I believe in you)
+
+    Returns:
+        string: nicely written time
+    """
+    time_diff = int(end_time-start_time)
+    if time_diff > 3600:
+        # hours
+        hours   = str(time_diff // 3600)
+        minutes = str((time_diff - (int(hours) * 3600)) // 60)
+        seconds = str(time_diff % 60)
+    elif time_diff > 60:
+        # minutes
+        hours   = "00"
+        minutes = str(time_diff // 60)
+        seconds = str(time_diff % 60)
+    else:
+        # seconds
+        hours   = "00"
+        minutes = "00"
+        seconds = str(time_diff)
+
+    # handle edge cases
+    if int(hours) < 10 and hours != "00":
+        hours = "0"+hours
+    if int(minutes) < 10 and minutes != "00":
+        minutes = "0"+minutes
+    if int(seconds) < 10:
+        seconds = "0"+seconds
+
+    return (hours+":"+minutes+":"+seconds).rjust(9)
+
+def safeget(dct, keys):
+    """
+    Function to safely get a value from a dictionary, guarding against misses
+
+    Args:
+        dct (dict): Dictionary to lookup
+        keys (any): Key to find in dictionary
+
+    Returns:
+        any: the value you were trying to find, if it exists
+    """
+    # AUTHOR: Diogo Pacheco
+    for key in keys:
+        try:
+            dct = dct[key]
+        except KeyError:
+            return None
+    return dct
+
+def compile_extractor(paths):
+    """
+    Function to compile a set of key paths into one specialised extractor function.
+    The generated function does the same lookups as calling safeget on each path,
+    but with the keys inlined, so there's no per-key loop or dictionary to build.
+
+    Args:
+        paths (tuple): Tuple of key tuples, e.g. (('id_str',), ('user','id_str'))
+
+    Returns:
+        function: Takes a tweet dictionary, returns a tuple of values in path order
+    """
+    source = ["def extract(dct):"]
+    for i, path in enumerate(paths):
+        lookup = "dct" + "".join(f"[{key!r}]" for key in path)
+        source.append("    try:")
+        source.append(f"        v{i} = {lookup}")
+        source.append("    except KeyError:")
+        source.append(f"        v{i} = None")
+    source.append("    return (" + "".join(f"v{i}, " for i in range(len(paths))) + ")")
+    namespace = {}
+    exec("\n".join(source), namespace)
+    return namespace["extract"]
+
+TWEET_EXTRACTOR = compile_extractor(TWEET_FIELDS)
+
+def load_tweets_json(filename, batch_size=TWEET_BATCH_SIZE):
+    """
+    Function to load a JSON file of tweets.
+    Built on top of stream_tweets_json, so the raw tweet dictionaries are never all held at once.
+
+    Args:
+        filename (string): File to open
+        batch_size (int, optional): Tweets parsed per batch. Defaults to TWEET_BATCH_SIZE.
+
+    Returns:
+        pd.df: Dataframe of tweet data.
+    """
+    batches = list(stream_tweets_json(filename, batch_size))
+    if len(batches) == 0:
+        return pd.DataFrame()
+    return pd.concat(batches, ignore_index=True)
+
+def stream_tweets_json(filename, batch_size=TWEET_BATCH_SIZE):
+    """
+    Generator to stream a JSON file of tweets as fixed-size dataframe batches.
+    Each line is parsed and thrown away as soon as it's in a batch, so peak memory
+    is one batch of parsed tweets rather than the whole day of raw dictionaries.
+
+    Args:
+        filename (string): File to open
+        batch_size (int, optional): Tweets per yielded batch. Defaults to TWEET_BATCH_SIZE.
+
+    Yields:
+        pd.df: Dataframe of up to batch_size tweets, duplicates within the file removed.
+    """
+    # AUTHOR: Diogo Pacheco (original whole-file loader)
+    # ids already yielded, so duplicates are still dropped across batch boundaries
+    seen_ids = set()
+    with gzip.GzipFile(filename) as tw_file:
+        rows = []
+        for line in tw_file:
+            try:
+                tw = json.loads(line.decode('utf-8'))
+                rows.append(TWEET_EXTRACTOR(tw))
+            except Exception as e:
+                print(filename,e)
+            if len(rows) >= batch_size:
+                yield tweets_batch(rows, seen_ids)
+                rows = []
+        if len(rows) > 0:
+            yield tweets_batch(rows, seen_ids)
+
+def tweets_batch(rows, seen_ids):
+    """
+    Helper function to turn a list of extracted tweets into a deduplicated dataframe batch.
+
+    Args:
+        rows (list): List of value tuples from TWEET_EXTRACTOR, one per tweet
+        seen_ids (set): Tweet IDs already yielded from this file; updated in place
+
+    Returns:
+        pd.df: Dataframe of tweet data.
+    """
+    tweets = pd.DataFrame.from_records(rows, columns=TWEET_COLUMNS)
+    tweets.drop_duplicates(subset='id_str', inplace=True)
+    tweets = tweets[~tweets["id_str"].isin(seen_ids)]
+    seen_ids.update(tweets["id_str"])
+    return tweets
+
+def file_date(filename):
+    """
+    Function to get the date out of a tweet filename, e.g. elections2022_tweets-20221029.json.gz -> 20221029
+
+    Args:
+        filename (string): Path to a day file or partition
+
+    Returns:
+        string: Date of the file as YYYYMMDD
+    """
+    return os.path.basename(filename).split(".")[0].split("-")[1][:8]
+
+def tweet_dataset_path(dir_path):
+    """
+    Function to get the parquet dataset directory for a data directory.
+
+    Args:
+        dir_path (string): Path to directory containing data.
+
+    Returns:
+        string: Path to the parquet dataset
+    """
+    return os.path.join(dir_path, TWEET_DATASET)
+
+def tweet_partition_path(dataset_path, filedate):
+    """
+    Function to get the directory of one day's partition in a parquet dataset.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+        filedate (string): Date of the partition as YYYYMMDD
+
+    Returns:
+        string: Path to the partition directory
+    """
+    return os.path.join(dataset_path, "day=" + filedate)
+
+def partition_date(partition):
+    """
+    Function to get the date of a partition from its path.
+
+    Args:
+        partition (string): Path to a partition directory
+
+    Returns:
+        string: Date of the partition as YYYYMMDD
+    """
+    return os.path.basename(os.path.normpath(partition)).split("=")[1]
+
+def write_tweets_partition(parts, dataset_path, filedate, schema=None):
+    """
+    Function to write one day of tweets as a partition of the parquet dataset.
+    Each part is sorted by id_str and written in row groups, so the id_str and timestamp_ms
+    statistics let readers skip most of a file. The partition is built in a hidden directory
+    and swapped in at the end, so readers never see a half-written day.
+
+    Args:
+        parts (iterable): Dataframes of tweets, each written out as its own part file
+        dataset_path (string): Path to the parquet dataset
+        filedate (string): Date of the partition as YYYYMMDD
+        schema (pyarrow.Schema, optional): Schema to write with, keeps days consistent. Defaults to None.
+
+    Returns:
+        string: Path to the written partition
+        int: Number of rows written
+    """
+    partition = tweet_partition_path(dataset_path, filedate)
+    # names starting with "." are ignored by the dataset readers
+    tmp_partition = os.path.join(dataset_path, ".day=" + filedate + ".tmp")
+    old_partition = os.path.join(dataset_path, ".day=" + filedate + ".old")
+    for leftover in (tmp_partition, old_partition):
+        if os.path.exists(leftover):
+            shutil.rmtree(leftover)
+    os.makedirs(tmp_partition)
+
+    rows_written = 0
+    for part_number, tweets in enumerate(parts):
+        tweets = tweets.sort_values("id_str")
+        if schema is not None:
+            tweets = tweets.reindex(columns=schema.names)
+        pq.write_table(
+            pa_table(tweets, schema),
+            os.path.join(tmp_partition, f"part-{part_number}.parquet"),
+            row_group_size=TWEET_ROW_GROUP_SIZE
+        )
+        rows_written += len(tweets)
+
+    # swap the new partition in
+    if os.path.exists(partition):
+        os.rename(partition, old_partition)
+    os.rename(tmp_partition, partition)
+    if os.path.exists(old_partition):
+        shutil.rmtree(old_partition)
+    return partition, rows_written
+
+def pa_table(tweets, schema=None):
+    """
+    Wrapper function to convert a dataframe of tweets to an arrow table.
+
+    Args:
+        tweets (pd.df): Dataframe of tweet data.
+        schema (pyarrow.Schema, optional): Schema to convert to. Defaults to None.
+
+    Returns:
+        pyarrow.Table: Table of tweet data
+    """
+    if schema is None:
+        return pa.Table.from_pandas(tweets, schema=schema, preserve_index=False)
+    arrays = []
+    for field in schema:
+        column = tweets[field.name]
+        if pa.types.is_list(field.type):
+            # a list column empty for every tweet comes out of reindex as all-NaN float64,
+            # which arrow can't convert to a list type, so go through python objects
+            arrays.append(pa.array(column.astype(object).where(column.notna(), None).tolist(), type=field.type))
+        else:
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def tweets_from_table(table, columns=None):
+    """
+    Helper function to turn an arrow table of tweets back into the dataframe the rest of the code expects.
+
+    Args:
+        table (pyarrow.Table): Table of tweet data
+        columns (list, optional): Columns wanted, missing ones are added empty. Defaults to None (as read).
+
+    Returns:
+        pd.df: Dataframe of tweet data.
+    """
+    tweets = table.to_pandas()
+    # list columns come back as numpy arrays; the rest of the code expects python lists
+    for name, column_type in zip(table.column_names, table.schema.types):
+        if pa.types.is_list(column_type):
+            tweets[name] = table.column(name).to_pylist()
+    if columns is not None:
+        tweets = tweets.reindex(columns=columns)
+    return tweets
+
+def line_parts(lines, max_lines=None, max_bytes=None):
+    """
+    Generator to cut a stream of lines into consecutive parts without holding any part in memory.
+    Each part is itself a generator, and must be used up before asking for the next one
+    (the same deal as itertools.groupby).
+
+    Args:
+        lines (iterable): Lines to split, e.g. an open GzipFile
+        max_lines (int, optional): Most lines in one part. Defaults to None (no limit).
+        max_bytes (int, optional): Most uncompressed bytes in one part, a line is never cut. Defaults to None (no limit).
+
+    Yields:
+        generator: Lines of the next part
+    """
+    lines = iter(lines)
+    for first_line in lines:
+        yield line_part(first_line, lines, max_lines, max_bytes)
+
+def line_part(first_line, lines, max_lines, max_bytes):
+    """
+    Helper generator for line_parts, yields one part's lines.
+
+    Args:
+        first_line (bytes): First line of the part, already taken from lines
+        lines (iterator): Rest of the lines
+        max_lines (int): Most lines in the part, or None
+        max_bytes (int): Most bytes in the part, or None
+
+    Yields:
+        bytes: Lines of the part
+    """
+    yield first_line
+    num_lines = 1
+    num_bytes = len(first_line)
+    while (max_lines is None or num_lines < max_lines) and (max_bytes is None or num_bytes < max_bytes):
+        line = next(lines, None)
+        if line is None:
+            return
+        num_lines += 1
+        num_bytes += len(line)
+        yield line
+
+def count_lines(filename):
+    """
+    Function to count the lines in a gzipped file, streaming it in blocks.
+
+    Args:
+        filename (string): File to count
+
+    Returns:
+        int: Number of lines
+    """
+    total = 0
+    last_block = b""
+    with gzip.GzipFile(filename) as tw_file:
+        for block in iter(lambda: tw_file.read(1 << 20), b""):
+            total += block.count(b"\n")
+            last_block = block
+    if last_block and not last_block.endswith(b"\n"):
+        # last line without a newline
+        total += 1
+    return total
+
+def split_tweets_json(filename, parts=None, max_lines=None, max_bytes=None, output_dir=None):
+    """
+    Function to split a gzipped JSON day file into smaller gzipped JSON files, streaming line by line.
+    Never parses the tweets or builds a dataframe, so memory use is constant however big the file is.
+    Give exactly one of parts, max_lines or max_bytes.
+
+    Args:
+        filename (string): File to split
+        parts (int, optional): Number of roughly equal parts to split into. Costs an extra pass to count lines. Defaults to None.
+        max_lines (int, optional): Most lines per part. Defaults to None.
+        max_bytes (int, optional): Most uncompressed bytes per part. Defaults to None.
+        output_dir (string, optional): Where to write the parts. Defaults to None (next to the input).
+
+    Returns:
+        list: Filenames of the parts written, e.g. elections2022_tweets-20221029PART1.json.gz
+    """
+    if parts is not None:
+        max_lines = -(-count_lines(filename) // parts)
+    if output_dir is None:
+        output_dir = os.path.dirname(filename)
+    stem = os.path.basename(filename).split(".")[0]
+
+    written = []
+    with gzip.GzipFile(filename) as tw_file:
+        for part_number, part in enumerate(line_parts(tw_file, max_lines, max_bytes), start=1):
+            part_filename = os.path.join(output_dir, f"{stem}PART{part_number}.json.gz")
+            # write to a temporary name first, so a crash never leaves a truncated part behind
+            with gzip.open(part_filename + ".tmp", "wb", compresslevel=6) as part_file:
+                for line in part:
+                    part_file.write(line)
+            os.replace(part_filename + ".tmp", part_filename)
+            written.append(part_filename)
+            print(f"Wrote {part_filename}")
+    return written
+
+def seen_ids_path(dataset_path):
+    """
+    Function to get the directory of the global seen tweet id set for a parquet dataset.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+
+    Returns:
+        string: Path to the seen id directory
+    """
+    return os.path.join(dataset_path, SEEN_IDS)
+
+def seen_id_run_name(filename):
+    """
+    Function to get the name of the seen id run belonging to an input file.
+
+    Args:
+        filename (string): Path to a JSON day file
+
+    Returns:
+        string: Run name, the file name without its extensions
+    """
+    return os.path.basename(filename).split(".")[0]
+
+def tweet_ids_array(id_strs):
+    """
+    Function to convert a column of id strings to a uint64 array, skipping missing ids.
+
+    Args:
+        id_strs (pd.Series): Column of tweet ids as strings
+
+    Returns:
+        np.ndarray: Tweet ids as uint64
+    """
+    return pd.to_numeric(id_strs.dropna()).to_numpy(dtype=np.uint64)
+
+def load_seen_id_runs(seen_path, exclude=None):
+    """
+    Function to memory-map every run of the seen tweet id set.
+    Nothing is read until a lookup touches it, so this is cheap however many ids there are.
+
+    Args:
+        seen_path (string): Path to the seen id directory
+        exclude (string, optional): Run name to leave out, e.g. the file being re-ingested. Defaults to None.
+
+    Returns:
+        list: Memory-mapped sorted uint64 arrays
+    """
+    runs = []
+    for run_file in sorted(glob.glob(os.path.join(seen_path, "*.npy"))):
+        if os.path.basename(run_file)[:-len(".npy")] == exclude:
+            continue
+        runs.append(np.load(run_file, mmap_mode="r"))
+    return runs
+
+def seen_id_mask(ids, runs):
+    """
+    Function to find which tweet ids are already in the seen id set.
+
+    Args:
+        ids (np.ndarray): Tweet ids as uint64
+        runs (list): Sorted uint64 arrays, as loaded by load_seen_id_runs
+
+    Returns:
+        np.ndarray: Boolean mask, True where the id has been seen before
+    """
+    seen = np.zeros(len(ids), dtype=bool)
+    for run in runs:
+        if len(run) == 0:
+            continue
+        positions = np.searchsorted(run, ids)
+        positions[positions == len(run)] = 0
+        seen |= run[positions] == ids
+    return seen
+
+def record_seen_ids(ids, seen_path, run_name):
+    """
+    Function to write (or replace) one run of the seen tweet id set.
+
+    Args:
+        ids (np.ndarray): Tweet ids as uint64
+        seen_path (string): Path to the seen id directory
+        run_name (string): Name of the run, from seen_id_run_name
+
+    Returns:
+        string: Path to the written run
+    """
+    os.makedirs(seen_path, exist_ok=True)
+    run_file = os.path.join(seen_path, run_name + ".npy")
+    # np.save adds .npy to names without it, so the temporary name has to end in .npy too
+    tmp_file = os.path.join(seen_path, "." + run_name + ".tmp.npy")
+    np.save(tmp_file, np.unique(np.asarray(ids, dtype=np.uint64)))
+    os.replace(tmp_file, run_file)
+    return run_file
+
+def load_seen_id_run(seen_path, run_name):
+    """
+    Function to load the tweet ids one input file contributed to the dataset.
+
+    Args:
+        seen_path (string): Path to the seen id directory
+        run_name (string): Name of the run, from seen_id_run_name
+
+    Returns:
+        np.ndarray: Sorted uint64 tweet ids, empty if the run doesn't exist
+    """
+    run_file = os.path.join(seen_path, run_name + ".npy")
+    if not os.path.exists(run_file):
+        return np.empty(0, dtype=np.uint64)
+    return np.load(run_file, mmap_mode="r")
+
+def tweet_index_path(dataset_path):
+    """
+    Function to get the directory of the tweet id index for a parquet dataset.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+
+    Returns:
+        string: Path to the index directory
+    """
+    return os.path.join(dataset_path, TWEET_INDEX)
+
+def dataset_part_files(dataset_path):
+    """
+    Function to list every part file of a parquet dataset, in a stable order.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+
+    Returns:
+        list: Part file paths relative to the dataset
+    """
+    part_files = glob.glob(os.path.join(dataset_path, "day=*", "*.parquet"))
+    return sorted(os.path.relpath(part_file, dataset_path) for part_file in part_files)
+
+def part_file_state(dataset_path, part_file):
+    """
+    Helper function to get what we check to see if a part file has changed.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+        part_file (string): Part file path relative to the dataset
+
+    Returns:
+        list: [size, mtime] of the part file
+    """
+    stat = os.stat(os.path.join(dataset_path, part_file))
+    return [stat.st_size, stat.st_mtime]
+
+def build_tweet_index(dataset_path):
+    """
+    Function to build the sorted tweet id -> (part file, row) index for a parquet dataset.
+    Each part's ids are cached in row order, so a rebuild only reads id_str from parts that changed,
+    and the merged index is a set of flat arrays which load_tweet_index memory-maps.
+
+    Args:
+        dataset_path (string): Path to the parquet dataset
+
+    Returns:
+        string: Path to the index directory
+    """
+    index_path = tweet_index_path(dataset_path)
+    cache_path = os.path.join(index_path, "parts")
+    os.makedirs(cache_path, exist_ok=True)
+    old_states = {}
+    if os.path.exists(os.path.join(index_path, "files.json")):
+        with open(os.path.join(index_path, "files.json"), encoding="utf-8") as files_handle:
+            old_states = dict(zip(*json.load(files_handle).values()))
+
+    part_files = dataset_part_files(dataset_path)
+    states = []
+    id_runs = []
+    part_numbers = []
+    rows = []
+    cached_files = set()
+    for part_number, part_file in enumerate(part_files):
+        state = part_file_state(dataset_path, part_file)
+        cached = os.path.join(cache_path, part_file.replace(os.sep, "_").replace("=", "-") + ".npy")
+        cached_files.add(cached)
+        if old_states.get(part_file) != state or not os.path.exists(cached):
+            id_strs = pq.read_table(os.path.join(dataset_path, part_file), columns=["id_str"]).column("id_str")
+            np.save(cached, pd.to_numeric(id_strs.to_pandas()).to_numpy(dtype=np.uint64))
+        part_ids = np.load(cached)
+        states.append(state)
+        id_runs.append(part_ids)
+        part_numbers.append(np.full(len(part_ids), part_number, dtype=np.uint32))
+        rows.append(np.arange(len(part_ids), dtype=np.uint32))
+
+    if id_runs:
+        ids = np.concatenate(id_runs)
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        part_numbers = np.concatenate(part_numbers)[order]
+        rows = np.concatenate(rows)[order]
+    else:
+        ids = np.empty(0, dtype=np.uint64)
+        part_numbers = np.empty(0, dtype=np.uint32)
+        rows = np.empty(0, dtype=np.uint32)
+
+    # arrays first, file list last: a crash part way leaves files.json out of date, so the next load rebuilds
+    for name, array in (("ids", ids), ("part_numbers", part_numbers), ("rows", rows)):
+        np.save(os.path.join(index_path, "." + name + ".tmp.npy"), array)
+        os.replace(os.path.join(index_path, "." + name + ".tmp.npy"), os.path.join(index_path, name + ".npy"))
+    with open(os.path.join(index_path, ".files.json.tmp"), "w", encoding="utf-8") as files_handle:
+        json.dump({"part_files": part_files, "states": states}, files_handle)
+    os.replace(os.path.join(index_path, ".files.json.tmp"), os.path.join(index_path, "files.json"))
+    # drop the cached ids of parts that are gone, e.g. a day deleted or rewritten with fewer parts
+    for old_cached in glob.glob(os.path.join(cache_path, "*.npy")):
+        if old_cached not in cached_files:
+            os.remove(old_cached)
+    print(f"Indexed {len(ids)} tweets across {len(part_files)} part files.")
+    return index_path